@@ -13,135 +13,111 @@ Riferimenti cercati:
 - token [[FIG:gr_...]]
 - anchor HTML con href contenente #gr_... e inner-text matching "Figura|Figure N(.M)*"
 
-Exit codes:
+I file sono letti tramite l'indice condiviso del corpus (scripts/corpus_index.py): se
+number_figures_from_toc.py è appena stato eseguito, nessun file viene riletto.
+
+Con --profile [TRACE] misura le fasi (indice, scansione dei riferimenti, report) e i file
+riletti, scrive un trace per chrome://tracing (default <site-root>/.orphans-profile.json)
+e stampa su stderr le fasi e i file più lenti (vedi scripts/profiling.py).
+
+Con --format json i risultati sono scritti su stdout come JSON Lines (un oggetto per
+riferimento, man mano che vengono trovati, più una riga finale "summary"); con --format
+sarif come log SARIF 2.1.0 (per CI ed editor), anch'esso scritto un risultato alla volta.
+
+Exit codes (tutti i formati):
   0 -> nessun orphan
   2 -> trovati orphan
   1 -> errore
 """
 from pathlib import Path
-import re
 import argparse
+import json
 import sys
 
-ID_PREFIX = "gr_"
-
-# p.figure-label id="..."
-LABEL_RE = re.compile(
-    r'<p\b[^>]*\bclass=["\'][^"\']*figure-label[^"\']*["\'][^>]*\bid=["\']([^"\']+)["\']',
-    re.IGNORECASE
+sys.path.insert(0, str(Path(__file__).resolve().parent / "scripts"))
+from corpus_index import (
+    DEFAULT_INDEX, corpus_files, load_index, save_index, refresh_index, index_path,
 )
+from profiling import NULL_PROFILER, Profiler
 
-# token [[FIG:id]]
-TOKEN_RE = re.compile(r'\[\[\s*FIG\s*:\s*([^\]\s]+)\s*\]\]', re.IGNORECASE)
-
-# regex to find anchor tags with href containing #...  (capture href and inner HTML)
-ANCHOR_FULL_RE = re.compile(
-    r'<a\b([^>]*)\bhref\s*=\s*(?P<q>["\'])(?P<h>[^"\']*#(?P<id>[^"\'>]+))(?P=q)([^>]*)>(?P<inner>.*?)</a>',
-    re.IGNORECASE | re.DOTALL
-)
-
-# regex to detect anchor inner text that matches "Figura 1.2" or "Figure 1.2"
-# allow optional surrounding whitespace and HTML tags inside inner; we'll strip tags before matching
-FIGURE_TEXT_RE = re.compile(r'^\s*(Figura|Figure)\s+\d+(?:\.\d+)*\s*$', re.IGNORECASE)
+ID_PREFIX = "gr_"
+DEFAULT_PROFILE = ".orphans-profile.json"
 
 def is_figure_id(x: str) -> bool:
     return x.startswith(ID_PREFIX)
 
-def strip_tags(s: str) -> str:
-    """Rimuove eventuali tag HTML dall'inner HTML per ottenere solo testo."""
-    return re.sub(r'<[^>]+>', '', s).strip()
-
-def collect_ids(root: Path):
+def load_corpus(root: Path, index_arg=None, no_cache=False, jobs=1, profiler=NULL_PROFILER):
+    """
+    Entries of the shared corpus index for every .md under it/ and en/, in scan order.
+    Only files changed since the last run (of either tool) are read.
+    """
+    path = index_path(root, index_arg, no_cache)
+    with profiler.phase("index: load"):
+        entries = load_index(path)
+    with profiler.phase("list it/ and en/"):
+        rels = corpus_files(root)
+    refresh_index(root, rels, entries, jobs, profiler)
+    with profiler.phase("index: save"):
+        save_index(path, root, entries)
+    return [(rel, entries[rel.as_posix()]) for rel in rels if rel.as_posix() in entries]
+
+def collect_ids(corpus):
     ids_it = set()
     ids_en = set()
-    for lang in ("it", "en"):
-        base = root / lang
-        if not base.exists():
-            continue
-        for p in base.rglob("*.md"):
-            try:
-                text = p.read_text(encoding="utf-8")
-            except Exception:
+    for rel, entry in corpus:
+        for idv in entry["labels"]:
+            if not is_figure_id(idv):
                 continue
-            for m in LABEL_RE.finditer(text):
-                idv = m.group(1).strip()
-                if not is_figure_id(idv):
-                    continue
-                if lang == "it":
-                    ids_it.add(idv)
-                else:
-                    ids_en.add(idv)
+            if rel.parts[0] == "it":
+                ids_it.add(idv)
+            else:
+                ids_en.add(idv)
     return ids_it, ids_en
 
-def scan_refs(root: Path):
+def scan_refs(corpus):
     """
-    Scansiona file .md e ritorna riferimenti filtrati:
+    Ritorna i riferimenti filtrati dall'indice del corpus:
     - token [[FIG:...]] solo se id inizia con gr_
     - anchor <a ... href="...#id">inner</a> solo se id startswith gr_ AND inner-text matches Figura|Figure pattern
     """
-    refs = []  # (path_rel, lineno, kind, id, file_lang)
-    for lang in ("it", "en"):
-        base = root / lang
-        if not base.exists():
-            continue
-        for p in base.rglob("*.md"):
-            rel = p.relative_to(root)
-            try:
-                text = p.read_text(encoding="utf-8")
-            except Exception:
-                continue
-            lines = text.splitlines()
-            # First, scan tokens line-by-line
-            for i, L in enumerate(lines, start=1):
-                for m in TOKEN_RE.finditer(L):
-                    fid = m.group(1).strip()
-                    if is_figure_id(fid):
-                        refs.append((rel, i, "token", fid, lang))
-            # Then scan anchors across the whole file (to capture multi-line anchors)
-            for m in ANCHOR_FULL_RE.finditer(text):
-                fid = m.group('id').strip()
-                if not is_figure_id(fid):
-                    continue
-                inner_html = m.group('inner')
-                inner_text = strip_tags(inner_html)
-                if FIGURE_TEXT_RE.match(inner_text):
-                    # determine line number roughly by counting newlines up to match.start()
-                    start_pos = m.start()
-                    lineno = text.count('\n', 0, start_pos) + 1
-                    refs.append((rel, lineno, "anchor", fid, lang))
-                else:
-                    # anchor does not look like a figure anchor; ignore it
-                    continue
-    return refs
-
-def main():
-    ap = argparse.ArgumentParser()
-    ap.add_argument("--site-root", default=".", help="root del sito (default .)")
-    ap.add_argument("--verbose", action="store_true")
-    args = ap.parse_args()
-
-    root = Path(args.site_root).resolve()
-
-    ids_it, ids_en = collect_ids(root)
-    if args.verbose:
-        print(f"[INFO] figure ids (prefix '{ID_PREFIX}') found: it={len(ids_it)} en={len(ids_en)}")
-
-    refs = scan_refs(root)
-
-    orphan_refs = []
-    cross_refs = []
-
-    for rel, lineno, kind, fid, file_lang in refs:
+    # (path_rel, lineno, kind, id, file_lang), file per file
+    for rel, entry in corpus:
+        lang = rel.parts[0]
+        for fid, lineno in entry["tokens"]:
+            if is_figure_id(fid):
+                yield (rel, lineno, "token", fid, lang)
+        for fid, lineno in entry["anchors"]:
+            if is_figure_id(fid):
+                yield (rel, lineno, "anchor", fid, lang)
+
+def iter_findings(corpus):
+    """
+    Yield ("orphan" | "cross", ref) as the references are scanned; refs resolved in their
+    own language are dropped.
+    """
+    ids_it, ids_en = collect_ids(corpus)
+    for ref in scan_refs(corpus):
+        fid, file_lang = ref[3], ref[4]
         exists_same = (fid in ids_it) if file_lang == "it" else (fid in ids_en)
         exists_other = (fid in ids_en) if file_lang == "it" else (fid in ids_it)
 
         if exists_same:
             continue
         elif exists_other:
-            cross_refs.append((rel, lineno, kind, fid, file_lang))
+            yield "cross", ref
         else:
-            orphan_refs.append((rel, lineno, kind, fid, file_lang))
+            yield "orphan", ref
 
+def classify_refs(corpus):
+    """Split the references into (orphan_refs, cross_refs); refs resolved in their own language are dropped."""
+    orphan_refs = []
+    cross_refs = []
+    for kind, ref in iter_findings(corpus):
+        (orphan_refs if kind == "orphan" else cross_refs).append(ref)
+    return orphan_refs, cross_refs
+
+def report(orphan_refs, cross_refs):
+    """Print the findings; returns the exit code (2 if there are orphans)."""
     if cross_refs:
         print("⚠️  Cross-language references (id exists only in the other language):")
         for rel, lineno, kind, fid, file_lang in cross_refs:
@@ -164,5 +140,104 @@ def main():
     print("✅ Nessun orphan, ma ci sono riferimenti cross-language (verifica se voluti).")
     return 0
 
+def finding_dict(finding, ref):
+    rel, lineno, kind, fid, file_lang = ref
+    return {"type": finding, "path": rel.as_posix(), "line": lineno, "kind": kind, "id": fid, "lang": file_lang}
+
+def stream_json(findings, out=sys.stdout):
+    """
+    JSON Lines: one object per finding, written (and flushed) as soon as it is found,
+    then a summary line. Returns the exit code.
+    """
+    counts = {"orphan": 0, "cross": 0}
+    for finding, ref in findings:
+        counts[finding] += 1
+        out.write(json.dumps(finding_dict(finding, ref), ensure_ascii=False) + "\n")
+        out.flush()
+    out.write(json.dumps({"type": "summary", "orphans": counts["orphan"], "cross_language": counts["cross"]}) + "\n")
+    return 2 if counts["orphan"] else 0
+
+SARIF_RULES = {
+    "orphan": ("orphan-figure-ref", "error", "Orphan figure reference",
+               "id '{id}' starts with 'gr_' but no figure-label has it in any language"),
+    "cross": ("cross-language-figure-ref", "warning", "Cross-language figure reference",
+              "id '{id}' exists only in the other language ({other})"),
+}
+
+def stream_sarif(findings, out=sys.stdout):
+    """
+    SARIF 2.1.0 log, written incrementally: the results array is streamed one result at a
+    time between a fixed header and footer. Returns the exit code.
+    """
+    rules = [{"id": rid, "shortDescription": {"text": short}, "defaultConfiguration": {"level": level}}
+             for rid, level, short, _ in SARIF_RULES.values()]
+    header = json.dumps({
+        "$schema": "https://json.schemastore.org/sarif-2.1.0.json",
+        "version": "2.1.0",
+        "runs": [{"tool": {"driver": {"name": "find_orphan_fig_refs", "rules": rules}}, "results": []}],
+    }, indent=1)
+    # tutto fino all'array dei risultati, che resta aperto
+    head, tail = header.rsplit('"results": []', 1)
+    out.write(head + '"results": [\n')
+    orphans = 0
+    sep = ""
+    for finding, ref in findings:
+        rel, lineno, kind, fid, file_lang = ref
+        rid, level, _, message = SARIF_RULES[finding]
+        orphans += finding == "orphan"
+        result = {
+            "ruleId": rid,
+            "level": level,
+            "message": {"text": f"[{kind}] " + message.format(id=fid, other="en" if file_lang == "it" else "it")},
+            "locations": [{"physicalLocation": {
+                "artifactLocation": {"uri": rel.as_posix()},
+                "region": {"startLine": lineno},
+            }}],
+        }
+        out.write(sep + json.dumps(result, ensure_ascii=False))
+        out.flush()
+        sep = ",\n"
+    out.write("\n]" + tail + "\n")
+    return 2 if orphans else 0
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--site-root", default=".", help="root del sito (default .)")
+    ap.add_argument("--verbose", action="store_true")
+    ap.add_argument("--index", default=None, help=f"corpus index path (default <site-root>/{DEFAULT_INDEX})")
+    ap.add_argument("--no-index-cache", action="store_true", help="do not read or write the corpus index cache")
+    ap.add_argument("--jobs", type=int, default=1, help="processi per l'analisi dei file (0 = uno per CPU, default 1)")
+    ap.add_argument("--format", choices=("text", "json", "sarif"), default="text",
+                    help="output format: text (default), json (JSON Lines, streamed) or sarif (SARIF 2.1.0, streamed)")
+    ap.add_argument("--profile", nargs="?", const="", default=None, metavar="TRACE",
+                    help=f"time each phase and file; write a Chrome trace (default <site-root>/{DEFAULT_PROFILE}) "
+                         "and print a summary to stderr")
+    args = ap.parse_args()
+
+    root = Path(args.site_root).resolve()
+    profiler = Profiler() if args.profile is not None else NULL_PROFILER
+    with profiler.phase("total"):
+        corpus = load_corpus(root, args.index, args.no_index_cache, args.jobs, profiler)
+
+        if args.verbose:
+            ids_it, ids_en = collect_ids(corpus)
+            # stdout resta solo JSON/SARIF con gli altri formati
+            print(f"[INFO] figure ids (prefix '{ID_PREFIX}') found: it={len(ids_it)} en={len(ids_en)}",
+                  file=sys.stdout if args.format == "text" else sys.stderr)
+
+        if args.format == "text":
+            with profiler.phase("orphan scan", files=len(corpus)) as info:
+                orphan_refs, cross_refs = classify_refs(corpus)
+                info.update(orphans=len(orphan_refs), cross_language=len(cross_refs))
+            with profiler.phase("report"):
+                code = report(orphan_refs, cross_refs)
+        else:
+            # scansione e output insieme: ogni riferimento è scritto appena classificato
+            with profiler.phase(f"orphan scan + {args.format} output", files=len(corpus)):
+                stream = stream_json if args.format == "json" else stream_sarif
+                code = stream(iter_findings(corpus))
+    profiler.report(Path(args.profile) if args.profile else root / DEFAULT_PROFILE, sys.stderr)
+    return code
+
 if __name__ == "__main__":
     sys.exit(main())
\ No newline at end of file
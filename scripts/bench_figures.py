@@ -0,0 +1,386 @@
+#!/usr/bin/env python3
+"""
+bench_figures.py
+
+Benchmark degli script delle figure su un corpus sintetico.
+
+Genera un sito finto (it/ + en/ + _data/toc.yml) con un numero di label pari a --scale
+volte quello del libro attuale (~190 <p class="figure-label">, metà per lingua), con pagine
+simili a quelle vere:
+- paragrafi di testo, label delle figure (con numerazione da aggiornare) e include dei grafici
+- riferimenti [[FIG:id]]
+- anchor <a href="{{ site.baseurl }}/...#gr_...">Figura N</a>, anche spezzati su più righe
+  (attributi e testo interno), che ANCHOR_FULL_RE deve riconoscere
+- link non di figura (sezioni, siti esterni) e qualche riferimento orfano
+
+e misura tempo e picco di memoria (RSS del processo) di:
+- number_figures_from_toc.py --dry-run (indice del corpus freddo e caldo)
+- number_figures_from_toc.py --update-refs (su una copia del corpus, che viene riscritta)
+- find_orphan_fig_refs.py (indice freddo e caldo)
+
+I risultati vengono aggiunti a --results (default <repo>/.bench-results.json) insieme al
+commit corrente; ogni caso viene confrontato con l'ultima esecuzione precedente sulla
+stessa scala e le regressioni oltre --threshold vengono segnalate.
+
+Exit codes:
+  0 -> ok
+  1 -> uno degli script è fallito, oppure (con --fail-on-regression) regressione
+
+Usage:
+  python3 scripts/bench_figures.py [--scale 10 [--scale 100 ...]] [--repeat 3] [--jobs N]
+                                   [--out-dir DIR] [--keep] [--seed 0] [--results PATH]
+                                   [--threshold 0.1] [--fail-on-regression] [--generate-only]
+"""
+from pathlib import Path
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+NUMBER_SCRIPT = REPO_ROOT / "scripts" / "number_figures_from_toc.py"
+ORPHAN_SCRIPT = REPO_ROOT / "find_orphan_fig_refs.py"
+
+DEFAULT_RESULTS = ".bench-results.json"
+RESULTS_VERSION = 1
+
+# dimensioni del libro attuale
+BASE_LABELS = 190           # figure-label in it/ + en/
+LABELS_PER_SECTION = (0, 4)  # label per pagina (le pagine vere ne hanno ~1.7)
+SECTIONS_PER_CHAPTER = 4
+CHAPTERS_PER_PART = 4
+PARAGRAPHS_PER_PAGE = (6, 14)
+
+ROMAN = ["I", "II", "III", "IV", "V", "VI", "VII", "VIII", "IX", "X"]
+
+WORDS = {
+    "it": ("il consumatore sceglie la combinazione di beni preferita tra quelle che può "
+           "permettersi e il vincolo di bilancio dipende dal reddito e dai prezzi mentre "
+           "l'impresa massimizza il profitto date la tecnologia e la domanda di mercato").split(),
+    "en": ("the consumer chooses the preferred combination of goods among those that he can "
+           "afford and the budget constraint depends on income and prices while the firm "
+           "maximizes profit given the technology and the market demand").split(),
+}
+FIG_WORD = {"it": "Figura", "en": "Figure"}
+SECTION_WORD = {"it": "Sezione", "en": "Section"}
+
+def roman(n: int) -> str:
+    """Part folder names: I..X, then P11, P12, ... (only need to be distinct)."""
+    return ROMAN[n - 1] if n <= len(ROMAN) else f"P{n}"
+
+def sentence(rng, lang, n_words=(12, 30)):
+    words = [rng.choice(WORDS[lang]) for _ in range(rng.randint(*n_words))]
+    words[0] = words[0].capitalize()
+    return " ".join(words) + "."
+
+def fig_anchor(rng, lang, page_url, fid, number):
+    """An anchor to a figure, on one line or split across lines the way editors wrap them."""
+    word = FIG_WORD[lang]
+    href = f"{{{{ site.baseurl }}}}/{page_url}#{fid}"
+    style = rng.random()
+    if style < 0.6:
+        return f'<a href="{href}">{word} {number}</a>'
+    if style < 0.8:
+        return f'<a\n  href="{href}"\n  class="fig-ref">{word} {number}</a>'
+    return f'<a href="{href}">{word}\n{number}</a>'
+
+def plan_corpus(scale: float, seed=0):
+    """
+    Synthetic book: list of parts, each a list of chapters, each a list of sections,
+    each a list of figure ids (the same ids in both languages).
+    """
+    rng = random.Random(seed)
+    per_lang = max(1, round(BASE_LABELS * scale / 2))
+    sections = []
+    n = 0
+    while n < per_lang:
+        k = min(rng.randint(*LABELS_PER_SECTION), per_lang - n)
+        sections.append(k)
+        n += k
+
+    parts = []
+    fig = 0
+    for s, k in enumerate(sections):
+        if s % (SECTIONS_PER_CHAPTER * CHAPTERS_PER_PART) == 0:
+            parts.append([])
+        if s % SECTIONS_PER_CHAPTER == 0:
+            parts[-1].append([])
+        chap_no = sum(len(p) for p in parts)
+        ids = []
+        for _ in range(k):
+            fig += 1
+            ids.append(f"gr_topic{chap_no}/fig{fig}")
+        parts[-1][-1].append(ids)
+    return parts
+
+def write_toc(site: Path, parts):
+    lines = ["title:", "  en: Synthetic Notes", "  it: Note sintetiche", "parts:"]
+    for p, chapters in enumerate(parts, 1):
+        lines += [f"  - folder: {roman(p)}", "    title:", f"      en: Part {p}", f"      it: Parte {p}",
+                  "    chapters:"]
+        for chap, sections in enumerate(chapters, 1):
+            lines += [f"      - folder: {chap}", "        title:", f"          en: Chapter {chap}",
+                      f"          it: Capitolo {chap}", "        sections:"]
+            for sec in range(1, len(sections) + 1):
+                lines += ["          - title:", f"              en: Section {sec}", f"              it: Sezione {sec}"]
+    (site / "_data").mkdir(parents=True, exist_ok=True)
+    (site / "_data" / "toc.yml").write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+def write_pages(site: Path, parts, seed=0):
+    """Write it/ and en/ pages. Returns (files, bytes, tokens, anchors)."""
+    # pagina e numero "vero" di ogni figura, per i riferimenti
+    where = {}
+    chapter_no = 0
+    for p, chapters in enumerate(parts, 1):
+        for c, sections in enumerate(chapters, 1):
+            chapter_no += 1
+            n = 0
+            for s, ids in enumerate(sections, 1):
+                for fid in ids:
+                    n += 1
+                    where[fid] = (f"{roman(p)}/{c}/{s}", f"{chapter_no}.{n}")
+    all_ids = list(where)
+
+    stats = {"files": 0, "bytes": 0, "tokens": 0, "anchors": 0}
+    for lang in ("it", "en"):
+        rng = random.Random(f"{seed}-{lang}")
+        for p, chapters in enumerate(parts, 1):
+            for c, sections in enumerate(chapters, 1):
+                chap_dir = site / lang / roman(p) / str(c)
+                chap_dir.mkdir(parents=True, exist_ok=True)
+                (chap_dir / "index.md").write_text("---\nlayout: chapter\n---", encoding="utf-8")
+                stats["files"] += 1
+                for s, ids in enumerate(sections, 1):
+                    text = page_text(rng, lang, ids, all_ids, where, f"{roman(p)}/{c}", stats)
+                    (chap_dir / f"{s}.md").write_text(text, encoding="utf-8")
+                    stats["files"] += 1
+                    stats["bytes"] += len(text.encode("utf-8"))
+    return stats
+
+def page_text(rng, lang, ids, all_ids, where, chap_url, stats):
+    paragraphs = []
+    pending = list(ids)
+    n_par = rng.randint(*PARAGRAPHS_PER_PAGE)
+    for i in range(n_par):
+        chunks = [sentence(rng, lang) for _ in range(rng.randint(2, 5))]
+        # riferimenti a figure (vicine o a caso nel libro)
+        for _ in range(rng.choice((0, 0, 1, 1, 2))):
+            fid = rng.choice(ids) if ids and rng.random() < 0.5 else rng.choice(all_ids)
+            if rng.random() < 0.01:
+                fid = fid + "-missing"  # orphan
+            if rng.random() < 0.4:
+                chunks.insert(rng.randrange(len(chunks) + 1), f"[[FIG:{fid}]]")
+                stats["tokens"] += 1
+            else:
+                page, number = where.get(fid, where[fid.replace("-missing", "")])
+                chunks.insert(rng.randrange(len(chunks) + 1),
+                              fig_anchor(rng, lang, f"{lang}/{page}", fid, number))
+                stats["anchors"] += 1
+        if rng.random() < 0.3:
+            sec = rng.randint(1, SECTIONS_PER_CHAPTER)
+            chunks.append(f'<a href="{{{{ site.baseurl }}}}/{lang}/{chap_url}/{sec}">{SECTION_WORD[lang]} {sec}</a>.')
+        if rng.random() < 0.05:
+            chunks.append('<a href="https://www.istat.it/" target="_blank">ISTAT</a>.')
+        paragraphs.append(" ".join(chunks))
+        # distribuisci le figure lungo la pagina
+        if pending and (rng.random() < len(pending) / (n_par - i)):
+            fid = pending.pop(0)
+            topic, name = fid[3:].split("/")
+            paragraphs.append(f'<p class="figure-label" id="{fid}">{FIG_WORD[lang].upper()} ?</p>\n'
+                              f'{{% include textbook-graph.html graph="{topic}/gr_{name}" %}}\n\n'
+                              f'<div class="pagebreak"></div>')
+    for fid in pending:
+        topic, name = fid[3:].split("/")
+        paragraphs.append(f'<p class="figure-label" id="{fid}">{FIG_WORD[lang].upper()} ?</p>\n'
+                          f'{{% include textbook-graph.html graph="{topic}/gr_{name}" %}}')
+    return "\n\n".join(paragraphs) + "\n"
+
+def generate_corpus(site: Path, scale: float, seed=0):
+    parts = plan_corpus(scale, seed)
+    write_toc(site, parts)
+    stats = write_pages(site, parts, seed)
+    stats["labels"] = sum(len(ids) for chapters in parts for sections in chapters for ids in sections) * 2
+    return stats
+
+def run_case(cmd):
+    """Run one command; returns (seconds, peak RSS in KiB, exit code)."""
+    # stderr su file e non su pipe: wait4 non legge, e un figlio che scrive più del buffer
+    # della pipe (~64 KB, es. molti orphan) resterebbe bloccato
+    with tempfile.TemporaryFile() as stderr:
+        start = time.perf_counter()
+        proc = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=stderr)
+        # wait4: rusage del solo figlio (e dei suoi worker), non cumulata tra i casi
+        _, status, usage = os.wait4(proc.pid, 0)
+        seconds = time.perf_counter() - start
+        proc.returncode = os.waitstatus_to_exitcode(status)
+        stderr.seek(0)
+        err = stderr.read().decode("utf-8", "replace")
+    if proc.returncode not in (0, 2):  # 2: orphan trovati (voluti)
+        print(f"[ERROR] {' '.join(map(str, cmd))} exited with {proc.returncode}\n{err}", file=sys.stderr)
+    return seconds, usage.ru_maxrss, proc.returncode
+
+def bench_cases(site: Path, jobs=1):
+    """(case name, command, needs a fresh copy of the corpus, warm index)."""
+    py = sys.executable
+    jobs_arg = ["--jobs", str(jobs)]
+    number = [py, str(NUMBER_SCRIPT), "--site-root", str(site)] + jobs_arg
+    orphans = [py, str(ORPHAN_SCRIPT), "--site-root", str(site)] + jobs_arg
+    return [
+        ("number-dry-run-cold", number + ["--dry-run", "--no-index-cache"], False, False),
+        ("number-dry-run-warm", number + ["--dry-run"], False, True),
+        ("orphans-cold", orphans + ["--no-index-cache"], False, False),
+        ("orphans-warm", orphans, False, True),
+        ("number-update-refs", number + ["--update-refs", "--no-index-cache"], True, False),
+    ]
+
+def run_scale(site: Path, repeat=1, jobs=1):
+    """Best-of-`repeat` time and max peak RSS for each case."""
+    results = {}
+    failed = False
+    index = site / ".corpus-index.json"
+    for name, cmd, writes, warm in bench_cases(site, jobs):
+        times, rss = [], []
+        for _ in range(repeat):
+            target = site
+            if writes:
+                target = site.with_name(site.name + "-copy")
+                if target.exists():
+                    shutil.rmtree(target)
+                shutil.copytree(site, target)
+                cmd = [str(target) if c == str(site) else c for c in cmd]
+            if warm and not index.exists():
+                run_case(cmd)  # prepara l'indice
+            seconds, peak, code = run_case(cmd)
+            failed |= code not in (0, 2)
+            times.append(seconds)
+            rss.append(peak)
+            if writes:
+                shutil.rmtree(target)
+        results[name] = {"seconds": round(min(times), 4), "peak_rss_kb": max(rss)}
+        print(f"  {name:<22} {min(times):8.3f} s  {max(rss) / 1024:8.1f} MiB")
+    return results, failed
+
+def git_commit():
+    try:
+        rev = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT,
+                             capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=REPO_ROOT,
+                               capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+    return rev, bool(dirty)
+
+def load_results(path: Path):
+    if not path.exists():
+        return []
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError) as e:
+        print(f"[WARN] cannot read {path}: {e}", file=sys.stderr)
+        return []
+    if not isinstance(data, dict) or data.get("version") != RESULTS_VERSION:
+        return []
+    return data.get("runs", [])
+
+def save_results(path: Path, runs):
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(json.dumps({"version": RESULTS_VERSION, "runs": runs}, indent=1) + "\n", encoding="utf-8")
+    tmp.replace(path)
+
+def compare(previous, run, threshold):
+    """Print the change of each case against `previous`; returns the regressed case names."""
+    regressed = []
+    print(f"  vs {previous['commit']}{' (dirty)' if previous.get('dirty') else ''} ({previous['date']}):")
+    for name, cur in run["results"].items():
+        old = previous["results"].get(name)
+        if not old:
+            continue
+        dt = cur["seconds"] / old["seconds"] - 1 if old["seconds"] else 0.0
+        dm = cur["peak_rss_kb"] / old["peak_rss_kb"] - 1 if old["peak_rss_kb"] else 0.0
+        flag = ""
+        if dt > threshold or dm > threshold:
+            flag = "  ⚠️  regression"
+            regressed.append(name)
+        print(f"    {name:<22} time {dt:+7.1%}  memory {dm:+7.1%}{flag}")
+    return regressed
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--scale", type=float, action="append",
+                    help=f"corpus size as a multiple of the current book ({BASE_LABELS} labels); repeatable (default 10)")
+    ap.add_argument("--repeat", type=int, default=3, help="runs per case, the fastest is kept (default 3)")
+    ap.add_argument("--jobs", type=int, default=1, help="--jobs passed to the scripts (default 1)")
+    ap.add_argument("--seed", type=int, default=0, help="seed of the corpus generator (default 0)")
+    ap.add_argument("--out-dir", default=None, help="where to generate the corpus (default: a temporary directory)")
+    ap.add_argument("--keep", action="store_true", help="do not delete the generated corpus")
+    ap.add_argument("--generate-only", action="store_true", help="only generate the corpus (implies --keep)")
+    ap.add_argument("--results", default=None, help=f"results file (default <repo>/{DEFAULT_RESULTS})")
+    ap.add_argument("--no-save", action="store_true", help="do not append this run to the results file")
+    ap.add_argument("--threshold", type=float, default=0.10,
+                    help="relative slowdown or memory growth reported as a regression (default 0.10)")
+    ap.add_argument("--fail-on-regression", action="store_true", help="exit 1 if a case regressed")
+    args = ap.parse_args()
+
+    scales = args.scale or [10]
+    keep = args.keep or args.generate_only
+    base = Path(args.out_dir).resolve() if args.out_dir else Path(tempfile.mkdtemp(prefix="bench-figures-"))
+    results_path = Path(args.results) if args.results else REPO_ROOT / DEFAULT_RESULTS
+    runs = load_results(results_path)
+    commit, dirty = git_commit()
+
+    failed = False
+    regressed = []
+    try:
+        for scale in scales:
+            site = base / f"x{scale:g}"
+            if site.exists():
+                shutil.rmtree(site)
+            site.mkdir(parents=True)
+            t0 = time.perf_counter()
+            stats = generate_corpus(site, scale, args.seed)
+            print(f"[INFO] scale x{scale:g}: {stats['labels']} labels, {stats['files']} files, "
+                  f"{stats['bytes'] / 1e6:.1f} MB, {stats['tokens']} [[FIG:]] tokens, {stats['anchors']} anchors "
+                  f"(generated in {time.perf_counter() - t0:.1f} s) -> {site}")
+            if args.generate_only:
+                continue
+
+            results, case_failed = run_scale(site, args.repeat, args.jobs)
+            failed |= case_failed
+            run = {
+                "commit": commit,
+                "dirty": dirty,
+                "date": datetime.datetime.now().isoformat(timespec="seconds"),
+                "python": platform.python_version(),
+                "scale": scale,
+                "seed": args.seed,
+                "jobs": args.jobs,
+                "corpus": stats,
+                "results": results,
+            }
+            previous = next((r for r in reversed(runs)
+                             if (r["scale"], r["seed"], r["jobs"]) == (scale, args.seed, args.jobs)), None)
+            if previous:
+                regressed += compare(previous, run, args.threshold)
+            runs.append(run)
+            if not keep:
+                shutil.rmtree(site)
+    finally:
+        if not keep and not args.out_dir:
+            shutil.rmtree(base, ignore_errors=True)
+
+    if not args.generate_only and not args.no_save:
+        save_results(results_path, runs)
+        print(f"[INFO] results appended to {results_path}")
+    if failed:
+        return 1
+    return 1 if regressed and args.fail_on_regression else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
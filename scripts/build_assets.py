@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+build_assets.py
+
+Copie con hash del contenuto (fingerprint) degli asset statici, per poterli mettere in
+cache a tempo indeterminato:
+- static/js/*.js e static/css/*.css referenziati da layout, include o pagine (bundle di
+  kg, bootstrap, script e fogli di stile)
+- le specifiche compilate dei grafici <lang>/graphs/**/*.json (compile_graph_calcs.py) e le
+  loro istantanee <lang>/graphs/**/*.svg (render_graph_svg.py)
+
+Per ogni asset scrive accanto all'originale <nome>.<hash>.<ext> (stessa cartella, così gli
+url() relativi nei CSS continuano a funzionare) e <nome>.<hash>.<ext>.gz per gli host che
+servono file precompressi; rimuove le copie di versioni precedenti.
+
+La mappa {originale: copia} va in _data/assets.json: scripts.html, stylesheets.html,
+embedded-graph.html, page.html e i layout dell'indice (toc.html, big-toc.html,
+toc_split.html) la usano con `site.data.assets[path] | default: path`,
+quindi senza mappa (es. su GitHub Pages, dove i file generati non sono nel repository)
+le pagine puntano ai file originali come prima.
+
+Infine segnala i bundle JS/CSS (archives/ compreso) che nessun layout, include o pagina
+referenzia.
+
+Va eseguito solo per la build di produzione (prima di `jekyll build`): con la mappa le
+pagine puntano alle copie, quindi le modifiche fatte a static/ o ai grafici mentre gira
+`jekyll serve` non si vedrebbero. serve.sh esegue invece --clean, che rimuove mappa e
+copie e lascia servire i file originali.
+
+Usage:
+  python3 scripts/build_assets.py [--site-root .] [--no-gzip] [--verbose]
+  python3 scripts/build_assets.py [--site-root .] --clean
+"""
+from pathlib import Path
+import argparse
+import gzip
+import hashlib
+import json
+import re
+import sys
+
+from kg_spec import graph_specs
+
+HASH_LEN = 10
+DEFAULT_MAP = "_data/assets.json"
+
+ASSET_GLOBS = ("static/js/*.js", "static/css/*.css")
+BUNDLE_GLOBS = ("static/js/**/*.js", "static/css/**/*.css")
+TEMPLATE_GLOBS = ("_layouts/*.html", "_includes/*.html", "*.html")
+
+FINGERPRINT_RE = re.compile(r'\.[0-9a-f]{%d}$' % HASH_LEN)
+
+# riferimenti a static/... nei template; {{ ... }} resta dentro il match (es. kg3d.{{ include.KGversion }}.js)
+STATIC_REF_RE = re.compile(r'static/[\w./-]*(?:\{\{[^}]*\}\}[\w./-]*)*')
+LIQUID_VAR_RE = re.compile(r'\{\{[^}]*\}\}')
+# versioni di kg passate ai template: KGversion="0.3.1", assign version = "0.3.1", version: 0.3.0
+KG_VERSION_RE = re.compile(
+    r'''KGversion\s*=\s*["']([\d.]+)["']|assign\s+version\s*=\s*["']([\d.]+)["']|^version:\s*["']?([\d.]+)''',
+    re.MULTILINE)
+
+def is_fingerprinted(path: Path) -> bool:
+    return bool(FINGERPRINT_RE.search(path.stem))
+
+def asset_files(site_root: Path, refs):
+    """Assets to fingerprint (relative paths): referenced JS/CSS, then the compiled graph specs and snapshots."""
+    rels = []
+    for pattern in ASSET_GLOBS:
+        rels.extend(sorted(p.relative_to(site_root) for p in site_root.glob(pattern)
+                           if p.relative_to(site_root).as_posix() in refs))
+    for spec in graph_specs(site_root):
+        for generated in (spec.with_suffix(".json"), spec.with_suffix(".svg")):
+            if (site_root / generated).exists():
+                rels.append(generated)
+    return [r for r in rels if not is_fingerprinted(r)]
+
+def fingerprint(site_root: Path, rel: Path, use_gzip=True):
+    """
+    Write the hashed copy of one asset (and its .gz) if missing, remove stale copies.
+    Returns (hashed rel path, written).
+    """
+    src = site_root / rel
+    data = src.read_bytes()
+    digest = hashlib.sha1(data).hexdigest()[:HASH_LEN]
+    out = src.with_name(f"{src.stem}.{digest}{src.suffix}")
+    written = False
+    if not out.exists() or out.read_bytes() != data:
+        out.write_bytes(data)
+        written = True
+    gz = out.with_name(out.name + ".gz")
+    if use_gzip and (written or not gz.exists()):
+        # mtime=0: stesso input -> stesso .gz
+        gz.write_bytes(gzip.compress(data, compresslevel=9, mtime=0))
+        written = True
+    elif not use_gzip and gz.exists():
+        gz.unlink()
+
+    # copie di contenuti precedenti
+    stale = re.compile(re.escape(src.stem) + r'\.([0-9a-f]{%d})' % HASH_LEN + re.escape(src.suffix) + r'(?:\.gz)?$')
+    for old in src.parent.iterdir():
+        m = stale.match(old.name)
+        if m and m.group(1) != digest:
+            old.unlink()
+    return out.relative_to(site_root), written
+
+def remove_copies(site_root: Path):
+    """Remove the asset map and every hashed copy (and .gz). Returns the number of files removed."""
+    removed = 0
+    dirs = set(site_root / Path(pattern).parent for pattern in ASSET_GLOBS)
+    dirs.update((site_root / spec).parent for spec in graph_specs(site_root))
+    for d in sorted(dirs):
+        if not d.exists():
+            continue
+        for p in sorted(d.iterdir()):
+            name = p.name[:-len(".gz")] if p.name.endswith(".gz") else p.name
+            if p.is_file() and is_fingerprinted(Path(name)):
+                p.unlink()
+                removed += 1
+    out = site_root / DEFAULT_MAP
+    if out.exists():
+        out.unlink()
+        removed += 1
+    return removed
+
+def template_files(site_root: Path):
+    files = []
+    for pattern in TEMPLATE_GLOBS:
+        files.extend(sorted(site_root.glob(pattern)))
+    for lang in ("it", "en"):
+        files.extend(p for p in sorted((site_root / lang).rglob("*.md")) if "graphs" not in p.parts)
+    return files
+
+def referenced_assets(site_root: Path):
+    """Paths under static/ referenced by layouts, includes and pages (KGversion expanded)."""
+    refs = set()
+    versions = set()
+    texts = []
+    for path in template_files(site_root):
+        try:
+            text = path.read_text(encoding="utf-8")
+        except (OSError, UnicodeDecodeError):
+            continue
+        texts.append(text)
+        for m in KG_VERSION_RE.finditer(text):
+            versions.add(next(g for g in m.groups() if g))
+    for text in texts:
+        for m in STATIC_REF_RE.finditer(text):
+            ref = m.group(0)
+            if LIQUID_VAR_RE.search(ref):
+                refs.update(LIQUID_VAR_RE.sub(v, ref) for v in versions)
+            else:
+                refs.add(ref)
+    return refs
+
+def unreferenced_bundles(site_root: Path, refs):
+    unused = []
+    for pattern in BUNDLE_GLOBS:
+        for p in sorted(site_root.glob(pattern)):
+            rel = p.relative_to(site_root)
+            if not is_fingerprinted(rel) and rel.as_posix() not in refs:
+                unused.append(rel)
+    return unused
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--site-root", default=".", help="root del sito (default .)")
+    ap.add_argument("--no-gzip", action="store_true", help="do not write .gz copies")
+    ap.add_argument("--clean", action="store_true",
+                    help="remove the asset map and the hashed copies (development: serve the original files)")
+    ap.add_argument("--verbose", action="store_true")
+    args = ap.parse_args()
+
+    site_root = Path(args.site_root).resolve()
+    if args.clean:
+        print(f"[INFO] asset map and hashed copies removed: {remove_copies(site_root)} file(s)")
+        return 0
+    refs = referenced_assets(site_root)
+    mapping = {}
+    written = 0
+    for rel in asset_files(site_root, refs):
+        hashed, changed = fingerprint(site_root, rel, not args.no_gzip)
+        mapping[rel.as_posix()] = hashed.as_posix()
+        written += changed
+        if changed and args.verbose:
+            print(f"[WRITE] {hashed}")
+
+    out = site_root / DEFAULT_MAP
+    text = json.dumps(mapping, ensure_ascii=False, indent=1, sort_keys=True) + "\n"
+    if not out.exists() or out.read_text(encoding="utf-8") != text:
+        out.parent.mkdir(parents=True, exist_ok=True)
+        out.write_text(text, encoding="utf-8")
+        print(f"[INFO] asset map written -> {out}")
+    print(f"Assets: {len(mapping)}  written: {written}")
+
+    unused = unreferenced_bundles(site_root, refs)
+    if unused:
+        total = sum((site_root / rel).stat().st_size for rel in unused)
+        print(f"[WARN] {len(unused)} bundle(s) not referenced by any layout, include or page ({total / 1e6:.1f} MB):")
+        for rel in unused:
+            print(f"  {rel}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
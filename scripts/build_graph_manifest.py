@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+build_graph_manifest.py
+
+Scrive _data/graphs.json: per ogni pagina del corpus (it/ + en/) i grafici che include
+con {% include textbook-graph.html graph="..." %}, nell'ordine in cui compaiono, con
+dimensione e sha1 della specifica compilata (<lang>/graphs/<graph>.json, vedi
+compile_graph_calcs.py) che il browser scarica.
+
+I grafici che iniziano entro i primi --fold caratteri della pagina (e comunque il primo)
+sono "eager": page.html emette per loro un <link rel="preload"> e embedded-graph.html li
+lascia a kg come prima. Gli altri sono resi come div.kg-lazy e caricati da
+static/js/lazy-graphs.js solo quando stanno per entrare nella viewport.
+
+I grafici con un'istantanea SVG (<lang>/graphs/<graph>.svg, vedi render_graph_svg.py) la
+hanno in "snapshot" e in "snapshots" della pagina: embedded-graph.html la usa per la
+stampa e nelle pagine senza JavaScript.
+
+Per i grafici lazy "aspects" della pagina dà il rapporto larghezza/altezza del grafico kg
+(graph_aspect): embedded-graph.html lo usa come aspect-ratio del div.kg-lazy, così lo
+spazio è riservato prima del caricamento e la pagina non si sposta.
+
+Le pagine sono lette tramite l'indice condiviso del corpus (corpus_index.py), come fanno
+number_figures_from_toc.py e find_orphan_fig_refs.py.
+
+{
+  "version": 2,
+  "pages": {
+    "it/I/2/1.md": {
+      "url": "it/I/2/1",
+      "bytes": 123456,
+      "eager": ["consumer/gr_discrete-pref"],
+      "snapshots": {"consumer/gr_discrete-pref": "it/graphs/consumer/gr_discrete-pref.svg", ...},
+      "aspects": {"consumer/gr_mrs-abc": 1.996, ...},
+      "graphs": [{"graph": "consumer/gr_discrete-pref", "src": "it/graphs/consumer/gr_discrete-pref.json",
+                  "bytes": 23456, "sha1": "...", "eager": true, "aspect": 1.996,
+                  "snapshot": "it/graphs/consumer/gr_discrete-pref.svg"}, ...]
+    }, ...
+  }
+}
+
+Usage:
+  python3 scripts/build_graph_manifest.py [--site-root .] [--fold 3000] [--index PATH]
+                                          [--no-index-cache] [--verbose]
+"""
+from pathlib import Path
+import argparse
+import hashlib
+import json
+import sys
+
+from corpus_index import (
+    DEFAULT_INDEX, corpus_files, load_index, save_index, refresh_index, index_path,
+    md_rel_to_page_url,
+)
+
+MANIFEST_VERSION = 2
+DEFAULT_OUT = "_data/graphs.json"
+DEFAULT_FOLD = 3000
+
+# aspectRatio dei layout di kg quando la specifica non lo dà (SquareLayout: 1.22);
+# con i controlli i layout orizzontali sono alti il doppio
+LAYOUT_ASPECT = {
+    "WideRectangleLayout": 2.44,
+    "OneWideGraphPlusSidebar": 2,
+    "TwoVerticalGraphsPlusSidebar": 1.3,
+    "TwoVerticalSquaresOneBigSquare": 1.6,
+}
+LAYOUT_ASPECT_CONTROLS = {
+    "TwoHorizontalGraphs": (4, 2),
+    "ThreeHorizontalGraphs": (4, 2),
+    "TwoHorizontalGraphsPlusSidebar": (2.4, 1.2),
+}
+SQUARE_ASPECT = 1.22
+# kg.View.updateDimensions: con la sidebar a destra il grafico occupa 77/126 della larghezza
+SIDEBAR_WIDTH = 77 / 126
+
+def graph_aspect(spec):
+    """
+    Width/height of the kg graph of a spec as kg lays it out on a wide page (sidebar on
+    the right), ignoring the explanation below it. None if the spec has no layout.
+    """
+    layout = spec.get("layout")
+    if isinstance(layout, dict) and "type" in layout:
+        # forma {type: OneGraphPlusSidebar, def: {...}}
+        name, definition = layout["type"], layout.get("def")
+    elif isinstance(layout, dict) and len(layout) == 1:
+        name, definition = next(iter(layout.items()))
+    else:
+        return None
+    if not isinstance(name, str):
+        return None
+    definition = definition if isinstance(definition, dict) else {}
+    aspect = spec.get("aspectRatio")
+    if not isinstance(aspect, (int, float)) or isinstance(aspect, bool) or aspect <= 0:
+        if name in LAYOUT_ASPECT_CONTROLS:
+            plain, with_controls = LAYOUT_ASPECT_CONTROLS[name]
+            controls = any(k.endswith("Controls") for k in definition)
+            aspect = with_controls if controls else plain
+        else:
+            aspect = LAYOUT_ASPECT.get(name, SQUARE_ASPECT)
+    if "Sidebar" in name:
+        aspect /= SIDEBAR_WIDTH
+    return round(aspect, 3)
+
+def graph_file_info(site_root: Path, src: str, cache):
+    """(bytes, sha1, aspect) of a compiled graph spec, or (None, None, None) if it does not exist."""
+    if src not in cache:
+        try:
+            data = (site_root / src).read_bytes()
+            try:
+                aspect = graph_aspect(json.loads(data))
+            except (ValueError, AttributeError):
+                aspect = None
+            cache[src] = (len(data), hashlib.sha1(data).hexdigest(), aspect)
+        except OSError:
+            cache[src] = (None, None, None)
+    return cache[src]
+
+def build_manifest(site_root: Path, entries, rels, fold=DEFAULT_FOLD):
+    """Manifest dict and the list of (page, graph) whose compiled .json is missing."""
+    pages = {}
+    missing = []
+    cache = {}
+    for rel in rels:
+        entry = entries.get(rel.as_posix())
+        if not entry or not entry.get("graphs"):
+            continue
+        lang = entry["lang"]
+        graphs = []
+        for i, (graph, offset) in enumerate(entry["graphs"]):
+            src = f"{lang}/graphs/{graph}.json"
+            size, sha1, aspect = graph_file_info(site_root, src, cache)
+            snapshot = f"{lang}/graphs/{graph}.svg"
+            if size is None:
+                missing.append((rel, graph))
+            graphs.append({
+                "graph": graph,
+                "src": src,
+                "bytes": size,
+                "sha1": sha1,
+                "eager": i == 0 or offset < fold,
+                "aspect": aspect,
+                "snapshot": snapshot if (site_root / snapshot).is_file() else None,
+            })
+        pages[rel.as_posix()] = {
+            "url": md_rel_to_page_url(rel),
+            "bytes": sum(g["bytes"] or 0 for g in graphs),
+            "eager": [g["graph"] for g in graphs if g["eager"]],
+            "snapshots": {g["graph"]: g["snapshot"] for g in graphs if g["snapshot"]},
+            "aspects": {g["graph"]: g["aspect"] for g in graphs if not g["eager"] and g["aspect"]},
+            "graphs": graphs,
+        }
+    return {"version": MANIFEST_VERSION, "pages": pages}, missing
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--site-root", default=".", help="root del sito (default .)")
+    ap.add_argument("--out", default=None, help=f"manifest path (default <site-root>/{DEFAULT_OUT})")
+    ap.add_argument("--fold", type=int, default=DEFAULT_FOLD,
+                    help=f"graphs starting within this many characters of the page are preloaded (default {DEFAULT_FOLD})")
+    ap.add_argument("--index", default=None, help=f"corpus index path (default <site-root>/{DEFAULT_INDEX})")
+    ap.add_argument("--no-index-cache", action="store_true", help="do not read or write the corpus index")
+    ap.add_argument("--verbose", action="store_true")
+    args = ap.parse_args()
+
+    site_root = Path(args.site_root).resolve()
+    idx_path = index_path(site_root, args.index, args.no_index_cache)
+    entries = load_index(idx_path)
+    rels = corpus_files(site_root)
+    refresh_index(site_root, rels, entries)
+    save_index(idx_path, site_root, entries)
+
+    manifest, missing = build_manifest(site_root, entries, rels, args.fold)
+    for rel, graph in missing:
+        print(f"[WARN] {rel}: no compiled spec for graph '{graph}' (run scripts/compile_graph_calcs.py)")
+
+    out = Path(args.out) if args.out else site_root / DEFAULT_OUT
+    text = json.dumps(manifest, ensure_ascii=False, indent=1, sort_keys=True) + "\n"
+    # riscrivi solo se cambia, per non far rigenerare tutto il sito a jekyll serve
+    if not out.exists() or out.read_text(encoding="utf-8") != text:
+        out.parent.mkdir(parents=True, exist_ok=True)
+        out.write_text(text, encoding="utf-8")
+        print(f"[INFO] graph manifest written -> {out}")
+
+    pages = manifest["pages"]
+    n_graphs = sum(len(p["graphs"]) for p in pages.values())
+    n_eager = sum(len(p["eager"]) for p in pages.values())
+    n_snap = sum(len(p["snapshots"]) for p in pages.values())
+    print(f"Pages with graphs: {len(pages)}  graphs: {n_graphs}  preloaded: {n_eager}  lazy: {n_graphs - n_eager}"
+          f"  with snapshot: {n_snap}")
+    if args.verbose:
+        for key, page in pages.items():
+            print(f"  {key}: {len(page['graphs'])} graphs, {page['bytes']} bytes, eager: {', '.join(page['eager'])}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+build_nav.py
+
+Scrive _data/nav.json: per ogni pagina del libro (sezioni e pagine dei capitoli, in
+it/ e en/) i dati di navigazione che page.html, chapter.html e next-previous.html
+calcolavano a ogni pagina scorrendo _data/toc.yml con `where` e cicli annidati:
+- numero e titolo della sezione, titolo e etichetta del capitolo ("Capitolo 2",
+  "Appendix A"), titolo della parte
+- breadcrumb (libro / parte / capitolo)
+- pagina precedente e successiva nel capitolo (null all'inizio e alla fine, come prima)
+- per le pagine dei capitoli, l'elenco delle sezioni
+- le label delle figure della pagina, numerate come in number_figures_from_toc.py
+
+Le pagine sono quelle di build_file_list (lo stesso giro del TOC della numerazione delle
+figure), con chiave l'url della pagina (md_rel_to_page_url: it/I/2/1, it/I/2); nei
+layout la chiave si ottiene da page.path con `replace: '/index.md', '' | remove: '.md'`.
+Le pagine senza voce (es. non ancora nel TOC) usano ancora i cicli sul TOC.
+Il file è riscritto solo se cambia; number_figures_from_toc.py --watch lo aggiorna a ogni
+modifica di una pagina o del TOC.
+
+{
+  "version": 1,
+  "pages": {
+    "it/I/2/1": {
+      "path": "it/I/2/1.md", "lang": "it", "part": "I", "chapter": "2", "section": 1,
+      "number": "2.1", "title": "Preferenze e utilità", "draft": false,
+      "chapter_title": "...", "chapter_label": "Capitolo 2", "part_title": "...",
+      "breadcrumb": [{"title": "Note di Microeconomia", "url": "it"},
+                     {"title": "Parte I: Mercati e concorrenza", "url": null},
+                     {"title": "Capitolo 2: ...", "url": "it/I/2"}],
+      "prev": null,
+      "next": {"url": "it/I/2/2", "number": "2.2", "title": "..."},
+      "figures": [{"id": "gr_consumer/discrete-pref", "label": "FIGURA 2.1"}, ...]
+    }, ...
+  }
+}
+
+Usage:
+  python3 scripts/build_nav.py [--site-root .] [--out PATH] [--index PATH] [--no-index-cache]
+                               [--verbose]
+"""
+from pathlib import Path
+import argparse
+import json
+import sys
+
+from corpus_index import DEFAULT_INDEX, load_index, save_index, refresh_index, index_path, md_rel_to_page_url
+from number_figures_from_toc import load_toc, walk_toc, build_file_list, build_id_map
+
+NAV_VERSION = 1
+DEFAULT_OUT = "_data/nav.json"
+
+LANGS = ("it", "en")
+WORDS = {
+    "it": {"part": "Parte", "chapter": "Capitolo", "appendix": "Appendice"},
+    "en": {"part": "Part", "chapter": "Chapter", "appendix": "Appendix"},
+}
+
+def localized(obj, lang):
+    """title[lang] of a TOC node, stripped ('' if missing)."""
+    title = (obj or {}).get("title") or {}
+    if isinstance(title, dict):
+        title = title.get(lang) or ""
+    return str(title).strip()
+
+def toc_pages(toc):
+    """
+    Navigation entries for every page the TOC can produce, keyed by page url,
+    whether or not the file exists.
+    """
+    pages = {}
+    for part_folder, chap_folder, part, chap in walk_toc(toc):
+        sections = chap.get("sections", []) or []
+        for lang in LANGS:
+            words = WORDS[lang]
+            chapter_url = f"{lang}/{part_folder}/{chap_folder}"
+            chapter_title = localized(chap, lang)
+            chapter_label = f"{words['appendix'] if chap.get('appendix') else words['chapter']} {chap_folder}"
+            part_title = localized(part, lang)
+            breadcrumb = [
+                {"title": localized(toc, lang), "url": lang},
+                {"title": f"{words['part']} {part_folder}: {part_title}" if part_folder else part_title, "url": None},
+                {"title": f"{chapter_label}: {chapter_title}", "url": chapter_url},
+            ]
+            links = [
+                {"url": f"{chapter_url}/{i}", "number": f"{chap_folder}.{i}", "title": localized(sec, lang),
+                 "draft": bool(sec.get("draft"))}
+                for i, sec in enumerate(sections, 1)
+            ]
+            common = {
+                "lang": lang,
+                "part": part_folder,
+                "chapter": chap_folder,
+                "chapter_title": chapter_title,
+                "chapter_label": chapter_label,
+                "appendix": bool(chap.get("appendix")),
+                "part_title": part_title,
+                "breadcrumb": breadcrumb,
+            }
+            pages[chapter_url] = dict(common, path=f"{chapter_url}/index.md", section=None,
+                                      number=chap_folder, title=chapter_title, draft=False,
+                                      prev=None, next=None, sections=links)
+            for i, link in enumerate(links):
+                pages[link["url"]] = dict(common, path=f"{link['url']}.md", section=i + 1,
+                                          number=link["number"], title=link["title"], draft=link["draft"],
+                                          prev=nav_link(links[i - 1]) if i > 0 else None,
+                                          next=nav_link(links[i + 1]) if i + 1 < len(links) else None)
+    return pages
+
+def nav_link(link):
+    return {k: link[k] for k in ("url", "number", "title")}
+
+def build_nav(site_root: Path, entries, files_rel):
+    """nav.json dict for the pages in files_rel (TOC order), with their figure labels."""
+    toc = load_toc(site_root) or {}
+    candidates = toc_pages(toc)
+    id_map, _ = build_id_map(files_rel, entries)
+    figures = {}
+    for lang in LANGS:
+        for fig_id, (label, page_url, kind) in id_map[lang].items():
+            if kind == "figure":
+                figures.setdefault(page_url, []).append({"id": fig_id, "label": label})
+
+    pages = {}
+    for rel in files_rel:
+        url = md_rel_to_page_url(rel)
+        page = candidates.get(url)
+        if page is None:
+            continue
+        pages[url] = dict(page, figures=figures.get(url, []))
+    return {"version": NAV_VERSION, "pages": pages}
+
+def update_nav(site_root: Path, files_rel, idx_path, out: Path):
+    """
+    Refresh the corpus index, build nav.json for files_rel and write it to `out` only if it
+    changed. Returns (nav, written).
+    """
+    entries = load_index(idx_path)
+    refresh_index(site_root, files_rel, entries)
+    save_index(idx_path, site_root, entries)
+    files_rel = [rel for rel in files_rel if rel.as_posix() in entries]
+
+    nav = build_nav(site_root, entries, files_rel)
+    text = json.dumps(nav, ensure_ascii=False, indent=1, sort_keys=True) + "\n"
+    # riscrivi solo se cambia, per non far rigenerare tutto il sito a jekyll serve
+    if out.exists() and out.read_text(encoding="utf-8") == text:
+        return nav, False
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(text, encoding="utf-8")
+    return nav, True
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--site-root", default=".", help="root del sito (default .)")
+    ap.add_argument("--out", default=None, help=f"output path (default <site-root>/{DEFAULT_OUT})")
+    ap.add_argument("--index", default=None, help=f"corpus index path (default <site-root>/{DEFAULT_INDEX})")
+    ap.add_argument("--no-index-cache", action="store_true", help="do not read or write the corpus index")
+    ap.add_argument("--verbose", action="store_true")
+    args = ap.parse_args()
+
+    site_root = Path(args.site_root).resolve()
+    files_rel = [p.relative_to(site_root) for p in build_file_list(site_root)]
+    if not files_rel:
+        print("[ERROR] nessun file md trovato (toc.yml mancante o vuoto)", file=sys.stderr)
+        return 1
+
+    idx_path = index_path(site_root, args.index, args.no_index_cache)
+    out = Path(args.out) if args.out else site_root / DEFAULT_OUT
+    nav, written = update_nav(site_root, files_rel, idx_path, out)
+    if written:
+        print(f"[INFO] navigation written -> {out}")
+
+    pages = nav["pages"]
+    n_sections = sum(1 for p in pages.values() if p["section"] is not None)
+    print(f"Pages: {len(pages)}  sections: {n_sections}  chapters: {len(pages) - n_sections}")
+    if args.verbose:
+        for url, page in pages.items():
+            prev = page["prev"]["url"] if page["prev"] else "-"
+            nxt = page["next"]["url"] if page["next"] else "-"
+            print(f"  {url}: {page['number']} {page['title']}  prev={prev} next={nxt}  figures={len(page['figures'])}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+build_search_index.py
+
+Costruisce in anticipo l'indice di ricerca usato da static/js/search.js, al posto dei
+vecchi it/search.json ed en/search.json generati in Liquid a ogni build di Jekyll.
+
+Per ogni lingua scrive in <lang>/search/:
+- index.json: elenco delle pagine (url, titolo, shard) e indice invertito
+  {termini ordinati -> id delle pagine}, da cui search.js sceglie le pagine candidate
+  (ogni parola cercata dentro un termine o a cavallo di termini consecutivi)
+- <shard>.json: il testo delle pagine di una parte del libro (I, II, ...; "front" per
+  la prefazione), scaricato dal browser solo se contiene pagine candidate
+
+I termini sono estratti dal testo come lo vede search.js (search_text, porting di
+stripLiquidAndNoise + normalize), così le pagine scartate dall'indice sono proprio quelle
+in cui la ricerca per sottostringa non troverebbe nulla.
+
+I titoli vengono dal TOC (_data/toc.yml), come nel vecchio template: "2.3 Titolo sezione"
+per le sezioni, "Prefazione"/"Preface" per pr.md.
+
+I file il cui contenuto non cambia non vengono riscritti, per non far rigenerare il sito a
+`jekyll serve`; number_figures_from_toc.py --watch ricostruisce l'indice della lingua di
+ogni pagina modificata.
+
+Usage:
+  python3 scripts/build_search_index.py [--site-root .] [--lang it|en] [--verbose]
+"""
+from pathlib import Path
+import argparse
+import html
+import json
+import re
+import sys
+import unicodedata
+
+from corpus_index import LANGS, corpus_files, md_rel_to_page_url
+from number_figures_from_toc import load_toc, build_file_list
+
+INDEX_VERSION = 2
+OUT_DIR = "search"
+
+PREFACE_TITLE = {"it": "Prefazione", "en": "Preface"}
+
+# pagine escluse dai risultati anche da search.js (indice grande / split)
+SKIP_PAGES = ("index.md", "toc-big.md")
+
+FRONT_MATTER_RE = re.compile(r'\A---\s*\n(.*?)\n?---[ \t]*(?:\n|\Z)', re.DOTALL)
+LIQUID_RE = re.compile(r'\{%.*?%\}|\{\{.*?\}\}', re.DOTALL)
+DROP_BLOCK_RE = re.compile(r'<!--.*?-->|<(script|style)\b[^>]*>.*?</\1\s*>', re.IGNORECASE | re.DOTALL)
+TAG_RE = re.compile(r'<[^>]+>')
+MD_IMAGE_LINK_RE = re.compile(r'!?\[([^\]]*)\]\([^)]*\)')
+MD_ATTR_RE = re.compile(r'\{:[^}]*\}|\{::[^}]*/?\}')
+MD_HEADING_RE = re.compile(r'^\s{0,3}#{1,6}\s*', re.MULTILINE)
+MD_EMPHASIS_RE = re.compile(r'\*\*|__')
+SPACE_RE = re.compile(r'\s+')
+NON_WORD_RE = re.compile(r'[\W_]+')
+
+# come stripLiquidAndNoise() in search.js: formule display tolte, $...$ protette
+SEARCH_DROP_RES = (
+    re.compile(r'\{%.*?%\}', re.DOTALL),
+    re.compile(r'\{\{.*?\}\}', re.DOTALL),
+    re.compile(r'\\\(\s*\\begin\{(gathered|aligned)\}.*?\\end\{\1\}\s*\\\)', re.DOTALL),
+    re.compile(r'\\\[\s*\\begin\{(gathered|aligned)\}.*?\\end\{\1\}\s*\\\]', re.DOTALL),
+    re.compile(r'\\begin\{(gathered|aligned)\}.*?\\end\{\1\}', re.DOTALL),
+    re.compile(r'\$\$.*?\$\$', re.DOTALL),
+    re.compile(r'\\\[.*?\\\]', re.DOTALL),
+)
+SEARCH_LATEX_RE = re.compile(r'(\$\$?).*?\1', re.DOTALL)
+
+def page_text(text: str) -> str:
+    """Plain text of a Markdown page (what strip_html | strip_newlines used to produce)."""
+    text = FRONT_MATTER_RE.sub('', text, count=1)
+    text = LIQUID_RE.sub(' ', text)
+    text = DROP_BLOCK_RE.sub(' ', text)
+    text = TAG_RE.sub('', text)
+    text = MD_IMAGE_LINK_RE.sub(r'\1', text)
+    text = MD_ATTR_RE.sub('', text)
+    text = MD_HEADING_RE.sub('', text)
+    text = MD_EMPHASIS_RE.sub('', text)
+    text = html.unescape(text)
+    return SPACE_RE.sub(' ', text).strip()
+
+def split_glued_words(text: str) -> str:
+    """Space between a lowercase letter/digit and Upper+lower ("rappresentaIl"), as search.js does."""
+    cat = unicodedata.category
+    out = []
+    for i, c in enumerate(text):
+        if (0 < i < len(text) - 1 and cat(c) == "Lu" and cat(text[i + 1]) == "Ll"
+                and (cat(text[i - 1]) == "Ll" or cat(text[i - 1])[0] == "N")):
+            out.append(" ")
+        out.append(c)
+    return "".join(out)
+
+def search_text(text: str) -> str:
+    """The text search.js scores (stripLiquidAndNoise), before normalize()."""
+    for drop_re in SEARCH_DROP_RES:
+        text = drop_re.sub(" ", text)
+    out = []
+    pos = 0
+    for m in SEARCH_LATEX_RE.finditer(text):
+        out.append(split_glued_words(text[pos:m.start()]))
+        out.append(m.group(0))
+        pos = m.end()
+    out.append(split_glued_words(text[pos:]))
+    return "".join(out)
+
+def normalize_terms(text: str):
+    """Same normalization as normalize() in search.js: lowercase, no accents, split on non-alphanumerics."""
+    text = unicodedata.normalize("NFD", text.lower())
+    text = ''.join(c for c in text if not ('\u0300' <= c <= '\u036f'))
+    return NON_WORD_RE.sub(' ', text).split()
+
+def front_matter_title(text: str):
+    m = FRONT_MATTER_RE.match(text)
+    if not m:
+        return None
+    for line in m.group(1).splitlines():
+        if line.startswith("title:"):
+            return line[len("title:"):].strip().strip('"\'') or None
+    return None
+
+def toc_titles(toc, lang: str):
+    """{page url without .html: title} for chapter sections, as the Liquid template built them."""
+    titles = {}
+    for part in (toc or {}).get("parts") or []:
+        part_folder = str(part.get("folder", "")).strip()
+        for chap in part.get("chapters", []) or []:
+            chap_folder = str(chap.get("folder", "")).strip()
+            for i, sec in enumerate(chap.get("sections", []) or [], start=1):
+                sec_title = ((sec or {}).get("title") or {}).get(lang)
+                if sec_title:
+                    titles[f"{lang}/{part_folder}/{chap_folder}/{i}"] = f"{chap_folder}.{i} {sec_title}"
+    return titles
+
+def collect_pages(site_root: Path, lang: str):
+    """Pages of one language: TOC order first, then any other .md outside graphs/."""
+    rels = [p.relative_to(site_root) for p in build_file_list(site_root)]
+    seen = set(rels)
+    rels += [r for r in corpus_files(site_root) if r not in seen]
+    pages = []
+    for rel in rels:
+        if rel.parts[0] != lang or "graphs" in rel.parts[1:]:
+            continue
+        if len(rel.parts) == 2 and rel.name in SKIP_PAGES:
+            continue
+        pages.append(rel)
+    return pages
+
+def build_language(site_root: Path, lang: str, toc, verbose=False):
+    """
+    Write <lang>/search/ (only the files whose content changed).
+    Returns (pages, terms, shards, files written or removed).
+    """
+    titles = toc_titles(toc, lang)
+    pages = []      # [url, title, shard]
+    shards = {}     # shard -> [[page id, text], ...]
+    postings = {}   # term -> sorted page ids
+
+    for rel in collect_pages(site_root, lang):
+        raw = (site_root / rel).read_text(encoding="utf-8")
+        text = page_text(raw)
+        if not text:
+            # come nel template Liquid: le pagine senza contenuto (es. indici di capitolo) non sono indicizzate
+            continue
+        page_url = md_rel_to_page_url(rel)
+        url = f"/{page_url}/index.html" if rel.name == "index.md" else f"/{page_url}.html"
+        if rel.name == "pr.md" and len(rel.parts) == 2:
+            title = PREFACE_TITLE[lang]
+        else:
+            title = titles.get(page_url) or front_matter_title(raw) or url
+        shard = rel.parts[1] if len(rel.parts) > 2 else "front"
+        page_id = len(pages)
+        pages.append([url, title, shard])
+        shards.setdefault(shard, []).append([page_id, text])
+        for term in set(normalize_terms(search_text(text + " " + title))):
+            postings.setdefault(term, []).append(page_id)
+        if verbose:
+            print(f"  [{lang}] {rel} -> {shard}")
+
+    terms = sorted(postings)
+    index = {
+        "version": INDEX_VERSION,
+        "lang": lang,
+        "pages": pages,
+        "shards": {name: f"{name}.json" for name in shards},
+        "terms": terms,
+        "postings": [postings[t] for t in terms],
+    }
+
+    out_dir = site_root / lang / OUT_DIR
+    out_dir.mkdir(parents=True, exist_ok=True)
+    outputs = {"index.json": index}
+    outputs.update({f"{name}.json": items for name, items in shards.items()})
+    written = 0
+    for name, data in outputs.items():
+        out = out_dir / name
+        text = json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+        if not out.exists() or out.read_text(encoding="utf-8") != text:
+            out.write_text(text, encoding="utf-8")
+            written += 1
+    # rimuovi shard di parti che non esistono più
+    for old in out_dir.glob("*.json"):
+        if old.name not in outputs:
+            old.unlink()
+            written += 1
+    return len(pages), len(terms), len(shards), written
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--site-root", default=".", help="root del sito (default .)")
+    ap.add_argument("--lang", choices=LANGS, action="append",
+                    help="build only this language (repeatable; default: all)")
+    ap.add_argument("--verbose", action="store_true")
+    args = ap.parse_args()
+
+    site_root = Path(args.site_root).resolve()
+    toc = load_toc(site_root)
+    for lang in args.lang or LANGS:
+        if not (site_root / lang).exists():
+            continue
+        n_pages, n_terms, n_shards, n_written = build_language(site_root, lang, toc, args.verbose)
+        print(f"[{lang}] search index: {n_pages} pages, {n_terms} terms, {n_shards} shards -> {lang}/{OUT_DIR}/"
+              f" ({n_written} file(s) written)")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+"""
+compile_graph_calcs.py
+
+Compila in anticipo i `calcs` delle specifiche dei grafici (<lang>/graphs/**/gr_*.yml):
+- analizza ogni espressione una volta sola (kg_spec.parse_expr)
+- costruisce il grafo delle dipendenze tra calcs e params
+- rifiuta riferimenti non definiti (params.x / calcs.x), funzioni o nomi sconosciuti,
+  errori di sintassi e cicli
+- scrive accanto a ogni YAML un <nome>.json con la specifica già convertita e i calcs
+  in ordine topologico, che embedded-graph.html passa a kg al posto del .yml
+
+Con i calcs ordinati kg li valuta tutti al primo giro di evalCalcs, invece di ripetere
+fino a 5 passate le valutazioni fallite (e le relative eccezioni di mathjs); il browser
+inoltre non deve più caricare ed eseguire js-yaml sulla specifica.
+
+calcs.<nome> che non compaiono nel blocco calcs sono accettati se <nome> è il `name`
+di un oggetto del layout (kg li genera a runtime, es. BudgetLine).
+
+Un params.x non definito è un errore solo se il calc serve (citato fuori dal blocco
+calcs, direttamente o tramite altri calcs): nei calcs inutilizzati è solo un avviso,
+come nel browser dove kg li lascia al testo sorgente senza conseguenze.
+
+Mentre Jekyll è attivo, number_figures_from_toc.py --watch ricompila le specifiche
+modificate; serve.sh esegue prima --check per segnalare i .json committati non allineati.
+
+Exit codes:
+  0 -> tutto compilato (eventualmente con avvisi)
+  1 -> almeno una specifica con errori (nessun .json scritto per quella specifica),
+       oppure con --check almeno un .json mancante o non aggiornato
+
+Usage:
+  python3 scripts/compile_graph_calcs.py [--site-root .] [--check] [--verbose] [files...]
+"""
+from pathlib import Path
+import argparse
+import hashlib
+import json
+import re
+import sys
+
+from corpus_index import atomic_write_text
+from kg_spec import (
+    SpecError, load_spec, graph_specs, param_names, parse_expr, expr_refs, expr_names,
+    KNOWN_FUNCTIONS, KNOWN_METHODS, KNOWN_CONSTANTS,
+)
+
+def layout_names(obj, acc=None):
+    """`name` values of the objects in the layout (their calcs are generated by kg)."""
+    if acc is None:
+        acc = set()
+    if isinstance(obj, dict):
+        name = obj.get("name")
+        if isinstance(name, str):
+            acc.add(name)
+        for v in obj.values():
+            layout_names(v, acc)
+    elif isinstance(obj, list):
+        for v in obj:
+            layout_names(v, acc)
+    return acc
+
+CALC_REF_RE = re.compile(r'\bcalcs\.([A-Za-z_]\w*)')
+
+def spec_calc_refs(obj, acc=None):
+    """Names of the calcs referenced outside the calcs block (layout, params, ...)."""
+    if acc is None:
+        acc = set()
+        obj = {k: v for k, v in obj.items() if k != "calcs"}
+    if isinstance(obj, dict):
+        for v in obj.values():
+            spec_calc_refs(v, acc)
+    elif isinstance(obj, list):
+        for v in obj:
+            spec_calc_refs(v, acc)
+    elif isinstance(obj, str):
+        acc.update(CALC_REF_RE.findall(obj))
+    return acc
+
+def used_calcs(spec, deps):
+    """Calcs the spec needs: referenced outside the calcs block, plus their dependencies."""
+    used = set()
+    pending = [n for n in spec_calc_refs(spec) if n in deps]
+    while pending:
+        name = pending.pop()
+        if name not in used:
+            used.add(name)
+            pending.extend(deps[name])
+    return used
+
+def calc_leaves(value, path=()):
+    """(path, expression) for a calc: a single expression or a nested object of expressions."""
+    if isinstance(value, dict):
+        for k, v in value.items():
+            yield from calc_leaves(v, path + (str(k),))
+    else:
+        yield path, value
+
+def find_cycle(deps, names):
+    """One dependency cycle among `names` (list of calc names, first repeated at the end)."""
+    remaining = set(names)
+    for start in names:
+        stack = [start]
+        seen = {start: 0}
+        while stack:
+            cur = stack[-1]
+            nxt = next((d for d in deps[cur] if d in remaining), None)
+            if nxt is None:
+                break
+            if nxt in seen:
+                return stack[seen[nxt]:] + [nxt]
+            seen[nxt] = len(stack)
+            stack.append(nxt)
+    return list(names[:1])
+
+def compile_calcs(spec, warnings=None):
+    """
+    Parse and order the calcs of a spec.
+    Returns (order, deps, errors): calc names in topological order (ties keep the
+    original order), {calc: [calc dependencies]} and a list of error messages.
+    Undefined params in unused calcs are not errors: they go to `warnings` if given.
+    """
+    errors = []
+    undefined = {}
+    params = param_names(spec)
+    for p in sorted(set(n for n in params if params.count(n) > 1)):
+        errors.append(f"params: duplicate name '{p}'")
+    params = set(params)
+    calcs = spec.get("calcs") or {}
+    if not isinstance(calcs, dict):
+        return [], {}, ["calcs is not a mapping"]
+    runtime = layout_names(spec.get("layout"))
+
+    deps = {}
+    for name, value in calcs.items():
+        name = str(name)
+        deps[name] = []
+        for path, src in calc_leaves(value):
+            where = ".".join(("calcs", name) + path)
+            try:
+                tree = parse_expr(src)
+            except SpecError as e:
+                errors.append(f"{where}: {e} in {src!r}")
+                continue
+            functions, methods, bare = expr_names(tree)
+            for fn in sorted(functions - KNOWN_FUNCTIONS):
+                errors.append(f"{where}: unknown function '{fn}'")
+            for fn in sorted(methods - KNOWN_METHODS):
+                errors.append(f"{where}: unknown method '.{fn}()'")
+            for n in sorted(bare - KNOWN_CONSTANTS):
+                errors.append(f"{where}: unknown name '{n}'")
+            for ns, ref in sorted(expr_refs(tree)):
+                if ns == "params":
+                    if ref not in params:
+                        undefined.setdefault(name, []).append(f"{where}: undefined params.{ref}")
+                elif ref in calcs:
+                    if ref not in deps[name]:
+                        deps[name].append(ref)
+                elif ref not in runtime:
+                    errors.append(f"{where}: undefined calcs.{ref}")
+
+    used = used_calcs(spec, deps)
+    for name, messages in undefined.items():
+        if name in used:
+            errors.extend(messages)
+        elif warnings is not None:
+            warnings.extend(m + " (unused calc)" for m in messages)
+
+    # ordinamento topologico stabile
+    order = []
+    done = set()
+    pending = list(deps)
+    while pending:
+        ready = [n for n in pending if all(d in done for d in deps[n])]
+        if not ready:
+            cycle = find_cycle(deps, pending)
+            errors.append("calcs: dependency cycle " + " -> ".join(cycle))
+            break
+        for n in ready:
+            order.append(n)
+            done.add(n)
+        pending = [n for n in pending if n not in done]
+    return order, deps, errors
+
+def compiled_json(spec, order, source_name, source_sha1):
+    """JSON text for kg: the spec with ordered calcs, with the entity fixes kg applies to YAML."""
+    calcs = spec.get("calcs") or {}
+    out = dict(spec)
+    if isinstance(spec.get("calcs"), dict):
+        out["calcs"] = {n: calcs[n] for n in order}
+    out["compiled"] = {"source": source_name, "sha1": source_sha1}
+    text = json.dumps(out, ensure_ascii=False, indent=1)
+    # come generateViewFromYamlText in kg: &gt; &lt; &amp; -> > < &
+    return text.replace("&gt;", ">").replace("&lt;", "<").replace("&amp;", "&") + "\n"
+
+def load_compiled(path: Path):
+    """
+    Spec from the compiled .json next to `path` if it is up to date with the YAML
+    (much faster than parsing the YAML again), otherwise from the YAML itself.
+    """
+    path = Path(path)
+    out = path.with_suffix(".json")
+    if out.exists():
+        try:
+            spec = json.loads(out.read_text(encoding="utf-8"))
+        except ValueError:
+            spec = None
+        if isinstance(spec, dict) and spec.get("compiled", {}).get("sha1") == hashlib.sha1(path.read_bytes()).hexdigest():
+            del spec["compiled"]
+            return spec
+    return load_spec(path)
+
+def compile_file(site_root: Path, rel: Path, check=False):
+    """
+    Compile one spec. Returns (errors, warnings, status) with status 'ok', 'written'
+    or 'stale'.
+    """
+    full = site_root / rel
+    data = full.read_bytes()
+    try:
+        spec = load_spec(full)
+    except SpecError as e:
+        return [str(e)], [], None
+    warnings = []
+    order, _, errors = compile_calcs(spec, warnings)
+    if errors:
+        return errors, warnings, None
+    text = compiled_json(spec, order, rel.name, hashlib.sha1(data).hexdigest())
+    out = full.with_suffix(".json")
+    if out.exists() and out.read_text(encoding="utf-8") == text:
+        return [], warnings, "ok"
+    if check:
+        return [], warnings, "stale"
+    atomic_write_text(out, text)
+    return [], warnings, "written"
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--site-root", default=".", help="root del sito (default .)")
+    ap.add_argument("--check", action="store_true",
+                    help="do not write: fail if a compiled .json is missing or out of date")
+    ap.add_argument("--verbose", action="store_true")
+    ap.add_argument("files", nargs="*", help="spec files (default: every <lang>/graphs/**/*.yml)")
+    args = ap.parse_args()
+
+    site_root = Path(args.site_root).resolve()
+    if args.files:
+        rels = [Path(f).resolve().relative_to(site_root) for f in args.files]
+    else:
+        rels = graph_specs(site_root)
+
+    failed = 0
+    stale = 0
+    written = 0
+    warned = 0
+    for rel in rels:
+        errors, warnings, status = compile_file(site_root, rel, args.check)
+        if warnings:
+            warned += 1
+            print(f"⚠️  {rel}")
+            for w in warnings:
+                print(f"    {w}")
+        if errors:
+            failed += 1
+            print(f"❌ {rel}")
+            for e in errors:
+                print(f"    {e}")
+            continue
+        if status == "stale":
+            stale += 1
+            print(f"⚠️  {rel}: compiled .json missing or out of date")
+        elif status == "written":
+            written += 1
+            if args.verbose:
+                print(f"[WRITE] {rel.with_suffix('.json')}")
+
+    print(f"Specs: {len(rels)}  written: {written}  warnings: {warned}  errors: {failed}"
+          + (f"  stale: {stale}" if args.check else ""))
+    return 1 if failed or stale else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
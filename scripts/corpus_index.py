@@ -0,0 +1,346 @@
+#!/usr/bin/env python3
+"""
+corpus_index.py
+
+Indice condiviso del corpus Markdown (it/ + en/) usato da number_figures_from_toc.py
+e da find_orphan_fig_refs.py, così che il corpus venga letto e analizzato una volta sola.
+
+Per ogni file .md l'indice contiene:
+- lingua e capitolo (detect_lang_from_path / extract_chapter)
+- le label numerate di ogni tipo (figure, equazioni, teoremi, ... vedi label_kinds.py) in
+  ordine di apparizione, e gli id delle figure anche con la regex (più permissiva) del
+  controllo degli orphan
+- token [[FIG:id]] e anchor "Figura|Figure N" con il numero di riga
+- tutti gli id referenziati (token di ogni tipo e suffissi dopo '#' negli href)
+- i grafici inclusi con {% include textbook-graph.html graph="..." %} e la loro posizione
+
+L'indice è salvato in JSON (default <site-root>/.corpus-index.json); ogni voce è
+riusata finché mtime e dimensione del file non cambiano, e il contenuto è
+identificato dallo sha1.
+
+Con --jobs N l'analisi dei file cambiati è distribuita su N processi; i risultati sono
+raccolti nell'ordine dei file, quindi l'indice è identico a quello dell'esecuzione seriale.
+
+Usage:
+  python3 scripts/corpus_index.py [--site-root .] [--index PATH] [--jobs N] [--verbose]
+"""
+from bisect import bisect_right
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import argparse
+import hashlib
+import json
+import os
+import re
+import stat
+import sys
+import tempfile
+
+from label_kinds import LABEL_KIND_RE, TOKEN_KIND_RE, kind_of_class
+from profiling import NULL_PROFILER, file_stats, now_us
+
+INDEX_VERSION = 3
+DEFAULT_INDEX = ".corpus-index.json"
+
+LANGS = ("it", "en")
+
+# p.figure-label id="..." (opening tag only, as in find_orphan_fig_refs.py)
+LABEL_RE = re.compile(
+    r'<p\b[^>]*\bclass=["\'][^"\']*figure-label[^"\']*["\'][^>]*\bid=["\']([^"\']+)["\']',
+    re.IGNORECASE
+)
+
+# matches our inline references like [[FIG:gr_consumer/discrete-pref]] (allows spaces)
+REF_RE = re.compile(r'\[\[\s*FIG\s*:\s*([^\]\s]+)\s*\]\]', re.IGNORECASE)
+
+# regex to find anchor tags with href containing #...  (capture href and inner HTML)
+ANCHOR_FULL_RE = re.compile(
+    r'<a\b([^>]*)\bhref\s*=\s*(?P<q>["\'])(?P<h>[^"\']*#(?P<id>[^"\'>]+))(?P=q)([^>]*)>(?P<inner>.*?)</a>',
+    re.IGNORECASE | re.DOTALL
+)
+
+# regex to detect anchor inner text that matches "Figura 1.2" or "Figure 1.2"
+FIGURE_TEXT_RE = re.compile(r'^\s*(Figura|Figure)\s+\d+(?:\.\d+)*\s*$', re.IGNORECASE)
+
+# href="...#id" inside anchors (used only to record which ids a file points to)
+HREF_RE = re.compile(r'<a\b[^>]*\bhref=(["\'])([^"\']*#[^"\']*)\1', re.IGNORECASE)
+
+# {% include textbook-graph.html graph="consumer/gr_VDB" %} (graph name in group 1)
+GRAPH_INCLUDE_RE = re.compile(
+    r'\{%-?\s*include\s+(?:textbook|embedded)-graph\.html\b[^%]*?\bgraph\s*=\s*["\']([^"\']+)["\'][^%]*%\}'
+)
+
+def md_rel_to_page_url(rel_path: Path) -> str:
+    """
+    Convert a Path like it/I/1/1.md -> it/I/1/1
+    it/I/1/index.md -> it/I/1
+    """
+    p = str(rel_path).replace("\\", "/")
+    if p.endswith(".md"):
+        p = p[:-3]
+    if p.endswith("/index"):
+        p = p[:-6]
+    return p
+
+def detect_lang_from_path(path: Path) -> str:
+    parts = list(path.parts)
+    if len(parts) > 0 and parts[0] in LANGS:
+        return parts[0]
+    # fallback: try to find 'it' or 'en' anywhere
+    for part in parts:
+        if part in LANGS:
+            return part
+    return "it"
+
+def extract_chapter(path: Path):
+    """
+    Extract chapter number from path, supporting both it/ and en/
+    e.g. it/I/2/3.md -> '2' (the chapter folder)
+    e.g. it/I/2.md -> '2' (if layout has no section)
+    fallback: parent folder name
+    """
+    parts = list(path.parts)
+    # find index of 'it' or 'en'
+    idx = None
+    for i, p in enumerate(parts):
+        if p in LANGS:
+            idx = i
+            break
+    if idx is not None:
+        # expect layout it/<PART>/<CHAPTER>/... or it/<PART>/<CHAPTER>.md
+        if len(parts) > idx + 2:
+            return parts[idx + 2]
+    return path.parent.name
+
+def strip_tags(s: str) -> str:
+    """Rimuove eventuali tag HTML dall'inner HTML per ottenere solo testo."""
+    return re.sub(r'<[^>]+>', '', s).strip()
+
+def corpus_files(site_root: Path):
+    """All .md files under it/ and en/, relative to site_root, in rglob order."""
+    rels = []
+    for lang in LANGS:
+        base = site_root / lang
+        if base.exists():
+            rels.extend(p.relative_to(site_root) for p in base.rglob("*.md"))
+    return rels
+
+def newline_offsets(text: str):
+    """Offsets of the newlines of `text`, for line_of (one pass over the file)."""
+    starts = []
+    pos = text.find("\n")
+    while pos != -1:
+        starts.append(pos)
+        pos = text.find("\n", pos + 1)
+    return starts
+
+def line_of(newlines, pos: int) -> int:
+    """1-based line of offset `pos`: same as text.count('\\n', 0, pos) + 1, in O(log n)."""
+    return bisect_right(newlines, pos - 1) + 1
+
+def parse_text(rel: Path, text: str):
+    """Parse one file's text into an index entry (without the stat/hash keys)."""
+    # token scan line-by-line, anchors across the whole file (multi-line anchors)
+    tokens = []
+    for i, line in enumerate(text.splitlines(), start=1):
+        for m in REF_RE.finditer(line):
+            tokens.append([m.group(1).strip(), i])
+    anchors = []
+    newlines = None
+    for m in ANCHOR_FULL_RE.finditer(text):
+        if FIGURE_TEXT_RE.match(strip_tags(m.group('inner'))):
+            if newlines is None:
+                newlines = newline_offsets(text)
+            anchors.append([m.group('id').strip(), line_of(newlines, m.start())])
+    # una sola scansione per le label di tutti i tipi
+    numbered = [[kind_of_class(m.group("cls")).name, m.group("id")] for m in LABEL_KIND_RE.finditer(text)]
+    refs = set(m.group("id") for m in TOKEN_KIND_RE.finditer(text))
+    for m in HREF_RE.finditer(text):
+        href = m.group(2)
+        pos = href.find("#")
+        while pos != -1:
+            refs.add(href[pos + 1:])
+            pos = href.find("#", pos + 1)
+    return {
+        "lang": detect_lang_from_path(rel),
+        "chapter": extract_chapter(rel),
+        "numbered": numbered,
+        "figs": [label_id for kind, label_id in numbered if kind == "figure"],
+        "labels": [m.group(1).strip() for m in LABEL_RE.finditer(text)],
+        "tokens": tokens,
+        "anchors": anchors,
+        "refs": sorted(refs),
+        "graphs": [[m.group(1).strip(), m.start()] for m in GRAPH_INCLUDE_RE.finditer(text)],
+    }
+
+def index_entry(site_root: Path, rel: Path, text: str, data: bytes = None):
+    """Full index entry for a file whose current content is `text`."""
+    if data is None:
+        data = text.encode("utf-8")
+    st = (site_root / rel).stat()
+    entry = parse_text(rel, text)
+    entry["mtime_ns"] = st.st_mtime_ns
+    entry["size"] = st.st_size
+    entry["sha1"] = hashlib.sha1(data).hexdigest()
+    return entry
+
+def atomic_write_text(path: Path, text: str):
+    """
+    Write `text` to `path` atomically: temp file in the same directory, fsync, rename.
+    A crash leaves the old or the new content, never a half-written file; an existing
+    file keeps its permissions.
+    """
+    path = Path(path)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        try:
+            mode = stat.S_IMODE(path.stat().st_mode)
+        except FileNotFoundError:
+            mode = 0o644  # mkstemp crea il file con 0600
+        os.chmod(tmp, mode)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except FileNotFoundError:
+            pass
+        raise
+    # anche la rinomina deve arrivare su disco
+    try:
+        dir_fd = os.open(path.parent, os.O_RDONLY)
+    except OSError:  # es. Windows: niente fsync delle directory
+        return
+    try:
+        os.fsync(dir_fd)
+    except OSError:
+        pass
+    finally:
+        os.close(dir_fd)
+
+def load_index(path: Path):
+    """Load the cached entries ({rel posix: entry}); empty if missing or stale."""
+    if path is None or not path.exists():
+        return {}
+    try:
+        with path.open(encoding="utf-8") as f:
+            data = json.load(f)
+    except Exception as e:
+        print(f"[WARN] cannot read corpus index: {e}", file=sys.stderr)
+        return {}
+    if not isinstance(data, dict) or data.get("version") != INDEX_VERSION:
+        return {}
+    return data.get("entries", {})
+
+def save_index(path: Path, site_root: Path, entries):
+    """Write the entries, dropping files that no longer exist."""
+    if path is None:
+        return
+    kept = {k: v for k, v in entries.items() if (site_root / k).exists()}
+    atomic_write_text(path, json.dumps({"version": INDEX_VERSION, "entries": kept}, ensure_ascii=False, sort_keys=True))
+
+def resolve_jobs(jobs) -> int:
+    """--jobs value -> number of worker processes (0 or less: one per CPU)."""
+    if jobs is None:
+        return 1
+    if jobs <= 0:
+        return os.cpu_count() or 1
+    return jobs
+
+def parallel_map(func, items, jobs=1, initializer=None, initargs=()):
+    """
+    Ordered map of func over items on a process pool (serial if jobs <= 1).
+    `initializer(*initargs)` sets up per-process state, in-process when serial.
+    """
+    items = list(items)
+    jobs = resolve_jobs(jobs)
+    if jobs <= 1 or len(items) < 2:
+        if initializer is not None:
+            initializer(*initargs)
+        return [func(item) for item in items]
+    workers = min(jobs, len(items))
+    chunksize = max(1, len(items) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers, initializer=initializer, initargs=initargs) as ex:
+        return list(ex.map(func, items, chunksize=chunksize))
+
+def entry_matches(entry):
+    """Regex match counts of an index entry (for --profile)."""
+    return {k: len(entry[k]) for k in ("numbered", "figs", "labels", "tokens", "anchors", "refs", "graphs")}
+
+def _parse_file(item):
+    """Worker: read and parse one file -> (entry, text, stats), or (None, None, None) if unreadable."""
+    site_root, rel = item
+    start = now_us()
+    try:
+        data = (site_root / rel).read_bytes()
+        text = data.decode("utf-8")
+    except Exception:
+        return None, None, None
+    entry = index_entry(site_root, rel, text, data)
+    return entry, text, file_stats(start, len(data), entry_matches(entry))
+
+def refresh_index(site_root: Path, rels, entries, jobs=1, profiler=NULL_PROFILER):
+    """
+    Bring the entries of `rels` up to date: files whose mtime/size match the
+    cache are not read. Returns {rel: text} for the files that were read, so
+    that callers can reuse the text instead of reading it again.
+    Unreadable files are left out of the index.
+    With a profiler, each file read is recorded as a "parse" step.
+    """
+    stale = []
+    with profiler.phase("index: stat files", files=len(rels)):
+        for rel in rels:
+            key = rel.as_posix()
+            prev = entries.get(key)
+            try:
+                st = (site_root / rel).stat()
+            except Exception:
+                entries.pop(key, None)
+                continue
+            if prev and prev.get("mtime_ns") == st.st_mtime_ns and prev.get("size") == st.st_size:
+                continue
+            stale.append(rel)
+
+    texts = {}
+    with profiler.phase("index: parse changed files", files=len(stale), cached=len(rels) - len(stale)):
+        results = parallel_map(_parse_file, [(site_root, rel) for rel in stale], jobs)
+    for rel, (entry, text, stats) in zip(stale, results):
+        profiler.file("parse", rel, stats)
+        if entry is None:
+            entries.pop(rel.as_posix(), None)
+            continue
+        entries[rel.as_posix()] = entry
+        texts[rel] = text
+    return texts
+
+def index_path(site_root: Path, path_arg=None, disabled=False):
+    """Resolve the --index/--no-index-cache options shared by the tools."""
+    if disabled:
+        return None
+    return Path(path_arg) if path_arg else site_root / DEFAULT_INDEX
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--site-root", default=".", help="root del sito (default .)")
+    ap.add_argument("--index", default=None, help=f"index path (default <site-root>/{DEFAULT_INDEX})")
+    ap.add_argument("--jobs", type=int, default=1, help="worker processes (0 = one per CPU, default 1)")
+    ap.add_argument("--verbose", action="store_true")
+    args = ap.parse_args()
+
+    site_root = Path(args.site_root).resolve()
+    path = index_path(site_root, args.index)
+    entries = load_index(path)
+    rels = corpus_files(site_root)
+    texts = refresh_index(site_root, rels, entries, args.jobs)
+    save_index(path, site_root, entries)
+    print(f"Indexed {len(rels)} files ({len(texts)} parsed, {len(rels) - len(texts)} from cache) -> {path}")
+    if args.verbose:
+        for rel in texts:
+            print(" ", rel)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+"""
+kg_spec.py
+
+Lettura delle specifiche dei grafici KineticGraphs (<lang>/graphs/**/gr_*.yml) e parser
+delle espressioni dei `calcs`, condivisi dagli strumenti che lavorano sui grafici.
+
+- load_spec(): carica lo YAML come farebbe js-yaml nel browser (schema YAML 1.2: niente
+  yes/no/on/off booleani né numeri sessagesimali) e rifiuta le chiavi duplicate,
+  che js-yaml tratta come errore
+- parse_expr(): parser del sottoinsieme di sintassi mathjs usato nei calcs
+  (numeri, stringhe, params.x / calcs.x, + - * / % ^, confronti, and/or/not,
+  ? :, chiamate di funzione e di metodo come calcs.x.toFixed(1)) che produce un albero di tuple:
+    ('num', value) ('str', s) ('name', n) ('ref', 'params'|'calcs', name, path)
+    ('call', fn, args) ('method', target, fn, args) ('unary', op, a) ('bin', op, a, b)
+    ('cond', c, a, b)
+- expr_refs(): i riferimenti params.* / calcs.* di un'espressione
+"""
+from pathlib import Path
+import re
+
+import yaml
+
+class SpecError(Exception):
+    """A graph spec that kg could not load or evaluate."""
+
+class ExprError(SpecError):
+    """A calcs expression that cannot be parsed."""
+
+# ---------------------------------------------------------------------------
+# YAML
+
+class SpecLoader(yaml.SafeLoader):
+    """SafeLoader with YAML 1.2 core-schema scalars (like js-yaml) and no duplicate keys."""
+
+    def construct_mapping(self, node, deep=False):
+        seen = set()
+        for key_node, _ in node.value:
+            key = self.construct_object(key_node, deep=deep)
+            if key in seen:
+                raise SpecError(f"duplicate key {key!r} at line {key_node.start_mark.line + 1}")
+            seen.add(key)
+        return super().construct_mapping(node, deep=deep)
+
+    def scan_flow_scalar_spaces(self, double, start_mark):
+        # come js-yaml: gli spazi prima di un a capo dentro uno scalare quotato restano
+        # ("a  \n b" -> "a   b"); PyYAML li scarterebbe
+        length = 0
+        while self.peek(length) in ' \t':
+            length += 1
+        whitespaces = self.prefix(length)
+        folded = self.peek(length) in '\r\n\x85\u2028\u2029'
+        chunks = super().scan_flow_scalar_spaces(double, start_mark)
+        return [whitespaces] + chunks if folded else chunks
+
+SpecLoader.yaml_implicit_resolvers = {
+    k: [(tag, regexp) for tag, regexp in v
+        if tag not in ("tag:yaml.org,2002:bool", "tag:yaml.org,2002:int", "tag:yaml.org,2002:float")]
+    for k, v in yaml.SafeLoader.yaml_implicit_resolvers.items()
+}
+SpecLoader.add_implicit_resolver(
+    "tag:yaml.org,2002:bool",
+    re.compile(r'^(?:true|True|TRUE|false|False|FALSE)$'),
+    list("tTfF"))
+SpecLoader.add_implicit_resolver(
+    "tag:yaml.org,2002:int",
+    re.compile(r'^(?:[-+]?[0-9]+|0o[0-7]+|0x[0-9a-fA-F]+)$'),
+    list("-+0123456789"))
+SpecLoader.add_implicit_resolver(
+    "tag:yaml.org,2002:float",
+    re.compile(r'^(?:[-+]?(?:\.[0-9]+|[0-9]+(?:\.[0-9]*)?)(?:[eE][-+]?[0-9]+)?'
+               r'|[-+]?\.(?:inf|Inf|INF)|\.(?:nan|NaN|NAN))$'),
+    list("-+0123456789."))
+
+def _construct_yaml12_int(loader, node):
+    value = loader.construct_scalar(node)
+    if value.startswith("0o"):
+        return int(value[2:], 8)
+    return int(value, 0) if value.startswith("0x") else int(value)
+
+SpecLoader.add_constructor("tag:yaml.org,2002:int", _construct_yaml12_int)
+
+def load_spec(path: Path):
+    """Parsed graph spec (dict). Raises SpecError if the YAML is invalid."""
+    try:
+        with Path(path).open(encoding="utf-8") as f:
+            spec = yaml.load(f, Loader=SpecLoader)
+    except yaml.YAMLError as e:
+        raise SpecError(f"invalid YAML: {e}") from None
+    if not isinstance(spec, dict):
+        raise SpecError("spec is not a mapping")
+    return spec
+
+def graph_specs(site_root: Path, langs=("it", "en")):
+    """All graph spec files (relative to site_root), sorted."""
+    rels = []
+    for lang in langs:
+        base = site_root / lang / "graphs"
+        if base.exists():
+            rels.extend(sorted(p.relative_to(site_root) for p in base.rglob("*.yml")))
+    return rels
+
+def param_names(spec):
+    return [p["name"] for p in spec.get("params") or [] if isinstance(p, dict) and "name" in p]
+
+# ---------------------------------------------------------------------------
+# expressions
+
+TOKEN_RE = re.compile(r'''
+    \s*(?:
+      (?P<num>(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)
+    | (?P<str>'[^']*'|"[^"]*")
+    | (?P<name>[A-Za-z_]\w*(?:\.[A-Za-z_]\w*)*)
+    | (?P<op>==|!=|<=|>=|&&|\|\||[-+*/%^<>?:(),!])
+    )''', re.VERBOSE)
+
+WORD_OPS = {"and": "and", "or": "or", "not": "not", "xor": "xor", "mod": "%"}
+
+def tokenize(src: str):
+    tokens = []
+    pos = 0
+    src = src.rstrip()
+    while pos < len(src):
+        m = TOKEN_RE.match(src, pos)
+        if not m or m.end() == pos:
+            raise ExprError(f"unexpected character {src[pos:].strip()[:1]!r} at {pos}")
+        pos = m.end()
+        kind = m.lastgroup
+        value = m.group(kind)
+        if kind == "name" and value in WORD_OPS:
+            kind, value = "op", WORD_OPS[value]
+        elif kind == "op" and value in ("&&", "||"):
+            value = "and" if value == "&&" else "or"
+        elif kind == "op" and value == "!":
+            value = "not"
+        tokens.append((kind, value))
+    return tokens
+
+class _Parser:
+    def __init__(self, src):
+        self.tokens = tokenize(src)
+        self.i = 0
+
+    def peek(self):
+        return self.tokens[self.i] if self.i < len(self.tokens) else (None, None)
+
+    def take(self, value=None):
+        kind, val = self.peek()
+        if kind is None or (value is not None and val != value):
+            raise ExprError(f"expected {value or 'a value'}, found {val or 'end of expression'}")
+        self.i += 1
+        return kind, val
+
+    def at(self, *ops):
+        kind, val = self.peek()
+        return kind == "op" and val in ops
+
+    def parse(self):
+        node = self.conditional()
+        if self.i != len(self.tokens):
+            raise ExprError(f"unexpected {self.peek()[1]!r}")
+        return node
+
+    def conditional(self):
+        cond = self.binary(0)
+        if self.at("?"):
+            self.take("?")
+            a = self.conditional()
+            self.take(":")
+            b = self.conditional()
+            return ("cond", cond, a, b)
+        return cond
+
+    # binary operators from the lowest precedence, as in mathjs
+    LEVELS = (("or",), ("xor",), ("and",), ("==", "!=", "<", ">", "<=", ">="), ("+", "-"), ("*", "/", "%"))
+
+    def binary(self, level):
+        if level == len(self.LEVELS):
+            return self.unary()
+        node = self.binary(level + 1)
+        while self.at(*self.LEVELS[level]):
+            op = self.take()[1]
+            node = ("bin", op, node, self.binary(level + 1))
+        return node
+
+    def unary(self):
+        if self.at("-", "+", "not"):
+            op = self.take()[1]
+            return ("unary", op, self.unary())
+        return self.power()
+
+    def power(self):
+        base = self.primary()
+        if self.at("^"):
+            self.take("^")
+            return ("bin", "^", base, self.unary())
+        return base
+
+    def primary(self):
+        kind, val = self.take()
+        if kind == "num":
+            return ("num", float(val))
+        if kind == "str":
+            return ("str", val[1:-1])
+        if kind == "op" and val == "(":
+            node = self.conditional()
+            self.take(")")
+            return node
+        if kind == "name":
+            if self.at("("):
+                self.take("(")
+                args = []
+                if not self.at(")"):
+                    args.append(self.conditional())
+                    while self.at(","):
+                        self.take(",")
+                        args.append(self.conditional())
+                self.take(")")
+                parts = val.split(".")
+                if len(parts) > 1:
+                    return ("method", self.name_node(parts[:-1]), parts[-1], args)
+                return ("call", val, args)
+            return self.name_node(val.split("."))
+        raise ExprError(f"unexpected {val!r}")
+
+    @staticmethod
+    def name_node(parts):
+        if parts[0] in ("params", "calcs") and len(parts) > 1:
+            return ("ref", parts[0], parts[1], tuple(parts[2:]))
+        return ("name", ".".join(parts))
+
+def parse_expr(src):
+    """Parse a calcs expression (str or number) into a tuple tree."""
+    if isinstance(src, bool):
+        return ("num", float(src))
+    if isinstance(src, (int, float)):
+        return ("num", float(src))
+    if not isinstance(src, str):
+        raise ExprError(f"not an expression: {src!r}")
+    return _Parser(src).parse()
+
+def expr_refs(node, acc=None):
+    """Set of (namespace, name) referenced by an expression tree."""
+    if acc is None:
+        acc = set()
+    kind = node[0]
+    if kind == "ref":
+        acc.add((node[1], node[2]))
+    elif kind == "call":
+        for a in node[2]:
+            expr_refs(a, acc)
+    elif kind == "method":
+        for a in [node[1]] + node[3]:
+            expr_refs(a, acc)
+    elif kind == "unary":
+        expr_refs(node[2], acc)
+    elif kind == "bin":
+        expr_refs(node[2], acc)
+        expr_refs(node[3], acc)
+    elif kind == "cond":
+        for a in node[1:]:
+            expr_refs(a, acc)
+    return acc
+
+# mathjs functions and constants accepted in calcs
+KNOWN_FUNCTIONS = {
+    "abs", "sqrt", "cbrt", "exp", "log", "log10", "log2", "pow", "min", "max",
+    "floor", "ceil", "round", "sign", "sin", "cos", "tan", "asin", "acos", "atan", "atan2",
+}
+# number methods that mathjs lets expressions call (e.g. calcs.EV.toFixed(0))
+KNOWN_METHODS = {"toFixed", "toPrecision"}
+KNOWN_CONSTANTS = {"pi", "e", "true", "false", "Infinity", "NaN"}
+
+def expr_names(node, acc=None):
+    """(function names, method names, bare names) used by an expression tree."""
+    if acc is None:
+        acc = (set(), set(), set())
+    kind = node[0]
+    if kind == "name":
+        acc[2].add(node[1])
+    elif kind == "call":
+        acc[0].add(node[1])
+        for a in node[2]:
+            expr_names(a, acc)
+    elif kind == "method":
+        acc[1].add(node[2])
+        for a in [node[1]] + node[3]:
+            expr_names(a, acc)
+    elif kind == "unary":
+        expr_names(node[2], acc)
+    elif kind == "bin":
+        expr_names(node[2], acc)
+        expr_names(node[3], acc)
+    elif kind == "cond":
+        for a in node[1:]:
+            expr_names(a, acc)
+    return acc
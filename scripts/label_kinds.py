@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+label_kinds.py
+
+Tipi di label numerate del libro, usati da number_figures_from_toc.py e dall'indice del
+corpus (corpus_index.py). Ogni tipo dichiara:
+- la classe del paragrafo della label: <p class="figure-label" id="...">...</p>
+- il token dei riferimenti: [[FIG:id]]
+- le parole per it/en: "FIGURA 2.1" nella label, "Figura 2.1" nei link
+- l'ambito della numerazione: "chapter" (2.1, 2.2, ... in tutto il capitolo) o
+  "section" (2.3.1, 2.3.2, ... ricominciando a ogni sezione)
+
+Tutti i tipi sono riconosciuti dalle stesse due regex (LABEL_KIND_RE, TOKEN_KIND_RE),
+quindi ogni file viene letto e scansionato una volta sola qualunque sia il numero di tipi:
+per aggiungere un tipo basta una voce in KINDS.
+"""
+import re
+
+class LabelKind:
+    def __init__(self, name, css_class, token, words, scope="chapter"):
+        if scope not in ("chapter", "section"):
+            raise ValueError(f"unknown numbering scope for {name}: {scope}")
+        self.name = name
+        self.css_class = css_class
+        self.token = token
+        self.words = words
+        self.scope = scope
+
+    def label(self, lang, number):
+        """Text of the label paragraph: FIGURA 2.1 / FIGURE 2.1."""
+        return f"{self.words[lang].upper()} {number}"
+
+    def ref_text(self, lang, number):
+        """Text of a link to the label: Figura 2.1 / Figure 2.1."""
+        return f"{self.words[lang]} {number}"
+
+    def __repr__(self):
+        return f"LabelKind({self.name!r})"
+
+KINDS = (
+    LabelKind("figure", "figure-label", "FIG", {"it": "Figura", "en": "Figure"}),
+    LabelKind("equation", "equation-label", "EQ", {"it": "Equazione", "en": "Equation"}),
+    LabelKind("definition", "definition-label", "DEF", {"it": "Definizione", "en": "Definition"}),
+    LabelKind("theorem", "theorem-label", "THM", {"it": "Teorema", "en": "Theorem"}),
+    LabelKind("example", "example-label", "EX", {"it": "Esempio", "en": "Example"}, scope="section"),
+    LabelKind("table", "table-label", "TAB", {"it": "Tabella", "en": "Table"}),
+)
+KINDS_BY_NAME = {k.name: k for k in KINDS}
+KINDS_BY_CLASS = {k.css_class: k for k in KINDS}
+KINDS_BY_TOKEN = {k.token: k for k in KINDS}
+
+# <p ... class="... <kind>-label ..." ... id="SOME/ID"> ... </p>: classe in group "cls", id in group "id"
+LABEL_KIND_RE = re.compile(
+    r'<p\b[^>]*\bclass=["\'][^"\']*(?P<cls>' + "|".join(re.escape(k.css_class) for k in KINDS) + r')'
+    r'[^"\']*["\'][^>]*\bid=["\'](?P<id>[^"\']+)["\'][^>]*>.*?</p>',
+    re.IGNORECASE | re.DOTALL
+)
+
+# [[FIG:id]], [[EQ:id]], ... (allows spaces): token in group "tok", id in group "id"
+TOKEN_KIND_RE = re.compile(
+    r'\[\[\s*(?P<tok>' + "|".join(re.escape(k.token) for k in KINDS) + r')\s*:\s*(?P<id>[^\]\s]+)\s*\]\]',
+    re.IGNORECASE
+)
+
+def kind_of_class(css_class):
+    return KINDS_BY_CLASS[css_class.lower()]
+
+def kind_of_token(token):
+    return KINDS_BY_TOKEN[token.upper()]
+
+def select_kinds(names):
+    """KINDS restricted to a comma-separated list of names (--kinds), in KINDS order."""
+    if not names:
+        return KINDS
+    wanted = set(n.strip() for n in names.split(",") if n.strip())
+    unknown = wanted - set(KINDS_BY_NAME)
+    if unknown:
+        raise ValueError(f"unknown label kind(s): {', '.join(sorted(unknown))} "
+                         f"(known: {', '.join(KINDS_BY_NAME)})")
+    return tuple(k for k in KINDS if k.name in wanted)
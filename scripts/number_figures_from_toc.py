@@ -7,120 +7,410 @@ Scansiona _data/toc.yml per ottenere l'ordine delle pagine, quindi:
 - sostituisce il contenuto interno con la label generata automaticamente
 - opzionalmente sostituisce riferimenti [[FIG:id]] con link <a href="{{ site.baseurl }}/it/...#id">Figura ...</a>
 
+Oltre alle figure numera allo stesso modo gli altri tipi di label di scripts/label_kinds.py
+(equation-label / [[EQ:id]], theorem-label / [[THM:id]], definition-label, example-label,
+table-label), ciascuno con il proprio contatore e il proprio ambito (capitolo o sezione):
+tutti i tipi sono numerati e risolti nella stessa lettura di ogni file. --kinds limita la
+numerazione ad alcuni tipi; le label degli altri restano invariate.
+
 Usage:
   python3 scripts/number_figures_from_toc.py [--dry-run] [--mode chapter] [--site-root .] [--backup] [--update-refs]
+                                             [--kinds figure,equation,...]
+                                             [--incremental] [--manifest PATH] [--index PATH] [--no-index-cache]
+                                             [--jobs N] [--watch [--poll] [--interval S] [--debounce S]]
+                                             [--profile [TRACE]] [--changes [PATH]]
+
+Default: mode=chapter (FIGURA chapter.n); gli esempi sono numerati per sezione (ESEMPIO chapter.section.n)
+
+Id delle label e riferimenti di ogni file vengono presi dall'indice condiviso del corpus
+(scripts/corpus_index.py, default <site-root>/.corpus-index.json): solo i file cambiati
+dall'ultima esecuzione vengono riletti in PASS 1.
+
+Con --incremental lo script salva un manifest (default <site-root>/.figures-manifest.json)
+con l'hash del contenuto di ogni file e la id_map risultante. Alle esecuzioni successive
+riscrive solo i file il cui contenuto è cambiato o che contengono label/riferimenti la
+cui numerazione è cambiata.
+
+Con --jobs N la lettura (PASS 1) e la riscrittura (PASS 2) dei file sono distribuite su
+N processi; la numerazione segue comunque l'ordine del TOC e l'output è identico.
+
+Con --watch lo script resta attivo (ad es. accanto a `jekyll serve`): a ogni modifica di
+it/, en/ o _data/toc.yml rinumera in modo incrementale e riesegue il controllo degli
+orphan (find_orphan_fig_refs.py), stampando solo i nuovi avvisi, e aggiorna
+_data/nav.json (build_nav.py) e l'indice di ricerca delle lingue interessate
+(build_search_index.py); a ogni modifica di una specifica dei grafici
+(<lang>/graphs/**/*.yml) ricompila il suo .json (compile_graph_calcs.py), che è il file
+caricato da embedded-graph.html. Usa watchdog (inotify) se installato, altrimenti il
+polling degli mtime.
+
+Con --profile lo script misura il tempo di ogni fase (lettura del TOC, probe dei file,
+indice, PASS 1, PASS 2) e di ogni file letto o riscritto, con byte e numero di match delle
+regex; scrive un trace per chrome://tracing (default <site-root>/.figures-profile.json) e
+stampa su stderr le fasi e i file più lenti (vedi scripts/profiling.py).
+
+I file sono riscritti in modo atomico (file temporaneo nella stessa cartella, fsync,
+rename): un'interruzione lascia il vecchio o il nuovo contenuto, mai un .md troncato. I
+file il cui contenuto non cambia non vengono riscritti e conservano il loro mtime.
 
-Default: mode=chapter (FIGURA chapter.n)
+Con --changes lo script scrive (default <site-root>/.figures-changes.json, anche a ogni
+giro di --watch) l'elenco delle pagine che l'esecuzione ha cambiato, da passare a una
+build incrementale di Jekyll:
+{
+  "version": 1,
+  "dry_run": false,
+  "sources": ["it/I/2/1.md", ...],          # file riscritti (con --dry-run: da riscrivere)
+  "renumbered": ["gr_consumer/...", ...],   # id la cui numerazione o pagina è cambiata (--incremental)
+  "pages": [{"source": "it/I/2/1.md", "url": "it/I/2/1", "output": "it/I/2/1.html",
+             "reasons": ["labels", "refs"]}, ...]
+}
+Le pagine sono quelle riscritte più (con --incremental) quelle modificate dall'ultima
+esecuzione; "reasons": edited (modificata dall'ultima esecuzione), labels (definisce label
+rinumerate), refs (contiene link, anche verso altri capitoli, a label rinumerate),
+rewritten (riscritta in un'esecuzione completa).
 """
 from pathlib import Path
 import yaml
 import re
 import argparse
+import json
 import sys
+import threading
+import time
 
-# SIMPLE, ROBUST regex: capture id in group(1)
-# matches <p ... class="... figure-label ..." ... id="SOME/ID"> ... </p>
-FIG_RE = re.compile(
-    r'<p\b[^>]*\bclass=["\'][^"\']*figure-label[^"\']*["\'][^>]*\bid=["\']([^"\']+)["\'][^>]*>.*?</p>',
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+except ImportError:  # optional: --watch falls back to polling
+    Observer = None
+    FileSystemEventHandler = object
+
+from corpus_index import (
+    md_rel_to_page_url, detect_lang_from_path, extract_chapter, corpus_files,
+    DEFAULT_INDEX, LANGS, load_index, save_index, refresh_index, index_entry, index_path, parallel_map,
+    atomic_write_text,
+)
+from kg_spec import graph_specs
+from label_kinds import KINDS, KINDS_BY_NAME, LABEL_KIND_RE, TOKEN_KIND_RE, kind_of_class, kind_of_token, select_kinds
+from profiling import NULL_PROFILER, Profiler, file_stats, now_us
+
+# PASS 2 --update-refs: after the [[FIG:id]] / [[EQ:id]] / ... tokens (TOKEN_KIND_RE), a
+# single scanner for whole <a ... href="...#...">...</a> anchors, resolved against id_map
+# by dict lookup
+ANCHOR_RE = re.compile(
+    r'<a\b[^>]*\bhref=(?P<q>["\'])(?P<href>[^"\']*#[^"\']*)(?P=q)[^>]*>.*?</a>',
     re.IGNORECASE | re.DOTALL
 )
+# the href="...#..." attributes inside one <a ...> opening tag
+HREF_ATTR_RE = re.compile(r'\bhref=(["\'])([^"\']*#[^"\']*)\1', re.IGNORECASE)
+
+MANIFEST_VERSION = 3
+DEFAULT_MANIFEST = ".figures-manifest.json"
+DEFAULT_PROFILE = ".figures-profile.json"
+DEFAULT_CHANGES = ".figures-changes.json"
+CHANGES_VERSION = 1
 
-# matches our inline references like [[FIG:gr_consumer/discrete-pref]] (allows spaces)
-REF_RE = re.compile(r'\[\[\s*FIG\s*:\s*([^\]\s]+)\s*\]\]', re.IGNORECASE)
+def load_manifest(path: Path):
+    if not path.exists():
+        return None
+    try:
+        with path.open(encoding="utf-8") as f:
+            manifest = json.load(f)
+    except Exception as e:
+        print(f"[WARN] cannot read manifest: {e}", file=sys.stderr)
+        return None
+    if not isinstance(manifest, dict) or manifest.get("version") != MANIFEST_VERSION:
+        return None
+    return manifest
 
-def md_rel_to_page_url(rel_path: Path) -> str:
+def save_manifest(path: Path, manifest):
+    atomic_write_text(path, json.dumps(manifest, ensure_ascii=False, indent=1, sort_keys=True))
+
+def changed_label_ids(old_map, new_map):
+    """ids whose (label, page_url, kind) differs between two id_maps, in any language."""
+    changed = set()
+    for lg in ("it", "en"):
+        old_lg = old_map.get(lg, {})
+        new_lg = new_map.get(lg, {})
+        for label_id in set(old_lg) | set(new_lg):
+            old_entry = old_lg.get(label_id)
+            new_entry = new_lg.get(label_id)
+            if (tuple(old_entry) if old_entry else None) != (tuple(new_entry) if new_entry else None):
+                changed.add(label_id)
+    return changed
+
+def page_output(rel: Path) -> str:
+    """Path of the page generated by Jekyll (default permalink): it/I/2/1.html, it/I/2/index.html."""
+    return rel.with_suffix(".html").as_posix()
+
+def refers_to(ids_changed, refs):
     """
-    Convert a Path like it/I/1/1.md -> it/I/1/1
-    it/I/1/index.md -> it/I/1
+    True if `refs` (the ids a file points to, see corpus_index.py) name one of ids_changed.
+    Case-insensitive, as resolve_anchor_href: a full run rewrites href="...#GR_X" for gr_x,
+    so an incremental run must too.
     """
-    p = str(rel_path).replace("\\", "/")
-    if p.endswith(".md"):
-        p = p[:-3]
-    if p.endswith("/index"):
-        p = p[:-6]
-    return p
-
-def detect_lang_from_path(path: Path) -> str:
-    parts = list(path.parts)
-    if len(parts) > 0 and parts[0] in ("it", "en"):
-        return parts[0]
-    # fallback: try to find 'it' or 'en' anywhere
-    for part in parts:
-        if part in ("it", "en"):
-            return part
-    return "it"
+    lowered = set(label_id.lower() for label_id in ids_changed)
+    return any(ref.lower() in lowered for ref in refs)
 
-def extract_chapter(path: Path):
+def build_changes(files_rel, entries, modified, edited, ids_changed, dry_run=False):
     """
-    Extract chapter number from path, supporting both it/ and en/
-    e.g. it/I/2/3.md -> '2' (the chapter folder)
-    e.g. it/I/2.md -> '2' (if layout has no section)
-    fallback: parent folder name
+    --changes feed: the pages rewritten by this run or edited since the last one, in TOC
+    order, each with the reasons it has to be regenerated.
     """
-    parts = list(path.parts)
-    # find index of 'it' or 'en'
-    idx = None
-    for i, p in enumerate(parts):
-        if p in ("it", "en"):
-            idx = i
+    modified = set(modified)
+    pages = []
+    for rel in files_rel:
+        if rel not in modified and rel not in edited:
+            continue
+        entry = entries[rel.as_posix()]
+        reasons = []
+        if rel in edited:
+            reasons.append("edited")
+        if ids_changed.intersection(label_id for _, label_id in entry["numbered"]):
+            reasons.append("labels")
+        if refers_to(ids_changed, entry["refs"]):
+            reasons.append("refs")
+        if not reasons:
+            reasons.append("rewritten")
+        pages.append({"source": rel.as_posix(), "url": md_rel_to_page_url(rel),
+                      "output": page_output(rel), "reasons": reasons})
+    return {
+        "version": CHANGES_VERSION,
+        "dry_run": bool(dry_run),
+        "sources": [rel.as_posix() for rel in files_rel if rel in modified],
+        "renumbered": sorted(ids_changed),
+        "pages": pages,
+    }
+
+def build_ref_index(id_map):
+    """
+    Precompute, for each language, the canonical link of every label (Figura 2.1,
+    Equazione 2.3, ...) with its kind and a case-insensitive lookup id -> [(order, fig_id)] in id_map order.
+    """
+    index = {}
+    for lg in ("it", "en"):
+        anchors = {}
+        lookup = {}
+        for order, (fig_id, (label, page_url, kind)) in enumerate(id_map.get(lg, {}).items()):
+            number = label.split(None, 1)[1]
+            href = f'{{{{ site.baseurl }}}}/{page_url}#{fig_id}'
+            anchors[fig_id] = (href, f'<a href="{href}">{KINDS_BY_NAME[kind].ref_text(lg, number)}</a>', kind)
+            lookup.setdefault(fig_id.lower(), []).append((order, fig_id))
+        index[lg] = (anchors, lookup)
+    return index
+
+def tag_hrefs(text: str, start: int, end: int):
+    """
+    Every href="...#..." in text[start:end], the attributes of one <a ...> tag: usually one,
+    but an attribute value can contain another (e.g. a token replaced inside title="...").
+    """
+    hrefs = []
+    m = HREF_ATTR_RE.search(text, start, end)
+    while m:
+        hrefs.append(m.group(2))
+        m = HREF_ATTR_RE.search(text, m.start() + 1, end)
+    return hrefs
+
+def resolve_anchor_href(hrefs, lookup, anchors):
+    """
+    Return the canonical anchor for the hrefs of one <a ...> tag, or None if none of
+    them points to a known label.
+
+    An href matches fig_id when it ends with '#fig_id' (case-insensitive); the first label
+    in id_map order matched by any href wins. Matching is repeated on the canonical href,
+    in id_map order, as the old per-figure loop did.
+    """
+    result = None
+    after = -1
+    while True:
+        best = None
+        for href in hrefs:
+            pos = href.find("#")
+            while pos != -1:
+                for order, fig_id in lookup.get(href[pos + 1:].lower(), ()):
+                    if order > after and (best is None or order < best[0]):
+                        best = (order, fig_id)
+                pos = href.find("#", pos + 1)
+        if best is None:
+            return result
+        after = best[0]
+        href, result, _ = anchors[best[1]]
+        hrefs = (href,)
+
+def rewrite_refs(text: str, lang: str, ref_index, counts=None, mismatched=None):
+    """
+    Replace [[FIG:id]] / [[EQ:id]] / ... tokens, then existing label anchors in a single scan.
+    Same order as the old per-label loop: tokens first, so a token inside an anchor (in its
+    text or attributes) is replaced before the anchor, and the links generated from tokens
+    go through the anchor pass too.
+    Tokens fall back to the other language's map; anchors use only the file's language.
+    A token whose kind differs from the label's ([[EQ:id]] for a figure) is left unchanged
+    and, if `mismatched` is given, appended to it as (token, label kind).
+    `counts` (--profile), if given, gets the number of scanner matches and replacements.
+    """
+    anchors, lookup = ref_index[lang]
+    other = "en" if lang == "it" else "it"
+
+    def count(key):
+        if counts is not None:
+            counts[key] = counts.get(key, 0) + 1
+
+    def repl_token(m):
+        count("scanned")
+        fig_id = m.group("id")
+        if fig_id in anchors:
+            _, repl, kind = anchors[fig_id]
+        elif fig_id in ref_index[other][0]:
+            _, repl, kind = ref_index[other][0][fig_id]
+        else:
+            return m.group(0)
+        if kind_of_token(m.group("tok")).name != kind:
+            if mismatched is not None:
+                mismatched.append((m.group(0), kind))
+            return m.group(0)
+        count("refs")
+        return repl
+
+    text = TOKEN_KIND_RE.sub(repl_token, text)
+
+    out = []
+    last = 0
+    pos = 0
+    while True:
+        m = ANCHOR_RE.search(text, pos)
+        if not m:
             break
-    if idx is not None:
-        # expect layout it/<PART>/<CHAPTER>/... or it/<PART>/<CHAPTER>.md
-        if len(parts) > idx + 2:
-            return parts[idx + 2]
-    return path.parent.name
+        count("scanned")
+        hrefs = tag_hrefs(text, m.start(), text.index(">", m.start()))
+        repl = resolve_anchor_href(hrefs, lookup, anchors)
+        if repl is None:
+            # not a reference to a label: keep scanning inside it
+            pos = m.start() + 1
+            continue
+        out.append(text[last:m.start()])
+        out.append(repl)
+        last = pos = m.end()
+        count("refs")
+    if not out:
+        return text
+    out.append(text[last:])
+    return "".join(out)
+
+def rewrite_text(text: str, lang: str, id_map, ref_index=None, counts=None, kinds=KINDS, mismatched=None):
+    """
+    PASS 2 for one file: regenerate the labels of `kinds` and, if ref_index is given, references.
+    `counts` (--profile), if given, gets the number of labels and references matched;
+    `mismatched`, the tokens of the wrong kind (see rewrite_refs).
+    """
+    # replace labels: keep id extracted, produce consistent <p class="figure-label" id="...">LABEL</p>
+    # (equation-label, theorem-label, ... allo stesso modo; i tipi esclusi da --kinds restano invariati)
+    def repl_label(m):
+        kind = kind_of_class(m.group("cls"))
+        if kind not in kinds:
+            return m.group(0)
+        label_id = m.group("id")
+        entry = id_map.get(lang, {}).get(label_id)
+        label = entry[0] if entry else kind.label(lang, "?")
+        return f'<p class="{kind.css_class}" id="{label_id}">{label}</p>'
+
+    new_text, n_labels = LABEL_KIND_RE.subn(repl_label, text)
+    if counts is not None:
+        counts["labels"] = n_labels
+
+    if ref_index is not None:
+        # sostituisci token [[FIG:id]] (e [[EQ:id]], ...) e anchor HTML già esistenti che puntano a #fig_id
+        # (es. <a href="/it/I/1/1#gr_figB">Figura 1.2</a> o <a href="#gr_figB">Figura 1.2</a>)
+        # con la versione aggiornata, in un'unica scansione del file
+        new_text = rewrite_refs(new_text, lang, ref_index, counts, mismatched)
+    return new_text
+
+# per-process state of the PASS 2 workers (set by _init_rewrite)
+_REWRITE_STATE = {}
+
+def _init_rewrite(site_root, id_map, ref_index, kinds=KINDS):
+    _REWRITE_STATE.update(site_root=site_root, id_map=id_map, ref_index=ref_index, kinds=kinds)
+
+def _rewrite_file(item):
+    """
+    Worker: (rel, text or None) -> (new text or None if the file is unchanged, stats for
+    --profile, tokens of the wrong kind).
+    """
+    rel, text = item
+    start = now_us()
+    if text is None:
+        text = (_REWRITE_STATE["site_root"] / rel).read_text(encoding="utf-8")
+    counts = {"labels": 0, "scanned": 0, "refs": 0}
+    mismatched = []
+    new_text = rewrite_text(text, detect_lang_from_path(rel), _REWRITE_STATE["id_map"], _REWRITE_STATE["ref_index"],
+                            counts, _REWRITE_STATE["kinds"], mismatched)
+    stats = file_stats(start, len(text.encode("utf-8")), counts)
+    return (new_text if new_text != text else None), stats, mismatched
+
+def load_toc(site_root: Path):
+    """Parsed _data/toc.yml, or None if missing/unreadable."""
+    toc_path = site_root / "_data" / "toc.yml"
+    if not toc_path.exists():
+        return None
+    try:
+        with toc_path.open(encoding="utf-8") as f:
+            return yaml.safe_load(f)
+    except Exception as e:
+        print(f"[WARN] cannot read TOC: {e}", file=sys.stderr)
+        return None
+
+def walk_toc(toc):
+    """(part folder, chapter folder, part, chapter) for every chapter of the TOC, in order."""
+    parts = toc.get("parts") or toc.get("Parts") or []
+    for part in parts:
+        part_folder = str(part.get("folder", "")).strip()
+        chapters = part.get("chapters", []) or []
+        for chap in chapters:
+            yield part_folder, str(chap.get("folder", "")).strip(), part, chap
 
-def build_file_list(site_root: Path):
+def build_file_list(site_root: Path, profiler=NULL_PROFILER):
     """
     Try to resolve files from TOC if present (preferring the structure),
     otherwise fallback to scanning both it/ and en/ for .md files.
     Returns a list of Paths (absolute resolved), ordered.
     """
-    toc_path = site_root / "_data" / "toc.yml"
+    with profiler.phase("toc: load"):
+        toc = load_toc(site_root)
     files = []
-    if toc_path.exists():
-        try:
-            with toc_path.open(encoding="utf-8") as f:
-                toc = yaml.safe_load(f)
-        except Exception as e:
-            print(f"[WARN] cannot read TOC: {e}", file=sys.stderr)
-            toc = None
-
-        if toc:
-            parts = toc.get("parts") or toc.get("Parts") or []
-            for part in parts:
-                part_folder = str(part.get("folder", "")).strip()
-                chapters = part.get("chapters", []) or []
-                for chap in chapters:
-                    chap_folder = str(chap.get("folder", "")).strip()
-                    sections = chap.get("sections", []) or []
-                    # Try to build candidate paths for both languages and both index/numbered
-                    for i in range(1, len(sections) + 1):
-                        for lang in ("it", "en"):
-                            candidate = site_root / lang / part_folder / chap_folder / f"{i}.md"
-                            if candidate.exists():
-                                files.append(candidate.resolve())
-                    # also try index.md for chapter landing
+    if toc:
+        probes = 0
+        with profiler.phase("toc: probe files") as info:
+            for part_folder, chap_folder, _, chap in walk_toc(toc):
+                sections = chap.get("sections", []) or []
+                # Try to build candidate paths for both languages and both index/numbered
+                for i in range(1, len(sections) + 1):
                     for lang in ("it", "en"):
-                        candidate_idx = site_root / lang / part_folder / chap_folder / "index.md"
-                        if candidate_idx.exists():
-                            files.append(candidate_idx.resolve())
-            # remove duplicates while preserving order
-            seen = set()
-            ordered = []
-            for p in files:
-                if p not in seen:
-                    seen.add(p)
-                    ordered.append(p)
-            if ordered:
-                return ordered
+                        candidate = site_root / lang / part_folder / chap_folder / f"{i}.md"
+                        probes += 1
+                        if candidate.exists():
+                            files.append(candidate.resolve())
+                # also try index.md for chapter landing
+                for lang in ("it", "en"):
+                    candidate_idx = site_root / lang / part_folder / chap_folder / "index.md"
+                    probes += 1
+                    if candidate_idx.exists():
+                        files.append(candidate_idx.resolve())
+            info.update(probes=probes, found=len(files))
+        # remove duplicates while preserving order
+        seen = set()
+        ordered = []
+        for p in files:
+            if p not in seen:
+                seen.add(p)
+                ordered.append(p)
+        if ordered:
+            return ordered
 
     # fallback: scan both languages
     files = []
-    for lang in ("it", "en"):
-        root = site_root / lang
-        if root.exists():
-            files.extend(sorted([p.resolve() for p in root.rglob("*.md")]))
+    with profiler.phase("scan it/ and en/ (no TOC)"):
+        for lang in ("it", "en"):
+            root = site_root / lang
+            if root.exists():
+                files.extend(sorted([p.resolve() for p in root.rglob("*.md")]))
     # final dedupe preserving order
     seen = set()
     ordered = []
@@ -130,61 +420,99 @@ def build_file_list(site_root: Path):
             ordered.append(p)
     return ordered
 
-def main():
-    parser = argparse.ArgumentParser()
-    parser.add_argument("--site-root", default=".", help="root of the site (default .)")
-    parser.add_argument("--dry-run", action="store_true")
-    parser.add_argument("--backup", action="store_true")
-    parser.add_argument("--update-refs", action="store_true",
-                        help="replace [[FIG:id]] with a clickable link to the figure")
-    parser.add_argument("--verbose", action="store_true")
-    parser.add_argument("--mode", choices=("chapter",), default="chapter",
-                        help="numbering mode; currently 'chapter' supported")
-    args = parser.parse_args()
+def label_scope(kind, rel: Path, chapter):
+    """(counter key, number prefix) of a label of `kind` in file rel."""
+    # le pagine dei capitoli (index.md) non hanno un numero di sezione: numerazione di capitolo
+    if kind.scope == "section" and rel.stem.isdigit():
+        return (kind.name, chapter, rel.stem), f"{chapter}.{rel.stem}"
+    return (kind.name, chapter), chapter
 
-    site_root = Path(args.site_root).resolve()
-    files = build_file_list(site_root)
+def build_id_map(files_rel, entries, kinds=KINDS):
+    """
+    PASS 1: number the labels of `kinds` in `files_rel` (in TOC order), each kind with
+    its own counters, per chapter or per section.
+    Returns ({lang: {label_id: (label, page_url, kind)}}, {kind: number of labels found}).
+    """
+    counters = {"it": {}, "en": {}}
+    id_map = {"it": {}, "en": {}}
+    totals = {k.name: 0 for k in kinds}
+    for rel in files_rel:
+        entry = entries[rel.as_posix()]
+        lang = detect_lang_from_path(rel)
+        chapter = extract_chapter(rel)
+        page_url = md_rel_to_page_url(rel)
+        for kind_name, label_id in entry["numbered"]:
+            if kind_name not in totals:
+                continue
+            kind = KINDS_BY_NAME[kind_name]
+            key, prefix = label_scope(kind, rel, chapter)
+            n = counters[lang].get(key, 1)
+            # store label, page_url and kind
+            id_map[lang][label_id] = (kind.label(lang, f"{prefix}.{n}"), page_url, kind.name)
+            counters[lang][key] = n + 1
+            totals[kind.name] += 1
+    return id_map, totals
+
+def number_figures(site_root: Path, args, quiet=False, profiler=NULL_PROFILER):
+    """
+    One numbering run (PASS 1 + PASS 2) with the options in args.
+    Returns the list of modified files, or None on error.
+    quiet=True (watch mode) skips the file listing and the final summary.
+    """
+    try:
+        kinds = select_kinds(args.kinds)
+    except ValueError as e:
+        print(f"[ERROR] {e}", file=sys.stderr)
+        return None
+    files = build_file_list(site_root, profiler)
     if not files:
         print("[ERROR] nessun file md trovato (toc.yml mancante o vuoto)", file=sys.stderr)
-        sys.exit(1)
+        return None
 
     # normalize to relative paths for consistent printed output
     files_rel = [p.relative_to(site_root) for p in files]
 
-    print("Files resolved from TOC / scan:")
-    for f in files_rel:
-        print(" ", f)
-    print("Total:", len(files_rel))
+    if not quiet:
+        print("Files resolved from TOC / scan:")
+        for f in files_rel:
+            print(" ", f)
+        print("Total:", len(files_rel))
 
-    # PASS 1: costruisco mappa id -> (label, page_url) per lingua
-    chapter_counters = {"it": {}, "en": {}}
-    id_map = {"it": {}, "en": {}}
-    total_figures = 0
+    # incremental: il manifest precedente è riusabile solo se la lista dei file
+    # e le opzioni che determinano l'output sono le stesse
+    manifest_path = Path(args.manifest) if args.manifest else site_root / DEFAULT_MANIFEST
+    old_manifest = load_manifest(manifest_path) if args.incremental else None
+    if old_manifest is not None:
+        if (old_manifest.get("files") != [r.as_posix() for r in files_rel]
+                or old_manifest.get("mode") != args.mode
+                or old_manifest.get("kinds") != [k.name for k in kinds]
+                or (args.update_refs and not old_manifest.get("update_refs"))):
+            if args.verbose:
+                print("[INFO] manifest does not match the current file list/options: full run")
+            old_manifest = None
+    old_hashes = old_manifest.get("hashes", {}) if old_manifest else {}
 
-    for rel in files_rel:
-        full = site_root / rel
-        lang = detect_lang_from_path(rel)
-        chapter = extract_chapter(rel)
-        # ensure counter entry exists for this chapter in language
-        if chapter not in chapter_counters[lang]:
-            chapter_counters[lang][chapter] = 1
-
-        text = full.read_text(encoding="utf-8")
-        for m in FIG_RE.finditer(text):
-            fig_id = m.group(1)  # the id captured by the simple regex
-            n = chapter_counters[lang][chapter]
-            if lang == "en":
-                label = f"FIGURE {chapter}.{n}"
-            else:
-                label = f"FIGURA {chapter}.{n}"
-            page_url = md_rel_to_page_url(rel)
-            # store label and page_url
-            id_map[lang][fig_id] = (label, page_url)
-            chapter_counters[lang][chapter] += 1
-            total_figures += 1
+    # indice del corpus: legge solo i file cambiati rispetto alla cache
+    idx_path = index_path(site_root, args.index, args.no_index_cache)
+    with profiler.phase("index: load"):
+        entries = load_index(idx_path)
+    texts = refresh_index(site_root, files_rel, entries, args.jobs, profiler)  # rel -> text read here (reused in PASS 2)
+    unreadable = [rel for rel in files_rel if rel.as_posix() not in entries]
+    if unreadable:
+        print(f"[ERROR] cannot read: {', '.join(str(r) for r in unreadable)}", file=sys.stderr)
+        return None
+
+    # rel whose content differs from the manifest
+    changed = set(rel for rel in files_rel if old_hashes.get(rel.as_posix()) != entries[rel.as_posix()]["sha1"])
+
+    # PASS 1: costruisco mappa id -> (label, page_url, kind) per lingua, tutti i tipi insieme
+    with profiler.phase("PASS 1: number labels", files=len(files_rel)) as info:
+        id_map, totals = build_id_map(files_rel, entries, kinds)
+        info.update(totals)
+    total_figures = totals.get("figure", 0)
 
     if args.verbose:
-        print(f"[INFO] Built id -> label map: total figures: {total_figures}")
+        print("[INFO] Built id -> label map: " + ", ".join(f"{k}: {n}" for k, n in totals.items()))
         # show up to 12 mappings (mixed langs)
         shown = 0
         for lg in ("it", "en"):
@@ -196,88 +524,347 @@ def main():
             if shown >= 12:
                 break
 
+    # files to rewrite: all of them, or (incremental) the changed ones plus those
+    # defining or referencing a label whose number/page changed
+    ids_changed = set()
+    if old_manifest is not None:
+        ids_changed = changed_label_ids(old_manifest.get("id_map", {}), id_map)
+        to_rewrite = [
+            rel for rel in files_rel
+            if rel in changed
+            or ids_changed.intersection(label_id for _, label_id in entries[rel.as_posix()]["numbered"])
+            or refers_to(ids_changed, entries[rel.as_posix()]["refs"])
+        ]
+        if not quiet or to_rewrite:
+            print(f"[INFO] incremental: {len(changed)} file(s) changed, "
+                  f"{len(ids_changed)} label id(s) renumbered, {len(to_rewrite)} file(s) to rewrite")
+    else:
+        to_rewrite = files_rel
+
     # PASS 2: riscrivo i file (sostituisco le label e - opzionale - i riferimenti)
     modified = []
+    if args.update_refs:
+        with profiler.phase("PASS 2: build reference index"):
+            ref_index = build_ref_index(id_map)
+    else:
+        ref_index = None
 
-    for rel in files_rel:
-        full = site_root / rel
-        lang = detect_lang_from_path(rel)
-        text = full.read_text(encoding="utf-8")
-
-        # replace figure labels: keep id extracted, produce consistent <p class="figure-label" id="..."><strong>LABEL</strong></p>
-        def repl_fig(m):
-            fig_id = m.group(1)
-            entry = id_map.get(lang, {}).get(fig_id)
-            label = entry[0] if entry else "FIGURA ?"
-            return f'<p class="figure-label" id="{fig_id}">{label}</p>'
-
-        new_text = FIG_RE.sub(repl_fig, text)
-
-        if args.update_refs:
-            # 1) prima sostituisci i token [[FIG:id]]
-            def repl_ref_token(m):
-                fig_id = m.group(1)
-                entry = id_map.get(lang, {}).get(fig_id)
-                if entry:
-                    label, page_url = entry
-                    number = re.sub(r'^(FIGURA|FIGURE)\s+', '', label).strip()
-                    word = "Figura" if lang == "it" else "Figure"
-                    href = f'{{{{ site.baseurl }}}}/{page_url}#{fig_id}'
-                    return f'<a href="{href}">{word} {number}</a>'
-                else:
-                    # fallback: try the other language map
-                    other = "en" if lang == "it" else "it"
-                    entry2 = id_map.get(other, {}).get(fig_id)
-                    if entry2:
-                        label2, page_url2 = entry2
-                        number2 = re.sub(r'^(FIGURA|FIGURE)\s+', '', label2).strip()
-                        word2 = "Figura" if other == "it" else "Figure"
-                        href2 = f'{{{{ site.baseurl }}}}/{page_url2}#{fig_id}'
-                        return f'<a href="{href2}">{word2} {number2}</a>'
-                    return m.group(0)
-
-            new_text = REF_RE.sub(repl_ref_token, new_text)
-
-            # 2) poi sostituisci anche eventuali anchor HTML già esistenti che puntano a #fig_id
-            #    (es. <a href="/it/I/1/1#gr_figB">Figura 1.2</a> o <a href="#gr_figB">Figura 1.2</a>)
-            #    per ogni fig_id noto nella lingua corrente, sostituisci l'intero <a ...>...</a>
-            #    con la versione aggiornata.
-            for fig_id, (label, page_url) in id_map.get(lang, {}).items():
-                number = re.sub(r'^(FIGURA|FIGURE)\s+', '', label).strip()
-                word = "Figura" if lang == "it" else "Figure"
-                href_full = f'{{{{ site.baseurl }}}}/{page_url}#{fig_id}'
-                # regex per trovare <a ... href="(maybe site.baseurl...)?#fig_id" ...>...</a>
-                # - non-greedy match for attributes and inner text
-                anchor_re = re.compile(
-                    rf'<a\b([^>]*)\bhref=(["\'])(?:[^"\']*?){re.escape("#"+fig_id)}\2([^>]*)>.*?</a>',
-                    flags=re.IGNORECASE | re.DOTALL
-                )
-                # replacement: a consistent anchor pointing to the canonical page_url
-                replacement = f'<a href="{href_full}">{word} {number}</a>'
-                new_text, nrep = anchor_re.subn(replacement, new_text)
-                # (nrep used only implicitly; continue for all fig_ids)
-
-            # 3) fallback: prova anche a trovare anchors che usano other-language page_url
-            #    (rare; handled implicitly above by two-language map during token replacement)
-
-        if new_text != text:
-            modified.append(rel)
-            if not args.dry_run:
-                if args.backup:
-                    bak = full.with_suffix(full.suffix + ".bak")
-                    bak.write_bytes(full.read_bytes())
-                full.write_text(new_text, encoding="utf-8")
-            if args.verbose:
-                print(f"[MOD] {rel}")
+    with profiler.phase("PASS 2: rewrite", files=len(to_rewrite)):
+        results = parallel_map(
+            _rewrite_file, [(rel, texts.pop(rel, None)) for rel in to_rewrite], args.jobs,
+            initializer=_init_rewrite, initargs=(site_root, id_map, ref_index, kinds),
+        )
+
+    with profiler.phase("PASS 2: write files", dry_run=bool(args.dry_run)) as info:
+        for rel, (new_text, stats, mismatched) in zip(to_rewrite, results):
+            profiler.file("rewrite", rel, stats)
+            for token, kind in mismatched:
+                print(f"[WARN] {rel}: {token} refers to a {kind} label, left unchanged", file=sys.stderr)
+            full = site_root / rel
+            if new_text is not None:
+                modified.append(rel)
+                if not args.dry_run:
+                    if args.backup:
+                        bak = full.with_suffix(full.suffix + ".bak")
+                        bak.write_bytes(full.read_bytes())
+                    atomic_write_text(full, new_text)
+                    entries[rel.as_posix()] = index_entry(site_root, rel, new_text)
+                if args.verbose:
+                    print(f"[MOD] {rel}")
+        info["modified"] = len(modified)
+
+    with profiler.phase("index: save"):
+        save_index(idx_path, site_root, entries)
+    if args.incremental and not args.dry_run:
+        with profiler.phase("manifest: save"):
+            save_manifest(manifest_path, {
+                "version": MANIFEST_VERSION,
+                "mode": args.mode,
+                "kinds": [k.name for k in kinds],
+                "update_refs": bool(args.update_refs),
+                "files": [r.as_posix() for r in files_rel],
+                "hashes": {r.as_posix(): entries[r.as_posix()]["sha1"] for r in files_rel},
+                "id_map": id_map,
+            })
+
+    if args.changes is not None:
+        changes_path = Path(args.changes) if args.changes else site_root / DEFAULT_CHANGES
+        edited = changed if old_manifest is not None else set()
+        with profiler.phase("changes: save"):
+            feed = build_changes(files_rel, entries, modified, edited, ids_changed, args.dry_run)
+            atomic_write_text(changes_path, json.dumps(feed, ensure_ascii=False, indent=1) + "\n")
+        if not quiet or feed["pages"]:
+            print(f"[INFO] {len(feed['pages'])} changed page(s) -> {changes_path}")
+
+    if quiet:
+        if not args.verbose:
+            for r in modified:
+                print(f"[MOD] {r}")
+        return modified
 
     print("\nDone.")
     print("Total figures discovered:", total_figures)
+    others = {k: n for k, n in totals.items() if k != "figure" and n}
+    if others:
+        print("Other labels discovered:", "  ".join(f"{k}: {n}" for k, n in others.items()))
     print("Files modified:", len(modified))
     if args.dry_run:
         print("(dry-run: no file changes were written)")
     if args.verbose and modified:
         for r in modified:
             print(" -", r)
+    return modified
+
+def snapshot(site_root: Path):
+    """(mtime_ns, size) of the watched files: it/**/*.md, en/**/*.md, _data/toc.yml and the graph specs."""
+    snap = {}
+    paths = [site_root / "_data" / "toc.yml"] + [site_root / r for r in corpus_files(site_root)]
+    paths += [site_root / r for r in graph_specs(site_root)]
+    for p in paths:
+        try:
+            st = p.stat()
+        except OSError:
+            continue
+        snap[p] = (st.st_mtime_ns, st.st_size)
+    return snap
+
+def changed_paths(old, new):
+    """Paths added, removed or modified between two snapshots."""
+    return set(p for p in set(old) | set(new) if old.get(p) != new.get(p))
+
+def wait_for_change_polling(site_root: Path, snap, interval: float, debounce: float):
+    """Poll until the watched files differ from snap and stay unchanged for `debounce` seconds."""
+    while True:
+        time.sleep(interval)
+        cur = snapshot(site_root)
+        if cur != snap:
+            break
+    # debounce: aspetta che la raffica di salvataggi sia finita
+    while True:
+        time.sleep(debounce)
+        nxt = snapshot(site_root)
+        if nxt == cur:
+            return cur
+        cur = nxt
+
+def watch(site_root: Path, args):
+    """
+    --watch: renumber incrementally, re-run the orphan check and update _data/nav.json and
+    the search index of the languages concerned whenever a page or the TOC changes,
+    recompile the graph specs (<lang>/graphs/**/*.yml -> .json) that change. Uses watchdog
+    (inotify) if installed, otherwise polling.
+    """
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+    import find_orphan_fig_refs as orphans
+    import build_nav
+    import build_search_index
+    import compile_graph_calcs
+
+    # il manifest permette di riscrivere solo i file del capitolo interessato
+    args.incremental = True
+    reported = set()
+    # (mtime_ns, size) dei .md riscritti dallo script: con inotify la loro scrittura atomica
+    # genera eventi che non sono modifiche dell'utente
+    own_writes = {}
+    toc = site_root / "_data" / "toc.yml"
+
+    def kind_of_path(path):
+        """'graph' for a graph spec, 'page' for a .md page or the TOC, None otherwise."""
+        if not path:
+            return None
+        path = Path(path)
+        try:
+            rel = path.resolve().relative_to(site_root)
+        except ValueError:
+            return None
+        if len(rel.parts) > 2 and rel.parts[0] in ("it", "en") and rel.parts[1] == "graphs":
+            return "graph" if path.suffix == ".yml" else None
+        if path.suffix == ".md" or rel == Path("_data", "toc.yml"):
+            return "page"
+        return None
+
+    def renumber(pages):
+        modified = number_figures(site_root, args, quiet=True)
+        if modified is None:
+            return
+        for rel in modified:
+            try:
+                st = (site_root / rel).stat()
+            except OSError:
+                continue
+            own_writes[site_root / rel] = (st.st_mtime_ns, st.st_size)
+        update_derived(pages, modified)
+        corpus = orphans.load_corpus(site_root, args.index, args.no_index_cache, args.jobs)
+        orphan_refs, cross_refs = orphans.classify_refs(corpus)
+        current = set(orphan_refs) | set(cross_refs)
+        new = current - reported
+        if new:
+            orphans.report([r for r in orphan_refs if r in new], [r for r in cross_refs if r in new])
+        elif reported - current:
+            print(f"✅ {len(reported - current)} riferimento/i risolto/i")
+        reported.clear()
+        reported.update(current)
+
+    def update_derived(pages, modified):
+        # navigazione e indice di ricerca precalcolati (serve.sh li costruisce all'avvio):
+        # la navigazione a ogni giro (titoli, figure), la ricerca per le lingue delle pagine
+        # modificate o riscritte (tutte se è cambiato il TOC); scritti solo se cambiano
+        files_rel = [p.relative_to(site_root) for p in build_file_list(site_root)]
+        idx_path = index_path(site_root, args.index, args.no_index_cache)
+        _, written = build_nav.update_nav(site_root, files_rel, idx_path, site_root / build_nav.DEFAULT_OUT)
+        if written:
+            print(f"[MOD] {build_nav.DEFAULT_OUT}")
+
+        rels = [p.resolve().relative_to(site_root) for p in pages] + list(modified)
+        if Path("_data", "toc.yml") in rels:
+            langs = LANGS
+        else:
+            langs = [lang for lang in LANGS if any(rel.parts[0] == lang for rel in rels)]
+        toc_data = load_toc(site_root)
+        for lang in langs:
+            if not (site_root / lang).exists():
+                continue
+            *_, written = build_search_index.build_language(site_root, lang, toc_data)
+            if written:
+                print(f"[MOD] {lang}/{build_search_index.OUT_DIR}/ ({written} file(s))")
+
+    def recompile(paths):
+        # embedded-graph.html carica il .json compilato: va tenuto allineato al .yml
+        for path in sorted(paths):
+            if not path.exists():
+                continue
+            rel = path.resolve().relative_to(site_root)
+            errors, _, status = compile_graph_calcs.compile_file(site_root, rel)
+            if errors:
+                print(f"❌ {rel}")
+                for e in errors:
+                    print(f"    {e}")
+            elif status == "written":
+                print(f"[MOD] {rel.with_suffix('.json')}")
+
+    def written_by_us(path):
+        try:
+            st = path.stat()
+        except OSError:
+            return False
+        return own_writes.get(path) == (st.st_mtime_ns, st.st_size)
+
+    def run(paths):
+        pages = [Path(p) for p in paths if kind_of_path(p) == "page"]
+        if pages:
+            renumber(pages)
+        graphs = [Path(p) for p in paths if kind_of_path(p) == "graph"]
+        if graphs:
+            recompile(graphs)
+
+    events = None
+    pending = set()
+    lock = threading.Lock()
+    if Observer is not None and not args.poll:
+        events = threading.Event()
+
+        class Handler(FileSystemEventHandler):
+            def on_any_event(self, event):
+                # watchdog recenti segnalano anche le letture (opened, closed_no_write): lo
+                # script stesso legge tutte le pagine a ogni giro
+                if event.event_type in ("opened", "closed_no_write"):
+                    return
+                # gli editor che salvano con file temporaneo + rename producono un evento
+                # "moved" il cui src_path è il file temporaneo: conta la destinazione
+                paths = [p for p in (event.src_path, getattr(event, "dest_path", "")) if kind_of_path(p)]
+                if paths:
+                    with lock:
+                        pending.update(Path(p) for p in paths)
+                    events.set()
+
+        observer = Observer()
+        for sub in ("it", "en", "_data"):
+            if (site_root / sub).exists():
+                observer.schedule(Handler(), str(site_root / sub), recursive=True)
+        observer.start()
+
+    print(f"👀 Watching it/, en/, _data/toc.yml and the graph specs ({'inotify' if events else 'polling'}); "
+          "Ctrl-C to stop")
+    run([toc])
+    snap = snapshot(site_root)
+    try:
+        while True:
+            if events is not None:
+                events.wait()
+                # debounce: riparti finché arrivano eventi
+                events.clear()
+                while events.wait(args.debounce):
+                    events.clear()
+                with lock:
+                    paths = set(p for p in pending if not written_by_us(p))
+                    pending.clear()
+                if not paths:
+                    continue
+            else:
+                cur = wait_for_change_polling(site_root, snap, args.interval, args.debounce)
+                paths = changed_paths(snap, cur)
+            run(paths)
+            if events is None:
+                snap = snapshot(site_root)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if events is not None:
+            observer.stop()
+            observer.join()
+    return 0
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--site-root", default=".", help="root of the site (default .)")
+    parser.add_argument("--dry-run", action="store_true")
+    parser.add_argument("--backup", action="store_true")
+    parser.add_argument("--update-refs", action="store_true",
+                        help="replace [[FIG:id]] with a clickable link to the figure")
+    parser.add_argument("--verbose", action="store_true")
+    parser.add_argument("--mode", choices=("chapter",), default="chapter",
+                        help="numbering mode; currently 'chapter' supported")
+    parser.add_argument("--kinds", default=None,
+                        help="comma-separated label kinds to number (default: all of "
+                             + ", ".join(k.name for k in KINDS) + ")")
+    parser.add_argument("--incremental", action="store_true",
+                        help="reuse the manifest of the previous run and only re-read/rewrite affected files")
+    parser.add_argument("--manifest", default=None,
+                        help=f"manifest path for --incremental (default <site-root>/{DEFAULT_MANIFEST})")
+    parser.add_argument("--index", default=None,
+                        help=f"corpus index path (default <site-root>/{DEFAULT_INDEX})")
+    parser.add_argument("--no-index-cache", action="store_true",
+                        help="do not read or write the corpus index cache")
+    parser.add_argument("--jobs", type=int, default=1,
+                        help="worker processes for reading/rewriting files (0 = one per CPU, default 1)")
+    parser.add_argument("--watch", action="store_true",
+                        help="keep running: renumber, check orphans and update nav.json and the search index "
+                             "whenever it/, en/ or the TOC change, recompile graph specs when they change")
+    parser.add_argument("--poll", action="store_true",
+                        help="with --watch, poll file mtimes even if watchdog is installed")
+    parser.add_argument("--interval", type=float, default=0.5,
+                        help="polling interval in seconds for --watch (default 0.5)")
+    parser.add_argument("--debounce", type=float, default=0.3,
+                        help="quiet time in seconds before reacting to a burst of saves (default 0.3)")
+    parser.add_argument("--profile", nargs="?", const="", default=None, metavar="TRACE",
+                        help="time each phase and file; write a Chrome trace (default "
+                             f"<site-root>/{DEFAULT_PROFILE}) and print a summary to stderr")
+    parser.add_argument("--changes", nargs="?", const="", default=None, metavar="PATH",
+                        help="write the pages changed by the run, for an incremental Jekyll build "
+                             f"(default <site-root>/{DEFAULT_CHANGES})")
+    args = parser.parse_args()
+
+    site_root = Path(args.site_root).resolve()
+    if args.watch:
+        if args.profile is not None:
+            print("[WARN] --profile is ignored with --watch", file=sys.stderr)
+        sys.exit(watch(site_root, args))
+    profiler = Profiler() if args.profile is not None else NULL_PROFILER
+    with profiler.phase("total"):
+        modified = number_figures(site_root, args, profiler=profiler)
+    profiler.report(Path(args.profile) if args.profile else site_root / DEFAULT_PROFILE, sys.stderr)
+    if modified is None:
+        sys.exit(1)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
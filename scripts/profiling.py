@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+profiling.py
+
+Profilazione a fasi per number_figures_from_toc.py e find_orphan_fig_refs.py (--profile).
+
+Registra il tempo (wall) di ogni fase (lettura del TOC, probe dei file, PASS 1, PASS 2,
+scansione degli orphan, ...) e, per ogni file letto o riscritto, tempo, byte e numero di
+match delle regex. Produce:
+- un file JSON nel formato "trace event" di Chrome (chrome://tracing, https://ui.perfetto.dev),
+  con una riga per il processo principale e una per ogni worker di --jobs
+- un riepilogo testuale con le fasi e i file più lenti
+
+Il profiler disabilitato (NULL_PROFILER) non registra nulla, così il codice degli script
+non deve controllare se --profile è attivo.
+"""
+from contextlib import contextmanager
+from pathlib import Path
+import json
+import os
+import sys
+import time
+
+def now_us() -> float:
+    """Monotonic clock in microseconds (system-wide on Linux, so comparable across workers)."""
+    return time.perf_counter_ns() / 1000
+
+class Profiler:
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.pid = os.getpid()
+        self.origin = now_us()
+        self.phases = []  # (name, start_us, dur_us, args)
+        self.files = []   # (step, rel, start_us, dur_us, worker pid, bytes, matches)
+
+    @contextmanager
+    def phase(self, name, **args):
+        """Time a phase of the run; extra keyword arguments end up in the trace."""
+        if not self.enabled:
+            yield args
+            return
+        start = now_us()
+        try:
+            yield args
+        finally:
+            self.phases.append((name, start, now_us() - start, args))
+
+    def file(self, step, rel, stats):
+        """
+        Record the work on one file. `stats` is the dict returned by the workers:
+        start/dur (us), pid, bytes and matches ({regex: count}).
+        """
+        if not self.enabled or stats is None:
+            return
+        self.files.append((step, str(rel), stats["start"], stats["dur"], stats["pid"],
+                           stats.get("bytes", 0), stats.get("matches", {})))
+
+    def trace_events(self):
+        events = [{"name": "process_name", "ph": "M", "pid": self.pid, "tid": self.pid,
+                   "args": {"name": Path(sys.argv[0]).name}}]
+        workers = sorted(set(f[4] for f in self.files) - {self.pid})
+        events.append({"name": "thread_name", "ph": "M", "pid": self.pid, "tid": self.pid, "args": {"name": "main"}})
+        for i, pid in enumerate(workers, 1):
+            events.append({"name": "thread_name", "ph": "M", "pid": self.pid, "tid": pid,
+                           "args": {"name": f"worker {i} (pid {pid})"}})
+        for name, start, dur, args in self.phases:
+            events.append({"name": name, "cat": "phase", "ph": "X", "pid": self.pid, "tid": self.pid,
+                           "ts": round(start - self.origin, 1), "dur": round(dur, 1), "args": args})
+        for step, rel, start, dur, pid, nbytes, matches in self.files:
+            events.append({"name": rel, "cat": step, "ph": "X", "pid": self.pid, "tid": pid,
+                           "ts": round(start - self.origin, 1), "dur": round(dur, 1),
+                           "args": dict(bytes=nbytes, **matches)})
+        return events
+
+    def write_trace(self, path: Path):
+        path = Path(path)
+        tmp = path.with_name(path.name + ".tmp")
+        with tmp.open("w", encoding="utf-8") as f:
+            json.dump({"traceEvents": self.trace_events(), "displayTimeUnit": "ms"}, f)
+        tmp.replace(path)
+
+    def summary(self, top=15) -> str:
+        """Phases and the `top` slowest files, slowest first."""
+        lines = ["Phases (wall time):"]
+        for name, _, dur, args in sorted(self.phases, key=lambda p: -p[2]):
+            extra = "  ".join(f"{k}={v}" for k, v in args.items())
+            lines.append(f"  {dur / 1000:10.1f} ms  {name}" + (f"  ({extra})" if extra else ""))
+        if self.files:
+            per_step = {}
+            for step, _, _, dur, _, nbytes, _ in self.files:
+                n, t, b = per_step.get(step, (0, 0.0, 0))
+                per_step[step] = (n + 1, t + dur, b + nbytes)
+            lines.append("Files per step:")
+            for step, (n, t, b) in sorted(per_step.items(), key=lambda s: -s[1][1]):
+                lines.append(f"  {t / 1000:10.1f} ms  {step}: {n} files, {b / 1e6:.2f} MB")
+            lines.append(f"Slowest files (top {top}):")
+            for step, rel, _, dur, _, nbytes, matches in sorted(self.files, key=lambda f: -f[3])[:top]:
+                counts = " ".join(f"{k}={v}" for k, v in matches.items() if v)
+                lines.append(f"  {dur / 1000:10.2f} ms  {nbytes:9d} B  {step:<8} {rel}  {counts}")
+        return "\n".join(lines)
+
+    def report(self, trace_path: Path, out):
+        """Write the trace and print the summary to `out` (stderr, so that stdout stays clean)."""
+        if not self.enabled:
+            return
+        self.write_trace(trace_path)
+        print(self.summary(), file=out)
+        print(f"[INFO] trace written -> {trace_path} (open it in chrome://tracing or ui.perfetto.dev)", file=out)
+
+NULL_PROFILER = Profiler(enabled=False)
+
+def file_stats(start_us, nbytes, matches):
+    """Per-file stats returned by the workers to the Profiler of the main process."""
+    return {"start": start_us, "dur": now_us() - start_us, "pid": os.getpid(),
+            "bytes": nbytes, "matches": matches}
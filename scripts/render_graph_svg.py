@@ -0,0 +1,1034 @@
+#!/usr/bin/env python3
+"""
+render_graph_svg.py
+
+Istantanee SVG statiche dei grafici KineticGraphs (<lang>/graphs/**/gr_*.yml) per la
+stampa e per le pagine senza JavaScript: la stampa di un capitolo non deve più avviare kg
+e aspettare che ogni kg-container sia disegnato, usa <lang>/graphs/<nome>.svg.
+
+Per ogni specifica con layout OneGraph o OneGraphPlusSidebar:
+- valuta i `calcs` con i valori iniziali dei `params` (il valutatore di
+  sweep_graph_calcs.py su scalari; nelle funzioni `x` e `y` sono l'array dei campioni)
+- disegna assi (tick come d3.axis), Area, Rectangle, Ellipse, Curve, Line, Segment,
+  Arrow, Point (con droplines), Points e Label, con le dimensioni, i colori, i livelli e
+  gli scostamenti delle etichette di kg 0.3.1
+- scrive accanto allo YAML un <nome>.svg, solo se cambia
+
+Approssimazioni:
+- il LaTeX delle etichette (KaTeX nel browser) diventa testo semplice: \\text, \\frac,
+  \\sqrt, apici e pedici, lettere greche e simboli, \\color, \\textbf, dimensioni
+  (\\small, \\Large, ...); gli altri comandi sono ignorati
+- è lo stato iniziale del grafico: niente sidebar, slider né interazione
+- gli oggetti che dipendono da calcs generati da kg a runtime (calcs.<nome oggetto>) o di
+  tipo non supportato (ContourMap, ...) sono omessi; --verbose li elenca
+
+Le specifiche con altri layout sono saltate: build_graph_manifest.py segnala a
+embedded-graph.html solo i grafici che hanno un'istantanea.
+
+Richiede numpy; senza numpy lo script avvisa ed esce con 0 (serve.sh prosegue con le
+istantanee già nel repository), tranne con --check.
+
+Exit codes:
+  0 -> istantanee scritte o già aggiornate (o numpy mancante, senza --check)
+  1 -> almeno una specifica non disegnabile, oppure con --check almeno un .svg
+       mancante o non aggiornato (o numpy mancante)
+
+Usage:
+  python3 scripts/render_graph_svg.py [--site-root .] [--check] [--verbose] [files...]
+"""
+from pathlib import Path
+import argparse
+import html
+import math
+import re
+import sys
+
+try:
+    import numpy as np
+except ImportError:
+    # numpy è opzionale: serve.sh non deve fermarsi, restano le istantanee già nel repository
+    if "--check" in sys.argv[1:]:
+        sys.exit("[ERROR] render_graph_svg.py --check richiede numpy (pip install numpy)")
+    print("[WARN] numpy non installato: istantanee SVG non aggiornate (pip install numpy)", file=sys.stderr)
+    sys.exit(0)
+
+from compile_graph_calcs import compile_calcs, calc_leaves, load_compiled
+from kg_spec import SpecError, graph_specs, parse_expr
+from sweep_graph_calcs import Evaluator, Unknown
+
+# layout supportati -> posizione del grafico nel riquadro (frazioni, come in kg)
+LAYOUTS = {
+    "OneGraph": {"x": 0.15, "y": 0.025, "width": 0.74, "height": 0.9},
+    "OneGraphPlusSidebar": {"x": 0.15, "y": 0.025, "width": 0.738, "height": 0.9},
+}
+DEFAULT_ASPECT = 1.22     # SquareLayout
+WIDTH = 600               # larghezza del viewBox (px)
+CLEAR_COLOR = "#fffff8"   # clearColor di embedded-graph.html: sfondo delle etichette
+SAMPLES = 100             # campioni per Curve e Area
+
+PT = 4 / 3                # le etichette di kg hanno font-size in pt
+KATEX_SCALE = 1.21        # .katex { font-size: 1.21em }
+TICK_FONT = 5 * PT        # .tick { font-size: 5pt } (kg-tufte.css)
+FONT_FAMILY = "KaTeX_Main, 'Times New Roman', serif"
+
+# Schema: d3.schemeCategory10
+PALETTE = {
+    "blue": "#1f77b4", "orange": "#ff7f0e", "green": "#2ca02c", "red": "#d62728",
+    "purple": "#9467bd", "brown": "#8c564b", "magenta": "#e377c2", "grey": "#7f7f7f",
+    "gray": "#7f7f7f", "olive": "#bcbd22",
+}
+# EconSchema: colori per ruolo
+ECON_COLORS = {
+    "utility": "purple", "mrs": "blue", "dispreferred": "red", "preferred": "green",
+    "offer": "blue", "incomeOffer": "orange", "demand": "blue", "budget": "green",
+    "costlier": "red", "endowment": "grey", "incEffect": "orange", "subEffect": "red",
+    "production": "blue", "mpl": "olive", "marginalCost": "orange", "marginalRevenue": "olive",
+    "supply": "orange", "shortRun": "red", "longRun": "orange", "profit": "green", "loss": "red",
+    "ppf": "red", "mrt": "orange", "price": "grey", "paretoLens": "'#ffff99'",
+    "equilibriumPrice": "green", "consumption": "blue", "depreciation": "red",
+    "savings": "green", "tax": "red", "player1": "blue", "player2": "red",
+    "player3": "orange", "nature": "green", "terminal": "gray",
+}
+
+# ---------------------------------------------------------------------------
+# evaluation
+
+class SnapshotEvaluator(Evaluator):
+    """Evaluator on the initial param values; `variables` binds x / y to the sample points."""
+
+    def __init__(self, params, calcs):
+        super().__init__(params, calcs)
+        self.variables = {}
+
+    def eval(self, node):
+        if node[0] == "name" and node[1] in self.variables:
+            return self.variables[node[1]]
+        return super().eval(node)
+
+def spec_evaluator(spec):
+    """Evaluator with the params at their `value` and the calcs evaluated in dependency order."""
+    params = {}
+    for p in spec.get("params") or []:
+        if isinstance(p, dict) and "name" in p:
+            try:
+                params[p["name"]] = float(p.get("value"))
+            except (TypeError, ValueError):
+                pass
+    ev = SnapshotEvaluator(params, {})
+    order, _, _ = compile_calcs(spec)
+    calcs = spec.get("calcs") or {}
+    for name in order:
+        result = {}
+        for path, src in calc_leaves(calcs[name]):
+            try:
+                value = ev(src)
+            except (Unknown, SpecError, TypeError, ValueError):
+                value = None
+            if path:
+                node = result
+                for key in path[:-1]:
+                    node = node.setdefault(key, {})
+                node[path[-1]] = value
+            else:
+                result = value
+        ev.calcs[name] = result
+    return ev
+
+def number(ev, src, default=None):
+    """Finite value of a number or expression, `default` if it cannot be evaluated."""
+    if src is None:
+        return default
+    if isinstance(src, (bool, int, float)):
+        value = float(src)
+    else:
+        try:
+            value = float(ev(src))
+        except (Unknown, SpecError, TypeError, ValueError):
+            return default
+    return value if math.isfinite(value) else default
+
+def shown(ev, d):
+    """`show` of an object (shown if kg would evaluate it at runtime only)."""
+    if "show" not in d:
+        return True
+    value = number(ev, d["show"])
+    return value is None or value != 0
+
+def samples(ev, src, values, var):
+    """fn evaluated at the sample points (array, NaN where undefined)."""
+    ev.variables = {var: values}
+    try:
+        out = ev(src)
+    except (Unknown, SpecError, TypeError, ValueError):
+        return None
+    finally:
+        ev.variables = {}
+    return np.broadcast_to(np.asarray(out, dtype=float), values.shape)
+
+# ---------------------------------------------------------------------------
+# text
+
+TEMPLATE_RE = re.compile(r'\$\{([^}]*)\}')
+JS_ESCAPE_RE = re.compile(r'\\(.)', re.DOTALL)
+JS_ESCAPES = {"n": "\n", "t": "\t", "r": "\r"}
+
+def js_number(value):
+    """Number.prototype.toString for the values that end up in labels."""
+    if math.isnan(value):
+        return "NaN"
+    if math.isinf(value):
+        return "Infinity" if value > 0 else "-Infinity"
+    if value == int(value) and abs(value) < 1e21:
+        return str(int(value))
+    return repr(value)
+
+def expr_text(ev, src):
+    """Text of an expression as kg shows it; toFixed keeps its decimals."""
+    node = parse_expr(src)
+    value = float(np.asarray(ev.eval(node), dtype=float))
+    if node[0] == "method" and node[2] == "toFixed":
+        digits = int(float(ev.eval(node[3][0]))) if node[3] else 0
+        return f"{value:.{digits}f}"
+    return js_number(value)
+
+def label_text(ev, text):
+    """
+    Text of a label as kg evaluates it: `...${expr}...` is a JavaScript template literal,
+    anything else an expression if it evaluates, otherwise the literal text.
+    """
+    if text is None or isinstance(text, bool):
+        return None
+    if isinstance(text, (int, float)):
+        return js_number(float(text))
+    s = str(text).strip()
+    if len(s) >= 2 and s[0] == "`" and s[-1] == "`":
+        def substitute(m):
+            try:
+                return expr_text(ev, m.group(1))
+            except (Unknown, SpecError, TypeError, ValueError):
+                return ""
+        body = JS_ESCAPE_RE.sub(lambda m: JS_ESCAPES.get(m.group(1), m.group(1)), s[1:-1])
+        return TEMPLATE_RE.sub(substitute, body)
+    try:
+        return expr_text(ev, s)
+    except (Unknown, SpecError, TypeError, ValueError):
+        return s
+
+# LaTeX (KaTeX) -> runs of plain text with a style
+SIZES = {
+    "tiny": 0.5, "scriptsize": 0.7, "footnotesize": 0.8, "small": 0.9, "normalsize": 1.0,
+    "large": 1.2, "Large": 1.44, "LARGE": 1.728, "huge": 2.074, "Huge": 2.488,
+}
+TEXT_COMMANDS = {"text", "textrm", "textnormal", "textup", "textsf", "mbox", "mathrm", "mathsf", "operatorname"}
+BOLD_COMMANDS = {"textbf", "mathbf", "boldsymbol", "bm", "pmb"}
+ITALIC_COMMANDS = {"textit", "mathit", "emph"}
+FRAC_COMMANDS = {"frac", "dfrac", "tfrac", "cfrac"}
+IGNORED_COMMANDS = {
+    "left", "right", "big", "Big", "bigg", "Bigg", "bigl", "bigr", "Bigl", "Bigr",
+    "displaystyle", "textstyle", "scriptstyle", "limits", "nolimits", "mathstrut",
+}
+SPACES = {"quad": " ", "qquad": "  ", ",": " ", ";": " ", ":": " ", " ": " ", "!": "", "enspace": " "}
+ACCENTS = {"hat": "̂", "widehat": "̂", "bar": "̄", "overline": "̅",
+           "tilde": "̃", "widetilde": "̃", "dot": "̇", "ddot": "̈", "vec": "⃗"}
+GREEK = "alpha beta gamma delta epsilon zeta eta theta iota kappa lambda mu nu xi omicron pi rho sigma tau upsilon phi chi psi omega"
+SYMBOLS = {name: chr(0x3b1 + i) for i, name in enumerate(GREEK.split()) if name != "omicron"}
+SYMBOLS.update({name.capitalize(): chr(0x391 + i) for i, name in enumerate(GREEK.split())})
+SYMBOLS.update({
+    "varepsilon": "ε", "epsilon": "ϵ", "vartheta": "ϑ", "varphi": "φ", "phi": "ϕ", "varrho": "ϱ",
+    "sigma": "σ", "varsigma": "ς", "times": "×", "cdot": "·", "div": "÷", "pm": "±", "mp": "∓",
+    "leq": "≤", "le": "≤", "geq": "≥", "ge": "≥", "neq": "≠", "ne": "≠", "approx": "≈",
+    "equiv": "≡", "sim": "∼", "infty": "∞", "partial": "∂", "nabla": "∇", "prime": "′",
+    "to": "→", "rightarrow": "→", "leftarrow": "←", "Rightarrow": "⇒", "Leftarrow": "⇐",
+    "leftrightarrow": "↔", "Leftrightarrow": "⇔", "uparrow": "↑", "downarrow": "↓",
+    "ldots": "…", "cdots": "⋯", "dots": "…", "checkmark": "✓", "star": "⋆", "circ": "∘",
+    "bullet": "•", "ell": "ℓ", "sum": "∑", "prod": "∏", "int": "∫", "in": "∈", "notin": "∉",
+    "cup": "∪", "cap": "∩", "subset": "⊂", "subseteq": "⊆", "forall": "∀", "exists": "∃",
+    "emptyset": "∅", "varnothing": "∅", "succ": "≻", "succeq": "⪰", "prec": "≺", "preceq": "⪯",
+    "sim": "∼", "euro": "€", "%": "%", "$": "$", "&": "&", "#": "#", "_": "_",
+    "{": "{", "}": "}", "lbrace": "{", "rbrace": "}", "langle": "⟨", "rangle": "⟩",
+    "lvert": "|", "rvert": "|", "vert": "|", "mid": "|",
+})
+MATH_CHARS = {"-": "−", "'": "′", "*": "∗"}
+RELATIONS = set("=<>≤≥≠≈≡∼→⇒∈")
+
+class _TeX:
+    """Tiny LaTeX reader: (text, style) runs, style = size, dy, bold, italic, color, underline."""
+
+    NAME_RE = re.compile(r'[A-Za-z]+')
+
+    def __init__(self, src):
+        self.src = src
+        self.i = 0
+
+    def runs(self):
+        style = {"scale": 1.0, "size": 1.0, "dy": 0.0, "bold": False, "italic": False,
+                 "color": None, "underline": False}
+        return self.group(style, math=True, top=True)
+
+    def peek(self):
+        return self.src[self.i] if self.i < len(self.src) else ""
+
+    def group(self, style, math, top=False):
+        """Runs up to the closing brace; size and color switches last until then."""
+        style = dict(style)
+        out = []
+        while self.i < len(self.src):
+            c = self.src[self.i]
+            if c == "}" and not top:
+                self.i += 1
+                break
+            self.i += 1
+            if c == "{":
+                out += self.group(style, math)
+            elif c == "}":
+                continue
+            elif c == "$":
+                math = not math
+            elif c in "_^" and math:
+                out += self.atom(self.script(style, c == "^"), math)
+            elif c == "\\":
+                out += self.command(style, math, out)
+            elif c == "~":
+                out.append((" ", dict(style)))
+            elif c.isspace():
+                if not math:
+                    out.append((" ", dict(style)))
+            elif math and c in "+-" and out:
+                out.append((" " + MATH_CHARS.get(c, c) + " ", dict(style)))
+            elif math and c in RELATIONS:
+                out.append((" " + c + " ", dict(style)))
+            elif math:
+                out.append((MATH_CHARS.get(c, c), dict(style, italic=style["italic"] or c.isalpha())))
+            else:
+                out.append((c, dict(style)))
+        return out
+
+    @staticmethod
+    def script(style, sup):
+        rel = style["scale"] * style["size"]
+        return dict(style, scale=style["scale"] * 0.7, dy=style["dy"] + (-0.4 if sup else 0.25) * rel)
+
+    def atom(self, style, math):
+        """A braced group, a command or a single character."""
+        while self.peek().isspace():
+            self.i += 1
+        c = self.peek()
+        if not c:
+            return []
+        self.i += 1
+        if c == "{":
+            return self.group(style, math)
+        if c == "\\":
+            return self.command(dict(style), math, [])
+        if math:
+            return [(MATH_CHARS.get(c, c), dict(style, italic=style["italic"] or c.isalpha()))]
+        return [(c, dict(style))]
+
+    def raw_arg(self):
+        """Text of a braced argument (color names)."""
+        while self.peek().isspace():
+            self.i += 1
+        if self.peek() != "{":
+            return ""
+        end = self.src.find("}", self.i)
+        end = len(self.src) if end < 0 else end
+        arg = self.src[self.i + 1:end]
+        self.i = end + 1
+        return arg.strip()
+
+    def command(self, style, math, before):
+        m = self.NAME_RE.match(self.src, self.i)
+        if not m:
+            c = self.peek()
+            self.i += 1
+            if c in SPACES:
+                return [(SPACES[c], dict(style))]
+            if c == "\\":
+                return [(" ", dict(style))]
+            return [(c, dict(style))] if c else []
+        name = m.group()
+        self.i = m.end()
+        if name in SIZES:
+            style["size"] = SIZES[name]
+            return []
+        if name == "color":
+            style["color"] = self.raw_arg()
+            return []
+        if name == "textcolor":
+            return self.atom(dict(style, color=self.raw_arg()), math)
+        if name in TEXT_COMMANDS:
+            return self.atom(dict(style, italic=False), False)
+        if name in BOLD_COMMANDS:
+            return self.atom(dict(style, bold=True), math)
+        if name in ITALIC_COMMANDS:
+            return self.atom(dict(style, italic=True), False)
+        if name in ("underline", "underbar"):
+            return self.atom(dict(style, underline=True), math)
+        if name in FRAC_COMMANDS:
+            num = self.atom(style, math)
+            den = self.atom(style, math)
+            return self.wrap(num, style) + [("/", dict(style))] + self.wrap(den, style)
+        if name == "sqrt":
+            if self.peek() == "[":
+                end = self.src.find("]", self.i)
+                self.i = len(self.src) if end < 0 else end + 1
+            return [("√", dict(style))] + self.wrap(self.atom(style, math), style)
+        if name in ACCENTS:
+            arg = self.atom(style, math)
+            if arg:
+                text, st = arg[-1]
+                arg[-1] = (text + ACCENTS[name], st)
+            return arg
+        if name in SPACES:
+            return [(SPACES[name], dict(style))]
+        if name in SYMBOLS:
+            sym = SYMBOLS[name]
+            if math and sym in RELATIONS:
+                sym = " " + sym + " "
+            return [(sym, dict(style))]
+        # \mathcal, \mathbb, ... e comandi sconosciuti: resta l'argomento, se c'è
+        return []
+
+    @staticmethod
+    def wrap(runs, style):
+        """Parentheses around a fraction term or root argument longer than one character."""
+        if len("".join(t for t, _ in runs).strip()) <= 1:
+            return runs
+        return [("(", dict(style))] + runs + [(")", dict(style))]
+
+def tex_runs(text, plain=False):
+    """(text, style) runs for a label, adjacent runs with the same style merged."""
+    src = "\\text{" + text + "}" if plain else text
+    merged = []
+    for t, st in _TeX(src).runs():
+        if merged and merged[-1][1] == st:
+            merged[-1] = (merged[-1][0] + t, st)
+        else:
+            merged.append((t, st))
+    if merged:
+        merged[0] = (merged[0][0].lstrip(), merged[0][1])
+        merged[-1] = (merged[-1][0].rstrip(), merged[-1][1])
+    return [(t, st) for t, st in merged if t]
+
+# ---------------------------------------------------------------------------
+# svg
+
+def fmt(value):
+    """Compact number for SVG attributes."""
+    text = f"{value:.2f}".rstrip("0").rstrip(".")
+    return "0" if text in ("-0", "") else text
+
+def attrs(**kw):
+    """SVG attributes (underscores become dashes, None values are dropped)."""
+    out = []
+    for k, v in kw.items():
+        if v is None:
+            continue
+        if isinstance(v, float):
+            v = fmt(v)
+        out.append(f'{k.rstrip("_").replace("_", "-")}="{html.escape(str(v), quote=True)}"')
+    return " ".join(out)
+
+class Frame:
+    """Pixel geometry of the graph: domain -> range as d3.scaleLinear, y pointing up."""
+
+    def __init__(self, box, x_range, y_range):
+        self.left, self.top, self.width, self.height = box
+        (self.xmin, self.xmax), (self.ymin, self.ymax) = x_range, y_range
+
+    def sx(self, x):
+        return self.left + (x - self.xmin) / (self.xmax - self.xmin) * self.width
+
+    def sy(self, y):
+        return self.top + self.height - (y - self.ymin) / (self.ymax - self.ymin) * self.height
+
+    def px(self, xs, ys):
+        # valori enormi (asintoti) tenuti entro qualche schermata, il clip fa il resto
+        limit = 10 * WIDTH
+        return (np.clip(self.sx(xs), -limit, limit), np.clip(self.sy(ys), -limit, limit))
+
+    def on_graph(self, x, y):
+        return (min(self.xmin, self.xmax) <= x <= max(self.xmin, self.xmax)
+                and min(self.ymin, self.ymax) <= y <= max(self.ymin, self.ymax))
+
+def path_data(xs, ys):
+    return "M" + "L".join(f"{fmt(x)},{fmt(y)}" for x, y in zip(xs, ys))
+
+def stroke_dash(d):
+    style = d.get("lineStyle")
+    if style == "dashed":
+        return "10,10"
+    if style == "dotted":
+        return "1,2"
+    return None
+
+# d3-array ticks() e d3-format per le etichette dei tick
+E10, E5, E2 = math.sqrt(50), math.sqrt(10), math.sqrt(2)
+
+def tick_increment(start, stop, count):
+    step = (stop - start) / max(0, count)
+    power = math.floor(math.log10(step))
+    error = step / 10 ** power
+    factor = 10 if error >= E10 else 5 if error >= E5 else 2 if error >= E2 else 1
+    return factor * 10 ** power if power >= 0 else -(10 ** -power) / factor
+
+def d3_ticks(start, stop, count):
+    """Tick values and their step, as d3.scaleLinear().ticks(count)."""
+    if count <= 0 or not (math.isfinite(start) and math.isfinite(stop)) or start == stop:
+        return [], 0
+    reverse = stop < start
+    if reverse:
+        start, stop = stop, start
+    inc = tick_increment(start, stop, count)
+    if inc == 0 or not math.isfinite(inc):
+        return [], 0
+    if inc > 0:
+        r0, r1 = math.ceil(start / inc), math.floor(stop / inc)
+        ticks = [(r0 + i) * inc for i in range(r1 - r0 + 1)]
+        step = inc
+    else:
+        r0, r1 = math.ceil(start * -inc), math.floor(stop * -inc)
+        ticks = [(r0 + i) / -inc for i in range(r1 - r0 + 1)]
+        step = 1 / -inc
+    return (ticks[::-1] if reverse else ticks), step
+
+def tick_format(value, step):
+    precision = max(0, -math.floor(math.log10(abs(step)))) if step else 0
+    text = f"{value:,.{precision}f}"
+    return "0" if float(value) == 0 else text.replace("-", "−")
+
+class Snapshot:
+    """SVG elements of one graph, by kg layer, plus the labels drawn on top."""
+
+    def __init__(self, ev, colors, frame):
+        self.ev = ev
+        self.colors = colors
+        self.frame = frame
+        self.layers = {0: [], 1: [], 2: [], 3: []}
+        self.labels = []
+        self.markers = {}
+        self.omitted = []
+        self.spec_axes = ({}, {})
+
+    # -- helpers
+
+    def color(self, value, default=None):
+        """kg color: a name in model.colors (palette, schema roles) or any CSS color."""
+        if value is None:
+            value = default
+        if value is None:
+            return None
+        s = str(value).strip()
+        for _ in range(3):
+            if s.startswith("colors."):
+                s = s[len("colors."):]
+            if s not in self.colors:
+                break
+            s = self.colors[s]
+        return s.strip("'\"")
+
+    def num(self, src, default=None):
+        return number(self.ev, src, default)
+
+    def point(self, d, key="coordinates", xk="x", yk="y"):
+        """(x, y) of an object as kg's extractCoordinates, None if not evaluable."""
+        if isinstance(d.get(key), list) and len(d[key]) == 2:
+            x, y = d[key]
+        else:
+            x, y = d.get(xk), d.get(yk)
+        x, y = self.num(x), self.num(y)
+        return None if x is None or y is None else (x, y)
+
+    def omit(self, kind, why):
+        self.omitted.append(f"{kind}: {why}")
+
+    def marker(self, color, end=True):
+        key = (color, end)
+        if key not in self.markers:
+            self.markers[key] = f"{'end' if end else 'start'}-arrow-{len(self.markers) + 1}"
+        return self.markers[key]
+
+    # -- objects
+
+    def axis(self, d, orient):
+        f = self.frame
+        if d.get("show") is False or self.num(d.get("show"), 1) == 0:
+            return
+        intercept = self.num(d.get("intercept"), 0)
+        count = self.num(d.get("ticks"), 5)
+        horizontal = orient in ("bottom", "top")
+        lo, hi = (f.xmin, f.xmax) if horizontal else (f.ymin, f.ymax)
+        ticks, step = d3_ticks(lo, hi, count)
+        k = -1 if orient in ("top", "left") else 1
+        out = []
+        if horizontal:
+            y0 = f.sy(intercept)
+            out.append(f'<path {attrs(d=f"M{fmt(f.sx(lo))},{fmt(y0 + 6 * k)}V{fmt(y0)}H{fmt(f.sx(hi))}V{fmt(y0 + 6 * k)}", fill="none", stroke="#000")}/>')
+            for t in ticks:
+                x = f.sx(t)
+                out.append(f'<line {attrs(x1=x, x2=x, y1=y0, y2=y0 + 6 * k, stroke="gray")}/>')
+                out.append(f'<text {attrs(x=x, y=y0 + 9 * k, dy="0.71em" if k > 0 else "0", text_anchor="middle")}>'
+                           f'{html.escape(tick_format(t, step))}</text>')
+        else:
+            x0 = f.sx(intercept)
+            out.append(f'<path {attrs(d=f"M{fmt(x0 + 6 * k)},{fmt(f.sy(lo))}H{fmt(x0)}V{fmt(f.sy(hi))}H{fmt(x0 + 6 * k)}", fill="none", stroke="#000")}/>')
+            for t in ticks:
+                y = f.sy(t)
+                out.append(f'<line {attrs(x1=x0, x2=x0 + 6 * k, y1=y, y2=y, stroke="gray")}/>')
+                out.append(f'<text {attrs(x=x0 + 9 * k, y=y, dy="0.32em", text_anchor="end" if k < 0 else "start")}>'
+                           f'{html.escape(tick_format(t, step))}</text>')
+        self.layers[2].append(f'<g {attrs(font_size=TICK_FONT, font_family="sans-serif", fill="gray")}>' + "".join(out) + "</g>")
+
+        title = d.get("title")
+        if title:
+            if orient == "bottom":
+                self.label({"text": title, "plainText": True, "x": (f.xmin + f.xmax) / 2, "y": f.ymin, "yPixelOffset": -40})
+            elif orient == "left":
+                self.label({"text": title, "plainText": True, "x": f.xmin, "y": (f.ymin + f.ymax) / 2,
+                            "xPixelOffset": -40, "rotate": 90})
+            elif orient == "top":
+                self.label({"text": title, "plainText": True, "x": (f.xmin + f.xmax) / 2, "y": f.ymin, "yPixelOffset": 40})
+            else:
+                self.label({"text": title, "plainText": True, "x": f.xmin, "y": (f.ymin + f.ymax) / 2,
+                            "xPixelOffset": 40, "rotate": 270})
+
+    def label(self, d):
+        if not shown(self.ev, d):
+            return
+        d = dict(d)
+        if isinstance(d.get("coordinates"), list) and len(d["coordinates"]) == 2:
+            d["x"], d["y"] = d.pop("coordinates")
+        # AXIS: sull'asse, come in KGAuthor.Label
+        if d.get("x") == "AXIS":
+            d["x"], d["position"] = self.spec_axes[1].get("intercept", 0), "r"
+        if d.get("y") == "AXIS":
+            d["y"], d["position"] = self.spec_axes[0].get("intercept", 0), "t"
+        pt = self.point(d)
+        text = label_text(self.ev, d.get("text"))
+        if pt is None or not text or not text.strip():
+            if pt is None:
+                self.omit("Label", f"coordinates of {d.get('text')!r}")
+            return
+        if not self.frame.on_graph(*pt):
+            return
+        font_size = self.num(d.get("fontSize"), 12)
+        dx = self.num(d.get("xPixelOffset"), 0)
+        dy = self.num(d.get("yPixelOffset"), 0)
+        align = d.get("align", "center")
+        # scorciatoie di `position` in KGAuthor.Label
+        position = str(d.get("position") or "").lower()
+        if position == "bl":
+            dx, dy, align = 5, font_size, "left"
+        elif position == "tl":
+            dx, dy, align = 5, -(font_size + 2), "left"
+        elif position == "tr":
+            dx, dy, align = -5, -(font_size + 2), "right"
+        elif position == "br":
+            dx, dy, align = -5, font_size, "right"
+        elif position == "t":
+            dy = -(font_size + 5)
+        elif position == "b":
+            dy = font_size + 2
+        elif position == "r":
+            dx, align = -8, "right"
+        elif position == "l":
+            dx, align = 8, "left"
+        x = self.frame.sx(pt[0]) + dx
+        y = self.frame.sy(pt[1]) - dy
+        # il div di kg ha 3px di padding a destra e a sinistra
+        anchor = {"left": "start", "right": "end"}.get(align, "middle")
+        x += {"start": 3, "end": -3}.get(anchor, 0)
+
+        font_px = font_size * PT * KATEX_SCALE
+        bgcolor = d["bgcolor"] if "bgcolor" in d else CLEAR_COLOR
+        halo = None if bgcolor in (None, "none", "transparent") else self.color(bgcolor)
+        rotate = self.num(d.get("rotate"), 0)
+        spans = []
+        rise = 0.0
+        for t, st in tex_runs(text, plain=bool(d.get("plainText"))):
+            size = st["scale"] * st["size"]
+            target = st["dy"] * font_px
+            spans.append("<tspan" + (" " + attrs(
+                dy=target - rise if target != rise else None,
+                font_size=f"{fmt(size * 100)}%" if size != 1 else None,
+                font_style="italic" if st["italic"] else None,
+                font_weight="bold" if st["bold"] else None,
+                fill=self.color(st["color"]) if st["color"] else None,
+                text_decoration="underline" if st["underline"] else None,
+            ) if (target != rise or size != 1 or st["italic"] or st["bold"] or st["color"] or st["underline"]) else "")
+                + ">" + html.escape(t, quote=False) + "</tspan>")
+            rise = target
+        self.labels.append(f'<text {attrs(x=x, y=y, font_size=font_px, fill=self.color(d.get("color"), "black"), text_anchor=anchor, dominant_baseline="central", transform=f"rotate({fmt(-rotate)} {fmt(x)} {fmt(y)})" if rotate else None, stroke=halo, stroke_width=4 if halo else None, stroke_linejoin="round" if halo else None, paint_order="stroke" if halo else None)} xml:space="preserve">'
+                           + "".join(spans) + "</text>")
+
+    def sub_label(self, d, defaults, **extra):
+        """Label of an object: the object's def overridden by def.label, then `defaults`."""
+        label = d["label"] if isinstance(d.get("label"), dict) else {"text": d.get("label")}
+        ld = {k: v for k, v in d.items() if k != "label"}
+        ld.update(label)
+        for k, v in defaults.items():
+            ld.setdefault(k, v)
+        ld.update(extra)
+        self.label(ld)
+
+    def point_obj(self, d):
+        pt = self.point(d)
+        if pt is None:
+            return self.omit("Point", "coordinates")
+        f = self.frame
+        color = d.get("color", d.get("fill", "colors.blue"))
+        x, y = pt
+        if "droplines" in d and isinstance(d["droplines"], dict):
+            drop = {k: v for k, v in d.items() if k not in ("label", "droplines")}
+            width = self.num(drop.get("strokeWidth"), 2)
+            stroke = self.color(drop.get("stroke", color))
+            if "vertical" in d["droplines"]:
+                self.segment_line((x, 0.0), (x, y), stroke, width, "1,2")
+                self.label(dict(drop, x=x, y=self.num(self.spec_axes[0].get("intercept"), 0),
+                                coordinates=None, text=d["droplines"]["vertical"], fontSize=drop.get("fontSize", 10),
+                                position="t"))
+            if "horizontal" in d["droplines"]:
+                self.segment_line((0.0, y), (x, y), stroke, width, "1,2")
+                self.label(dict(drop, x=self.num(self.spec_axes[1].get("intercept"), 0), y=y,
+                                coordinates=None, text=d["droplines"]["horizontal"], fontSize=drop.get("fontSize", 10),
+                                position="r"))
+        if f.on_graph(x, y):
+            self.layers[3].append(f'<circle {attrs(cx=f.sx(x), cy=f.sy(y), r=self.num(d.get("r"), 6), fill=self.color(d.get("fill", color)), fill_opacity=self.num(d.get("opacity"), 1), stroke=self.color(d.get("stroke"), "white"), stroke_width=self.num(d.get("strokeWidth"), 1))}/>')
+        if "label" in d:
+            self.sub_label(d, {"fontSize": 10, "position": "bl", "color": color, "bgcolor": None})
+
+    def points(self, d):
+        for c in d.get("coordinates") or []:
+            self.point_obj(dict(d, coordinates=c))
+
+    def curve_path(self, xs, ys, d, stroke, layer=1):
+        ok = np.isfinite(xs) & np.isfinite(ys)
+        if ok.sum() < 2:
+            return
+        px, py = self.frame.px(xs[ok], ys[ok])
+        self.layers[layer].append(f'<path {attrs(d=path_data(px, py), fill="none", stroke=stroke, stroke_width=self.num(d.get("strokeWidth"), 2), stroke_dasharray=stroke_dash(d))}/>')
+
+    def domain(self, d, ind):
+        f = self.frame
+        lo, hi = (f.xmin, f.xmax) if ind == "x" else (f.ymin, f.ymax)
+        return self.num(d.get("min"), lo), self.num(d.get("max"), hi)
+
+    def curve(self, d):
+        fn = d.get("fn")
+        if fn is None:
+            return self.omit("Curve", "no fn (parametric curves are not supported)")
+        ind = "y" if d.get("ind") == "y" else "x"
+        lo, hi = self.domain(d, ind)
+        t = np.linspace(lo, hi, SAMPLES + 1)
+        v = samples(self.ev, fn, t, ind)
+        if v is None:
+            return self.omit("Curve", f"fn {fn}")
+        stroke = self.color(d.get("stroke", d.get("color")), "colors.blue")
+        xs, ys = (t, v) if ind == "x" else (v, t)
+        self.curve_path(xs, ys, d, stroke)
+        if isinstance(d.get("label"), dict):
+            label = d["label"]
+            key = "x" if "x" in label and ind == "x" else "y" if "y" in label and ind == "y" else None
+            at = self.num(label.get(key)) if key else None
+            if at is not None:
+                other = samples(self.ev, fn, np.array([at]), ind)
+                if other is not None and np.isfinite(other[0]):
+                    c = [at, float(other[0])] if ind == "x" else [float(other[0]), at]
+                    self.sub_label(d, {"fontSize": 12, "color": d.get("color")}, coordinates=c)
+
+    def line(self, d):
+        n = self.num
+        def pair(key):
+            p = d.get(key)
+            if not isinstance(p, list) or len(p) != 2:
+                return None
+            p = (n(p[0]), n(p[1]))
+            return None if None in p else p
+        p, q = pair("point"), pair("point2")
+        slope, y0, inv, x0 = n(d.get("slope")), n(d.get("yIntercept")), n(d.get("invSlope")), n(d.get("xIntercept"))
+        has = lambda k: k in d
+        div = lambda a, b: float(np.divide(a, b)) if None not in (a, b) else None
+        try:
+            if p and q:
+                slope = div(p[1] - q[1], p[0] - q[0])
+                inv = div(p[0] - q[0], p[1] - q[1])
+                y0 = p[1] - slope * p[0] if math.isfinite(slope) else None
+                x0 = p[0] - inv * p[1] if math.isfinite(inv) else None
+            elif has("xIntercept") and has("yIntercept"):
+                slope, inv = -div(y0, x0), -div(x0, y0)
+            elif p and has("yIntercept"):
+                slope, inv = div(p[1] - y0, p[0]), div(p[0], p[1] - y0)
+                x0 = -(y0 * inv)
+            elif has("slope") and has("yIntercept"):
+                inv, x0 = div(1, slope), -div(y0, slope)
+            elif has("invSlope") and has("xIntercept"):
+                slope, y0 = div(1, inv), -div(x0, inv)
+            elif has("invSlope") and has("yIntercept"):
+                slope = div(1, inv)
+            elif has("slope") and p:
+                inv, x0, y0 = div(1, slope), p[0] - div(p[1], slope), p[1] - p[0] * slope
+            elif has("invSlope") and p:
+                slope = div(1, inv)
+                x0, y0 = p[0] - div(p[1], slope), p[1] - p[0] * slope
+            elif has("slope"):
+                inv, x0, y0 = div(1, slope), 0.0, 0.0
+            elif has("yIntercept"):
+                slope, inv = 0.0, math.inf
+            elif has("xIntercept"):
+                slope, inv = math.inf, 0.0
+            elif p:
+                x0, y0, slope, inv = 0.0, 0.0, div(p[1], p[0]), div(p[0], p[1])
+        except TypeError:   # un valore non valutabile (None)
+            slope = None
+        vertical = inv == 0
+        if (vertical and x0 is None) or (not vertical and (slope is None or y0 is None)):
+            return self.omit("Line", "geometry")
+        ind = "y" if vertical else "x"
+        lo, hi = self.domain(d, ind)
+        t = np.array([lo, hi])
+        stroke = self.color(d.get("stroke", d.get("color")), "colors.orange")
+        if vertical:
+            self.curve_path(np.full(2, x0), t, d, stroke)
+        else:
+            self.curve_path(t, y0 + slope * t, d, stroke)
+        if isinstance(d.get("label"), dict):
+            label = d["label"]
+            c = None
+            if "x" in label and not vertical and n(label["x"]) is not None:
+                c = [n(label["x"]), y0 + slope * n(label["x"])]
+            elif "y" in label and x0 is not None and inv is not None and math.isfinite(inv) and n(label["y"]) is not None:
+                c = [x0 + inv * n(label["y"]), n(label["y"])]
+            if c is not None:
+                self.sub_label(d, {"fontSize": 12, "color": d.get("color", "colors.orange")}, coordinates=c)
+
+    def area(self, d):
+        fn1 = d.get("fn1", d.get("fn"))
+        if fn1 is None:
+            return self.omit("Area", "no fn")
+        f = self.frame
+        ind = "y" if d.get("ind") == "y" else "x"
+        lo, hi = self.domain(d, ind)
+        t = np.linspace(lo, hi, SAMPLES + 1)
+        v1 = samples(self.ev, fn1, t, ind)
+        if "fn2" in d:
+            v2 = samples(self.ev, d["fn2"], t, ind)
+        else:
+            edge = (f.ymax if d.get("above") else f.ymin) if ind == "x" else (f.xmax if d.get("above") else f.xmin)
+            v2 = np.full_like(t, edge)
+        if v1 is None or v2 is None:
+            return self.omit("Area", f"fn {fn1}")
+        ok = np.isfinite(v1) & np.isfinite(v2)
+        if ok.sum() < 2:
+            return
+        t, v1, v2 = t[ok], v1[ok], v2[ok]
+        xs, ys = (np.concatenate([t, t[::-1]]), np.concatenate([v1, v2[::-1]]))
+        if ind == "y":
+            xs, ys = ys, xs
+        px, py = f.px(xs, ys)
+        fill = self.color(d.get("fill", d.get("color")), "colors.blue")
+        self.layers[0].append(f'<path {attrs(d=path_data(px, py) + "Z", fill=fill, fill_opacity=self.num(d.get("opacity"), 0.2), stroke="none")}/>')
+
+    def rectangle(self, d):
+        a, b = self.point(d, "a", "x1", "y1"), self.point(d, "b", "x2", "y2")
+        if a is None or b is None:
+            return self.omit("Rectangle", "corners")
+        f = self.frame
+        x1, y1, x2, y2 = f.sx(a[0]), f.sy(a[1]), f.sx(b[0]), f.sy(b[1])
+        color = d.get("color", d.get("fill"))
+        self.layers[0].append(f'<rect {attrs(x=min(x1, x2), y=min(y1, y2), width=abs(x2 - x1), height=abs(y2 - y1), fill=self.color(d.get("fill", color), "colors.blue"), fill_opacity=self.num(d.get("opacity"), 0.2), stroke=self.color(d.get("stroke"), "none"), stroke_width=self.num(d.get("strokeWidth"), 1))}/>')
+        if "label" in d:
+            self.sub_label(d, {"fontSize": 10, "color": color, "bgcolor": None},
+                           coordinates=[(a[0] + b[0]) / 2, (a[1] + b[1]) / 2])
+
+    def ellipse(self, d):
+        key = "c" if "c" in d else "center" if "center" in d else "coordinates"
+        c = self.point(d, key)
+        if c is None:
+            return self.omit("Ellipse", "center")
+        rx = self.num(d.get("rx", d.get("r", d.get("radius"))), 1)
+        ry = self.num(d.get("ry", d.get("r", d.get("radius"))), rx)
+        f = self.frame
+        color = d.get("color", "colors.blue")
+        self.layers[0].append(f'<ellipse {attrs(cx=f.sx(c[0]), cy=f.sy(c[1]), rx=abs(f.sx(rx) - f.sx(0)), ry=abs(f.sy(ry) - f.sy(0)), fill=self.color(d.get("fill", color)), fill_opacity=self.num(d.get("opacity"), 0.2), stroke=self.color(d.get("stroke", color)), stroke_width=self.num(d.get("strokeWidth"), 1))}/>')
+        if "label" in d:
+            self.sub_label(d, {"fontSize": 10, "color": color, "bgcolor": None}, coordinates=list(c))
+
+    def segment_line(self, a, b, stroke, width, dash=None, start=False, end=False):
+        f = self.frame
+        self.layers[1].append(f'<line {attrs(x1=f.sx(a[0]), y1=f.sy(a[1]), x2=f.sx(b[0]), y2=f.sy(b[1]), stroke=stroke, stroke_width=width, stroke_dasharray=dash, marker_start=f"url(#{self.marker(stroke, False)})" if start else None, marker_end=f"url(#{self.marker(stroke)})" if end else None)}/>')
+
+    def segment(self, d, arrow=False):
+        kind = "Arrow" if arrow else "Segment"
+        a = self.point(d, "begin" if arrow else "a", "x1", "y1")
+        b = self.point(d, "end" if arrow else "b", "x2", "y2")
+        if a is None or b is None:
+            return self.omit(kind, "end points")
+        trim = self.num(d.get("trim"))
+        if trim:
+            a, b = ((trim * b[0] + (1 - trim) * a[0], trim * b[1] + (1 - trim) * a[1]),
+                    (trim * a[0] + (1 - trim) * b[0], trim * a[1] + (1 - trim) * b[1]))
+        color = d.get("stroke", d.get("color"))
+        stroke = self.color(color, "colors.blue")
+        start = bool(d.get("startArrow") or (arrow and d.get("double")))
+        end = bool(d.get("endArrow") or arrow)
+        self.segment_line(a, b, stroke, self.num(d.get("strokeWidth"), 2), stroke_dash(d), start, end)
+        if d.get("label") is not None:
+            location = self.num((d["label"] if isinstance(d["label"], dict) else {}).get("location"), 0.5)
+            c = [location * a[0] + (1 - location) * b[0], location * a[1] + (1 - location) * b[1]]
+            self.sub_label(d, {"fontSize": 12, "color": color}, coordinates=c)
+
+    def draw(self, obj):
+        kind, d = next(iter(obj.items()))
+        if not isinstance(d, dict):
+            return self.omit(kind, "definition")
+        if not shown(self.ev, d):
+            return
+        handler = {
+            "Point": self.point_obj, "Points": self.points, "Label": self.label,
+            "Curve": self.curve, "Line": self.line, "Area": self.area,
+            "Rectangle": self.rectangle, "Ellipse": self.ellipse, "Circle": self.ellipse,
+            "Segment": self.segment, "Arrow": lambda d: self.segment(d, arrow=True),
+        }.get(kind)
+        if handler is None:
+            return self.omit(kind, "not supported")
+        handler(dict(d))
+
+    def svg(self, width, height):
+        f = self.frame
+        defs = [f'<clipPath id="graph-clip"><rect {attrs(x=f.left, y=f.top, width=f.width, height=f.height)}/></clipPath>']
+        for (color, end), name in self.markers.items():
+            # frecce di KGAuthor.EndArrow / StartArrow
+            mask, arrow, ref_x = (("M3,1 L3,12 L12,7 L12,5 L3,1", "M2,2 L2,11 L10,6 L2,2", 11) if end
+                                  else ("M10,1 L10,12 L0,7 L0,5 L10,1", "M11,2 L11,11 L2,6 L11,2", 2))
+            defs.append(f'<marker {attrs(id=name, refX=ref_x, refY=6, markerWidth=13, markerHeight=13, orient="auto", markerUnits="userSpaceOnUse")}>'
+                        f'<path {attrs(d=mask, fill="white")}/><path {attrs(d=arrow, fill=color)}/></marker>')
+        out = [f'<svg xmlns="http://www.w3.org/2000/svg" {attrs(viewBox=f"0 0 {fmt(width)} {fmt(height)}", width=width, height=height, font_family=FONT_FAMILY)}>',
+               "<defs>" + "".join(defs) + "</defs>"]
+        for layer in (0, 1):
+            if self.layers[layer]:
+                out.append('<g clip-path="url(#graph-clip)">\n' + "\n".join(self.layers[layer]) + "\n</g>")
+        for layer in (2, 3):
+            if self.layers[layer]:
+                out.append("<g>\n" + "\n".join(self.layers[layer]) + "\n</g>")
+        if self.labels:
+            out.append("<g>\n" + "\n".join(self.labels) + "\n</g>")
+        out.append("</svg>")
+        return "\n".join(out) + "\n"
+
+# ---------------------------------------------------------------------------
+# specs
+
+def single_graph(spec):
+    """(layout name, graph def) for the supported layouts, None otherwise."""
+    layout = spec.get("layout")
+    if not isinstance(layout, dict) or len(layout) != 1:
+        return None
+    name, body = next(iter(layout.items()))
+    if name not in LAYOUTS or not isinstance(body, dict) or not isinstance(body.get("graph"), dict):
+        return None
+    return name, body["graph"]
+
+def spec_colors(spec):
+    colors = dict(PALETTE)
+    if spec.get("schema") == "EconSchema":
+        colors.update(ECON_COLORS)
+    if isinstance(spec.get("colors"), dict):
+        colors.update({k: str(v) for k, v in spec["colors"].items()})
+    return colors
+
+def render_spec(spec):
+    """SVG text and omitted objects of a spec, None if its layout is not supported."""
+    found = single_graph(spec)
+    if found is None:
+        return None
+    name, graph = found
+    _, _, errors = compile_calcs(spec)
+    if errors:
+        raise SpecError(errors[0] + (f" (+{len(errors) - 1} more)" if len(errors) > 1 else ""))
+
+    with np.errstate(all="ignore"):
+        ev = spec_evaluator(spec)
+        x_axis = dict(graph.get("xAxis") or {})
+        y_axis = dict(graph.get("yAxis") or {})
+        x_range = (number(ev, x_axis.get("min"), 0.0), number(ev, x_axis.get("max"), 10.0))
+        y_range = (number(ev, y_axis.get("min"), 0.0), number(ev, y_axis.get("max"), 10.0))
+        if x_range[0] == x_range[1] or y_range[0] == y_range[1]:
+            raise SpecError("empty axis range")
+
+        aspect = number(ev, spec.get("aspectRatio"), DEFAULT_ASPECT) or DEFAULT_ASPECT
+        width, height = WIDTH, WIDTH / aspect
+        pos = LAYOUTS[name]
+        box = (pos["x"] * width, pos["y"] * height, pos["width"] * width, pos["height"] * height)
+        snap = Snapshot(ev, spec_colors(spec), Frame(box, x_range, y_range))
+        snap.spec_axes = (x_axis, y_axis)
+
+        # kg: livello 0 aree, 1 curve e segmenti, 2 assi, 3 punti; le etichette (div) sopra
+        snap.axis(y_axis, y_axis.get("orient", "left"))
+        snap.axis(x_axis, x_axis.get("orient", "bottom"))
+        for obj in graph.get("objects") or []:
+            if isinstance(obj, dict) and len(obj) == 1:
+                snap.draw(obj)
+            elif isinstance(obj, dict) and "type" in obj:
+                snap.draw({obj["type"]: obj.get("def")})
+    return snap.svg(width, height), snap.omitted
+
+def render_file(site_root: Path, rel: Path, check=False):
+    """Render one spec. Returns (status, omitted) with status 'skip', 'ok', 'written' or 'stale'."""
+    full = site_root / rel
+    result = render_spec(load_compiled(full))
+    if result is None:
+        return "skip", []
+    text, omitted = result
+    out = full.with_suffix(".svg")
+    if out.exists() and out.read_text(encoding="utf-8") == text:
+        return "ok", omitted
+    if check:
+        return "stale", omitted
+    out.write_text(text, encoding="utf-8")
+    return "written", omitted
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--site-root", default=".", help="root del sito (default .)")
+    ap.add_argument("--check", action="store_true",
+                    help="do not write: fail if a snapshot is missing or out of date")
+    ap.add_argument("--verbose", action="store_true")
+    ap.add_argument("files", nargs="*", help="spec files (default: every <lang>/graphs/**/*.yml)")
+    args = ap.parse_args()
+
+    site_root = Path(args.site_root).resolve()
+    if args.files:
+        rels = [Path(f).resolve().relative_to(site_root) for f in args.files]
+    else:
+        rels = graph_specs(site_root)
+
+    failed = stale = written = skipped = 0
+    for rel in rels:
+        try:
+            status, omitted = render_file(site_root, rel, args.check)
+        except SpecError as e:
+            failed += 1
+            print(f"❌ {rel}: {e}")
+            continue
+        if status == "skip":
+            skipped += 1
+            continue
+        if status == "stale":
+            stale += 1
+            print(f"⚠️  {rel}: snapshot missing or out of date")
+        elif status == "written":
+            written += 1
+            if args.verbose:
+                print(f"[WRITE] {rel.with_suffix('.svg')}")
+        if args.verbose and omitted:
+            print(f"[INFO] {rel}: {len(omitted)} objects omitted")
+            for what in omitted:
+                print(f"    {what}")
+
+    rendered = len(rels) - skipped - failed
+    print(f"Specs: {len(rels)}  snapshots: {rendered}  written: {written}  other layouts: {skipped}  errors: {failed}"
+          + (f"  stale: {stale}" if args.check else ""))
+    return 1 if failed or stale else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,407 @@
+#!/usr/bin/env python3
+"""
+sweep_graph_calcs.py
+
+Valuta i `calcs` di ogni specifica dei grafici (<lang>/graphs/**/gr_*.yml) su tutta la
+griglia delle posizioni degli slider e segnala le posizioni che producono:
+- divisione per zero
+- NaN (anche risultati complessi per mathjs, es. sqrt o log di negativi)
+- infinito
+- punti fuori dagli assi (Point, Points, Segment, Label, Rectangle confrontati con
+  xAxis/yAxis min e max del grafico che li contiene, solo quando sono visibili)
+
+La griglia usa min, max e round di ogni param con un intervallo (i param con solo
+`value` restano fissi). Ogni param è un array NumPy su un proprio asse, quindi le
+espressioni vengono valutate una volta sola per tutte le combinazioni (broadcasting) e
+ogni calc occupa solo gli assi dei param da cui dipende. Se la griglia supera
+--max-points, ogni asse viene campionato in modo uniforme (estremi inclusi).
+
+Le specifiche sono lette dal .json di compile_graph_calcs.py quando è aggiornato
+(molto più veloce dello YAML), altrimenti dallo YAML.
+
+Un problema è segnalato solo dove nasce: un calc che è NaN perché lo è già un suo
+input non viene ripetuto. Le espressioni che il sweep non sa valutare (calcs generati
+a runtime dal layout, sintassi non mathjs) vengono saltate.
+
+Exit codes:
+  0 -> nessun problema
+  1 -> almeno una specifica con problemi (o non compilabile)
+
+Usage:
+  python3 scripts/sweep_graph_calcs.py [--site-root .] [--max-points N] [--no-axes]
+                                       [--jobs N] [--verbose] [files...]
+"""
+from pathlib import Path
+import argparse
+import math
+import sys
+
+try:
+    import numpy as np
+except ImportError:
+    sys.exit("[ERROR] sweep_graph_calcs.py richiede numpy (pip install numpy)")
+
+from corpus_index import parallel_map
+from compile_graph_calcs import compile_calcs, calc_leaves, load_compiled
+from kg_spec import SpecError, graph_specs, parse_expr
+
+DEFAULT_MAX_POINTS = 100_000
+
+# mathjs: config.epsilon e nearlyEqual
+EPSILON = 1e-12
+DBL_EPSILON = 2.220446049250313e-16
+
+# layout objects whose position is checked against the axes: type -> keys holding [x, y]
+POSITIONED = {
+    "Point": ("coordinates",),
+    "Label": ("coordinates",),
+    "Segment": ("a", "b"),
+    "Rectangle": ("a", "b"),
+}
+
+class Unknown(Exception):
+    """An expression the sweep cannot evaluate (runtime calcs, unsupported syntax)."""
+
+# ---------------------------------------------------------------------------
+# grid
+
+def param_axes(spec, max_points=DEFAULT_MAX_POINTS):
+    """
+    Grid of the slider params: ({name: array}, [(name, values)], sampled).
+    Each swept param lies on its own axis; fixed params are plain floats.
+    """
+    values = {}
+    swept = []
+    for p in spec.get("params") or []:
+        if not isinstance(p, dict) or "name" not in p:
+            continue
+        value = p.get("value")
+        if isinstance(value, bool):
+            value = float(value)
+        try:
+            value = float(value)
+        except (TypeError, ValueError):
+            continue
+        if "min" in p and "max" in p:
+            lo, hi = float(p["min"]), float(p["max"])
+            step = float(p.get("round") or 1)
+            n = int(math.floor((hi - lo) / step + 1e-9)) + 1 if hi >= lo and step > 0 else 1
+            swept.append((p["name"], lo + step * np.arange(max(n, 1))))
+        else:
+            values[p["name"]] = value
+
+    # griglia troppo grande: accorcia l'asse più lungo finché non rientra nel limite
+    sizes = [len(v) for _, v in swept]
+    while math.prod(sizes) > max_points and max(sizes) > 2:
+        i = sizes.index(max(sizes))
+        sizes[i] = max(2, min(sizes[i] - 1, int(sizes[i] * 0.9)))
+    sampled = sizes != [len(v) for _, v in swept]
+    swept = [(name, v[np.unique(np.linspace(0, len(v) - 1, n).round().astype(int))])
+             for (name, v), n in zip(swept, sizes)]
+
+    ndim = len(swept)
+    for axis, (name, v) in enumerate(swept):
+        shape = [1] * ndim
+        shape[axis] = len(v)
+        values[name] = v.reshape(shape)
+    return values, swept, sampled
+
+# ---------------------------------------------------------------------------
+# evaluation
+
+def nearly_equal(a, b):
+    d = np.abs(a - b)
+    return (a == b) | (d < DBL_EPSILON) | (d <= np.maximum(np.abs(a), np.abs(b)) * EPSILON)
+
+def _round(x, n=0.0):
+    return np.round(x, int(np.max(n)))
+
+FUNCTIONS = {
+    "abs": np.abs, "sqrt": np.sqrt, "cbrt": np.cbrt, "exp": np.exp, "log10": np.log10,
+    "log2": np.log2, "floor": np.floor, "ceil": np.ceil, "sign": np.sign,
+    "sin": np.sin, "cos": np.cos, "tan": np.tan, "asin": np.arcsin, "acos": np.arccos,
+    "atan": np.arctan, "atan2": np.arctan2, "pow": np.power, "round": _round,
+    "log": lambda x, base=None: np.log(x) if base is None else np.log(x) / np.log(base),
+    "min": lambda *a: np.minimum.reduce(np.broadcast_arrays(*a)),
+    "max": lambda *a: np.maximum.reduce(np.broadcast_arrays(*a)),
+}
+METHODS = {"toFixed": _round, "toPrecision": lambda x, n: x}
+CONSTANTS = {"pi": math.pi, "e": math.e, "true": 1.0, "false": 0.0, "Infinity": math.inf, "NaN": math.nan}
+
+class Evaluator:
+    """Element-wise evaluation of expression trees over the parameter grid."""
+
+    def __init__(self, params, calcs):
+        self.params = params
+        self.calcs = calcs      # name -> array or nested dict of arrays (None: unknown)
+        self.divzero = False    # where the last expression divided by zero
+
+    def __call__(self, src):
+        self.divzero = False
+        return np.asarray(self.eval(parse_expr(src)), dtype=float)
+
+    def ref(self, ns, name, path):
+        value = (self.params if ns == "params" else self.calcs).get(name)
+        for key in path:
+            value = value.get(key) if isinstance(value, dict) else None
+        if value is None or isinstance(value, dict):
+            raise Unknown(f"{ns}.{name}")
+        return value
+
+    def eval(self, node):
+        kind = node[0]
+        if kind == "num":
+            return node[1]
+        if kind == "str":
+            try:
+                return float(node[1])
+            except ValueError:
+                raise Unknown(node[1]) from None
+        if kind == "name":
+            if node[1] not in CONSTANTS:
+                raise Unknown(node[1])
+            return CONSTANTS[node[1]]
+        if kind == "ref":
+            return self.ref(*node[1:])
+        if kind == "call":
+            if node[1] not in FUNCTIONS:
+                raise Unknown(node[1])
+            return FUNCTIONS[node[1]](*[self.eval(a) for a in node[2]])
+        if kind == "method":
+            if node[2] not in METHODS:
+                raise Unknown(node[2])
+            return METHODS[node[2]](self.eval(node[1]), *[self.eval(a) for a in node[3]])
+        if kind == "unary":
+            a = self.eval(node[2])
+            if node[1] == "-":
+                return -a
+            if node[1] == "not":
+                return np.logical_not(a).astype(float)
+            return a
+        if kind == "cond":
+            # as in mathjs only the taken branch counts: a division by zero in the
+            # other one is not a problem
+            c = self.eval(node[1])
+            divzero = self.divzero
+            self.divzero = False
+            a = self.eval(node[2])
+            divzero_a = self.divzero
+            self.divzero = False
+            b = self.eval(node[3])
+            taken = np.asarray(c) != 0
+            self.divzero = divzero | np.where(taken, divzero_a, self.divzero)
+            return np.where(taken, a, b)
+        op, a, b = node[1], self.eval(node[2]), self.eval(node[3])
+        if op == "+":
+            return a + b
+        if op == "-":
+            return a - b
+        if op == "*":
+            return a * b
+        if op == "/":
+            self.divzero = self.divzero | (np.asarray(b) == 0)
+            return np.true_divide(a, b)
+        if op == "%":
+            # mathjs: mod(x, 0) = x
+            return np.where(np.asarray(b) == 0, a, np.mod(a, np.where(np.asarray(b) == 0, 1, b)))
+        if op == "^":
+            return np.power(np.asarray(a, dtype=float), b)
+        if op == "==":
+            return nearly_equal(a, b).astype(float)
+        if op == "!=":
+            return (~nearly_equal(a, b)).astype(float)
+        if op == "<":
+            return ((a < b) & ~nearly_equal(a, b)).astype(float)
+        if op == ">":
+            return ((a > b) & ~nearly_equal(a, b)).astype(float)
+        if op == "<=":
+            return ((a < b) | nearly_equal(a, b)).astype(float)
+        if op == ">=":
+            return ((a > b) | nearly_equal(a, b)).astype(float)
+        if op == "and":
+            return ((np.asarray(a) != 0) & (np.asarray(b) != 0)).astype(float)
+        if op == "or":
+            return ((np.asarray(a) != 0) | (np.asarray(b) != 0)).astype(float)
+        if op == "xor":
+            return ((np.asarray(a) != 0) ^ (np.asarray(b) != 0)).astype(float)
+        raise Unknown(op)
+
+# ---------------------------------------------------------------------------
+# checks
+
+def position_text(index, shape, swept):
+    """'w2=10, p=0.5' for the flat index of a bad grid point."""
+    coords = np.unravel_index(index, shape)
+    return ", ".join(f"{name}={values[i]:g}" for (name, values), i in zip(swept, coords))
+
+class Findings:
+    """Masks of the bad grid positions, one per (where, problem)."""
+
+    def __init__(self, swept):
+        self.swept = swept
+        self.shape = tuple(len(v) for _, v in swept)
+        self.total = math.prod(self.shape)
+        self.masks = {}
+
+    def add(self, where, problem, mask):
+        mask = np.broadcast_to(np.asarray(mask, dtype=bool), self.shape)
+        if mask.any():
+            key = (where, problem)
+            self.masks[key] = self.masks[key] | mask if key in self.masks else mask
+
+    def items(self):
+        """[(where, problem, count, first bad position)]"""
+        return [(where, problem, int(mask.sum()),
+                 position_text(int(np.flatnonzero(mask)[0]), self.shape, self.swept))
+                for (where, problem), mask in self.masks.items()]
+
+def sweep_calcs(spec, ev, findings):
+    """Evaluate the calcs in dependency order, recording where problems originate."""
+    order, deps, _ = compile_calcs(spec)
+    calcs = spec.get("calcs") or {}
+    nonfinite = {}
+    for name in order:
+        inherited = False
+        for dep in deps[name]:
+            inherited = inherited | nonfinite.get(dep, False)
+        result = {}
+        name_nonfinite = False
+        for path, src in calc_leaves(calcs[name]):
+            where = ".".join(("calcs", name) + path)
+            try:
+                value = ev(src)
+            except Unknown:
+                value = None
+            if value is not None:
+                divzero = ev.divzero & ~inherited
+                findings.add(where, "division by zero", divzero)
+                findings.add(where, "NaN", np.isnan(value) & ~inherited & ~divzero)
+                findings.add(where, "infinity", np.isinf(value) & ~inherited & ~divzero)
+                name_nonfinite = name_nonfinite | ~np.isfinite(value)
+            if path:
+                node = result
+                for key in path[:-1]:
+                    node = node.setdefault(key, {})
+                node[path[-1]] = value
+            else:
+                result = value
+        ev.calcs[name] = result
+        nonfinite[name] = name_nonfinite
+
+def graphs(layout):
+    """Every graph in the layout (dicts with xAxis, yAxis and objects)."""
+    if isinstance(layout, dict):
+        if "xAxis" in layout and "yAxis" in layout and "objects" in layout:
+            yield layout
+        for v in layout.values():
+            yield from graphs(v)
+    elif isinstance(layout, list):
+        for v in layout:
+            yield from graphs(v)
+
+def axis_range(ev, axis):
+    """(min, max) of an axis as evaluated values; kg defaults 0 and 10."""
+    axis = axis or {}
+    out = []
+    for key, default in (("min", 0), ("max", 10)):
+        value = axis.get(key, default)
+        out.append(ev(value))
+    return out
+
+def sweep_axes(spec, ev, findings):
+    for graph in graphs(spec.get("layout")):
+        try:
+            x_range = axis_range(ev, graph.get("xAxis"))
+            y_range = axis_range(ev, graph.get("yAxis"))
+        except (Unknown, SpecError, TypeError, ValueError):
+            continue
+        for obj in graph.get("objects") or []:
+            if not isinstance(obj, dict):
+                continue
+            for kind, d in obj.items():
+                if kind not in POSITIONED and kind != "Points" or not isinstance(d, dict):
+                    continue
+                try:
+                    shown = ev(d["show"]) != 0 if "show" in d else True
+                except (Unknown, SpecError):
+                    shown = True
+                if kind == "Points":
+                    points = d.get("coordinates") or []
+                else:
+                    points = [d.get(k) for k in POSITIONED[kind]]
+                for pt in points:
+                    if not isinstance(pt, list) or len(pt) != 2:
+                        continue
+                    for coord, (lo, hi), axis in zip(pt, (x_range, y_range), "xy"):
+                        try:
+                            v = ev(coord)
+                        except (Unknown, SpecError):
+                            continue
+                        tol = 1e-9 * np.abs(hi - lo)
+                        out = np.isfinite(v) & ((v < lo - tol) | (v > hi + tol)) & shown
+                        findings.add(f"{kind} {axis}={coord}", f"outside {axis}Axis", out)
+
+def sweep_spec(site_root: Path, rel: Path, max_points=DEFAULT_MAX_POINTS, axes=True):
+    """Sweep one spec -> (grid size, sampled, findings list) or raise SpecError."""
+    spec = load_compiled(site_root / rel)
+    _, _, errors = compile_calcs(spec)
+    if errors:
+        raise SpecError(errors[0] + (f" (+{len(errors) - 1} more)" if len(errors) > 1 else ""))
+    params, swept, sampled = param_axes(spec, max_points)
+    findings = Findings(swept)
+    ev = Evaluator(params, {})
+    with np.errstate(all="ignore"):
+        sweep_calcs(spec, ev, findings)
+        if axes:
+            sweep_axes(spec, ev, findings)
+    return findings.total, sampled, findings.items()
+
+def _sweep_file(item):
+    """Worker: (site_root, rel, max_points, axes) -> (grid size, sampled, findings, error)."""
+    site_root, rel, max_points, axes = item
+    try:
+        return sweep_spec(site_root, rel, max_points, axes) + (None,)
+    except SpecError as e:
+        return 0, False, [], str(e)
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--site-root", default=".", help="root del sito (default .)")
+    ap.add_argument("--max-points", type=int, default=DEFAULT_MAX_POINTS,
+                    help=f"largest grid per spec before sampling the axes (default {DEFAULT_MAX_POINTS})")
+    ap.add_argument("--no-axes", action="store_true", help="do not check layout objects against the axes")
+    ap.add_argument("--jobs", type=int, default=1, help="worker processes (0 = one per CPU, default 1)")
+    ap.add_argument("--verbose", action="store_true")
+    ap.add_argument("files", nargs="*", help="spec files (default: every <lang>/graphs/**/*.yml)")
+    args = ap.parse_args()
+
+    site_root = Path(args.site_root).resolve()
+    if args.files:
+        rels = [Path(f).resolve().relative_to(site_root) for f in args.files]
+    else:
+        rels = graph_specs(site_root)
+
+    items = [(site_root, rel, args.max_points, not args.no_axes) for rel in rels]
+    results = parallel_map(_sweep_file, items, args.jobs)
+
+    failed = 0
+    points = 0
+    for rel, (total, sampled, found, error) in zip(rels, results):
+        points += total
+        if error:
+            failed += 1
+            print(f"❌ {rel}: {error}")
+            continue
+        if found:
+            failed += 1
+            print(f"⚠️  {rel} ({total} positions{', sampled' if sampled else ''})")
+            for where, problem, count, example in found:
+                print(f"    {where}: {problem} at {count}/{total} positions, e.g. {example or 'default values'}")
+        elif args.verbose:
+            print(f"✅ {rel} ({total} positions{', sampled' if sampled else ''})")
+
+    print(f"Specs: {len(rels)}  positions: {points}  with problems: {failed}")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
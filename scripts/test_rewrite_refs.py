@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+"""
+test_rewrite_refs.py
+
+Regressione per la riscrittura dei riferimenti di number_figures_from_toc.py (PASS 2
+--update-refs): lo scanner unico rewrite_refs / resolve_anchor_href deve produrre
+esattamente lo stesso testo del vecchio ciclo, che sostituiva prima i token [[FIG:...]] e
+poi, per ogni label, compilava un anchor_re e riscansionava il file.
+
+Due oracoli:
+- baseline_rewrite_refs: il codice di number_figures_from_toc.py prima dello scanner
+  unico, copiato senza modifiche; conosce solo le figure, quindi il confronto usa le sole
+  figure di id_map
+- old_rewrite_refs: lo stesso algoritmo esteso a tutti i tipi di label (label_kinds.py);
+  un token di tipo diverso dalla label ([[EQ:id]] per una figura) resta invariato, come
+  nel codice originale, che sostituiva solo [[FIG:...]]
+
+Il confronto è fatto sui file reali di it/ ed en/ e su copie alterate degli stessi, con
+token [[FIG:...]], label e numeri non aggiornati, href relativi, href verso l'altra lingua,
+href con più di un '#', id sconosciuti o in maiuscolo, token dentro il testo o gli
+attributi di un anchor o dopo un <a href="#..."> non chiuso.
+
+Usage:
+  python3 -m pytest -q scripts/test_rewrite_refs.py
+  python3 scripts/test_rewrite_refs.py
+"""
+from pathlib import Path
+import random
+import re
+import sys
+import unittest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import number_figures_from_toc as nf
+from corpus_index import detect_lang_from_path, refresh_index
+from label_kinds import KINDS_BY_NAME, TOKEN_KIND_RE, kind_of_token
+
+SITE_ROOT = Path(__file__).resolve().parent.parent
+
+REF_RE = re.compile(r'\[\[\s*FIG\s*:\s*([^\]\s]+)\s*\]\]', re.IGNORECASE)
+
+def baseline_rewrite_refs(new_text, lang, id_map):
+    """
+    The PASS 2 --update-refs block of number_figures_from_toc.py before the single scanner,
+    verbatim. id_map: {lang: {fig_id: (label, page_url)}}, figures only (see figures_only).
+    """
+    # 1) prima sostituisci i token [[FIG:id]]
+    def repl_ref_token(m):
+        fig_id = m.group(1)
+        entry = id_map.get(lang, {}).get(fig_id)
+        if entry:
+            label, page_url = entry
+            number = re.sub(r'^(FIGURA|FIGURE)\s+', '', label).strip()
+            word = "Figura" if lang == "it" else "Figure"
+            href = f'{{{{ site.baseurl }}}}/{page_url}#{fig_id}'
+            return f'<a href="{href}">{word} {number}</a>'
+        else:
+            # fallback: try the other language map
+            other = "en" if lang == "it" else "it"
+            entry2 = id_map.get(other, {}).get(fig_id)
+            if entry2:
+                label2, page_url2 = entry2
+                number2 = re.sub(r'^(FIGURA|FIGURE)\s+', '', label2).strip()
+                word2 = "Figura" if other == "it" else "Figure"
+                href2 = f'{{{{ site.baseurl }}}}/{page_url2}#{fig_id}'
+                return f'<a href="{href2}">{word2} {number2}</a>'
+            return m.group(0)
+
+    new_text = REF_RE.sub(repl_ref_token, new_text)
+
+    # 2) poi sostituisci anche eventuali anchor HTML già esistenti che puntano a #fig_id
+    #    (es. <a href="/it/I/1/1#gr_figB">Figura 1.2</a> o <a href="#gr_figB">Figura 1.2</a>)
+    #    per ogni fig_id noto nella lingua corrente, sostituisci l'intero <a ...>...</a>
+    #    con la versione aggiornata.
+    for fig_id, (label, page_url) in id_map.get(lang, {}).items():
+        number = re.sub(r'^(FIGURA|FIGURE)\s+', '', label).strip()
+        word = "Figura" if lang == "it" else "Figure"
+        href_full = f'{{{{ site.baseurl }}}}/{page_url}#{fig_id}'
+        # regex per trovare <a ... href="(maybe site.baseurl...)?#fig_id" ...>...</a>
+        # - non-greedy match for attributes and inner text
+        anchor_re = re.compile(
+            rf'<a\b([^>]*)\bhref=(["\'])(?:[^"\']*?){re.escape("#"+fig_id)}\2([^>]*)>.*?</a>',
+            flags=re.IGNORECASE | re.DOTALL
+        )
+        # replacement: a consistent anchor pointing to the canonical page_url
+        replacement = f'<a href="{href_full}">{word} {number}</a>'
+        new_text, nrep = anchor_re.subn(replacement, new_text)
+        # (nrep used only implicitly; continue for all fig_ids)
+    return new_text
+
+def figures_only(id_map):
+    """id_map restricted to figures, with the baseline's (label, page_url) entries."""
+    return {lg: {label_id: (label, page_url) for label_id, (label, page_url, kind) in ids.items()
+                 if kind == "figure"}
+            for lg, ids in id_map.items()}
+
+def old_rewrite_refs(text, lang, id_map):
+    """The PASS 2 reference rewrite before the single scanner, extended to every label kind."""
+    def same_kind(m, lg, label_id):
+        return kind_of_token(m.group("tok")).name == id_map[lg][label_id][2]
+
+    def canonical(lg, label_id):
+        label, page_url, kind = id_map[lg][label_id]
+        number = label.split(None, 1)[1]
+        href = f'{{{{ site.baseurl }}}}/{page_url}#{label_id}'
+        return f'<a href="{href}">{KINDS_BY_NAME[kind].ref_text(lg, number)}</a>'
+
+    # 1) prima sostituisci i token [[FIG:id]], con fallback sull'altra lingua
+    def repl_ref_token(m):
+        label_id = m.group("id")
+        for lg in (lang, "en" if lang == "it" else "it"):
+            if label_id in id_map.get(lg, {}):
+                return canonical(lg, label_id) if same_kind(m, lg, label_id) else m.group(0)
+        return m.group(0)
+
+    new_text = TOKEN_KIND_RE.sub(repl_ref_token, text)
+
+    # 2) poi, per ogni label della lingua, un anchor_re che riscrive gli <a href="...#id">
+    for label_id in id_map.get(lang, {}):
+        anchor_re = re.compile(
+            rf'<a\b([^>]*)\bhref=(["\'])(?:[^"\']*?){re.escape("#" + label_id)}\2([^>]*)>.*?</a>',
+            flags=re.IGNORECASE | re.DOTALL
+        )
+        new_text = anchor_re.sub(lambda m: canonical(lang, label_id), new_text)
+    return new_text
+
+def load_corpus():
+    """(files, {rel: text}, id_map) for the real it/ and en/ trees."""
+    files = [p.relative_to(SITE_ROOT) for p in nf.build_file_list(SITE_ROOT)]
+    entries = {}
+    texts = refresh_index(SITE_ROOT, files, entries)
+    id_map, _ = nf.build_id_map(files, entries)
+    return files, texts, id_map
+
+def perturbations(rel, id_map):
+    """Reference snippets to sprinkle in a file: the cases the single scanner must get right."""
+    lang = detect_lang_from_path(rel)
+    other = "en" if lang == "it" else "it"
+    own = list(id_map[lang]) or ["gr_missing"]
+    foreign = [i for i in id_map[other] if i not in id_map[lang]] or ["gr_missing"]
+    rng = random.Random(rel.as_posix())
+    snippets = []
+    for _ in range(12):
+        label_id = rng.choice(own)
+        page_url = id_map[lang].get(label_id, ("", lang + "/I/1/1"))[1]
+        snippets += [
+            f"[[FIG:{label_id}]]",
+            f"[[ eq : {label_id} ]]",
+            f"[[FIG:{rng.choice(foreign)}]]",
+            f'<a href="#{label_id}">Figura 9.9</a>',
+            f"<a class='x' href='../2/1#{label_id}' title=\"t\">FIGURE ?</a>",
+            f'<a href="{{{{ site.baseurl }}}}/{page_url}#{label_id}">{label_id}</a>',
+            f'<a href="/{other}/I/1/1#{label_id}">Figure 1.1</a>',
+            f'<a href="/{other}/I/1/1#{rng.choice(foreign)}">Figure 1.1</a>',
+            f'<a href="page#top#{label_id}">x</a>',
+            f'<a href="#{label_id}#note">x</a>',
+            f'<a href="##{label_id}">x</a>',
+            f'<a href="#{label_id.upper()}">x</a>',
+            f'<a href="#{label_id}x">x</a>',
+            f'<a href="#gr_missing">x</a> <a href="#{label_id}">y</a>',
+            f'<a href="#{label_id}"><a href="#{rng.choice(own)}">nested</a></a>',
+            f'<p class="figure-label" id="{label_id}">FIGURA 0.0</p>',
+            f'<a href="#{label_id}">vedi [[FIG:{rng.choice(own)}]]</a>',
+            f'<a href="#{label_id}" title="[[FIG:{rng.choice(own)}]]">x</a>',
+            f'<a href="#gr_missing">[[FIG:{label_id}]]</a>',
+            f'<a href="#{label_id}" [[FIG:{rng.choice(own)}]] non chiuso',
+            f'<a href="#{label_id}"> [[FIG:{rng.choice(foreign)}]] non chiuso',
+        ]
+    rng.shuffle(snippets)
+    return snippets
+
+def perturb(text, snippets, seed):
+    """Insert the snippets at line breaks of text (deterministically)."""
+    rng = random.Random(seed)
+    lines = text.split("\n")
+    for snippet in snippets:
+        at = rng.randrange(len(lines) + 1)
+        lines.insert(at, snippet)
+    return "\n".join(lines)
+
+class RewriteRefsTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.files, cls.texts, cls.id_map = load_corpus()
+        cls.ref_index = nf.build_ref_index(cls.id_map)
+        cls.fig_map = figures_only(cls.id_map)
+        cls.fig_ref_index = nf.build_ref_index(
+            {lg: {label_id: cls.id_map[lg][label_id] for label_id in ids} for lg, ids in cls.fig_map.items()})
+
+    def assert_same_rewrite(self, text, lang, what):
+        labelled = nf.rewrite_text(text, lang, self.id_map)
+        expected = old_rewrite_refs(labelled, lang, self.id_map)
+        got = nf.rewrite_refs(labelled, lang, self.ref_index)
+        self.assertEqual(got, expected, f"{what}: single scanner differs from the per-label loop")
+        self.assertEqual(nf.rewrite_text(text, lang, self.id_map, self.ref_index), expected, what)
+
+        # il codice originale conosce solo le figure (e lascia invariati [[EQ:...]], ...)
+        self.assertEqual(nf.rewrite_refs(labelled, lang, self.fig_ref_index),
+                         baseline_rewrite_refs(labelled, lang, self.fig_map),
+                         f"{what}: single scanner differs from the original code")
+
+    def test_corpus(self):
+        self.assertTrue(self.files, "no .md files found from _data/toc.yml")
+        for lang in ("it", "en"):
+            self.assertTrue(self.id_map[lang], f"no labels found in {lang}/")
+        for rel in self.files:
+            with self.subTest(rel=rel.as_posix()):
+                self.assert_same_rewrite(self.texts[rel], detect_lang_from_path(rel), rel.as_posix())
+
+    def test_altered_corpus(self):
+        for rel in self.files:
+            with self.subTest(rel=rel.as_posix()):
+                text = perturb(self.texts[rel], perturbations(rel, self.id_map), rel.as_posix())
+                self.assert_same_rewrite(text, detect_lang_from_path(rel), f"altered {rel.as_posix()}")
+
+    def test_cases(self):
+        fig_it = next(i for i, v in self.id_map["it"].items() if v[2] == "figure")
+        fig_en = next(i for i, v in self.id_map["en"].items() if v[2] == "figure")
+        label, page_url, _ = self.id_map["it"][fig_it]
+        number = label.split(None, 1)[1]
+        canonical = f'<a href="{{{{ site.baseurl }}}}/{page_url}#{fig_it}">Figura {number}</a>'
+
+        self.assertEqual(nf.rewrite_refs(f"[[FIG:{fig_it}]]", "it", self.ref_index), canonical)
+        self.assertEqual(nf.rewrite_refs(f'<a href="../3/2#{fig_it}">Figura 9.9</a>', "it", self.ref_index),
+                         canonical)
+        self.assertEqual(nf.rewrite_refs(f'<a href="x#y#{fig_it.upper()}">?</a>', "it", self.ref_index),
+                         canonical)
+        # i token sono sostituiti prima degli anchor, anche dentro un anchor
+        self.assertEqual(nf.rewrite_refs(f'<a href="#gr_missing">[[FIG:{fig_it}]]</a>', "it", self.ref_index),
+                         f'<a href="#gr_missing">{canonical}</a>')
+        # token di una figura che esiste solo nell'altra lingua: link verso quella
+        if fig_en not in self.id_map["it"]:
+            self.assertIn(f"#{fig_en}", nf.rewrite_refs(f"[[FIG:{fig_en}]]", "it", self.ref_index))
+        for text in ('<a href="#gr_missing">x</a>', "[[FIG:gr_missing]]", f'<a href="#{fig_it}#note">x</a>'):
+            self.assertEqual(nf.rewrite_refs(text, "it", self.ref_index), text)
+        for text in (f'<a href="#{fig_it}#note">x</a>', f'<a href="/en/I/1/1#{fig_en}">x</a>'):
+            self.assert_same_rewrite(text, "it", text)
+
+    def test_colliding_ids(self):
+        # id che differiscono solo per maiuscole o che contengono '#': conta l'ordine di id_map
+        # e il link già riscritto viene riconfrontato con le label successive
+        id_map = {"it": {}, "en": {}}
+        for n, label_id in enumerate(("gr_b", "GR_A", "x#gr_a", "gr_a", "a#x#GR_A", "gr_B"), start=1):
+            id_map["it"][label_id] = (f"FIGURA 1.{n}", f"it/I/1/{n}", "figure")
+            id_map["en"][label_id.lower()] = (f"FIGURE 1.{n}", f"en/I/1/{n}", "figure")
+        ref_index = nf.build_ref_index(id_map)
+        hrefs = ("#gr_a", "#GR_A", "#x#gr_a", "y#a#x#gr_a", "../1/1#gr_b", "#GR_b", "#x#GR_B", "#gr_c", "##")
+        for lang in ("it", "en"):
+            for href in hrefs:
+                for text in (f'<a href="{href}">?</a>', f"[[FIG:{href.rsplit('#', 1)[1]}]]"):
+                    with self.subTest(lang=lang, text=text):
+                        self.assertEqual(nf.rewrite_refs(text, lang, ref_index),
+                                         old_rewrite_refs(text, lang, id_map))
+
+    def test_token_kinds(self):
+        # il tipo del token deve essere quello della label, anche con il fallback sull'altra lingua
+        id_map = {"it": {"gr_a": ("FIGURA 1.1", "it/I/1/1", "figure"),
+                         "eq_a": ("EQUAZIONE 1.1", "it/I/1/1", "equation")},
+                  "en": {"eq_b": ("EQUATION 1.2", "en/I/1/2", "equation")}}
+        ref_index = nf.build_ref_index(id_map)
+        self.assertEqual(nf.rewrite_refs("[[EQ:eq_a]]", "it", ref_index),
+                         '<a href="{{ site.baseurl }}/it/I/1/1#eq_a">Equazione 1.1</a>')
+        self.assertEqual(nf.rewrite_refs("[[ eq : eq_b ]]", "it", ref_index),
+                         '<a href="{{ site.baseurl }}/en/I/1/2#eq_b">Equation 1.2</a>')
+        mismatched = []
+        for text in ("[[EQ:gr_a]]", "[[FIG:eq_a]]", "[[THM:eq_b]]"):
+            with self.subTest(text=text):
+                self.assertEqual(nf.rewrite_refs(text, "it", ref_index, mismatched=mismatched), text)
+                self.assertEqual(nf.rewrite_refs(text, "it", ref_index), old_rewrite_refs(text, "it", id_map))
+        self.assertEqual(mismatched, [("[[EQ:gr_a]]", "figure"), ("[[FIG:eq_a]]", "equation"),
+                                      ("[[THM:eq_b]]", "equation")])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,12 +1,44 @@
 #!/bin/bash
 
 echo "🔄 Aggiornamento figure..."
-python3 scripts/number_figures_from_toc.py --update-refs || {
+python3 scripts/number_figures_from_toc.py --update-refs --incremental --changes || {
   echo "❌ Errore durante l'aggiornamento. Interrotto."
   exit 1
 }
 
 python3 find_orphan_fig_refs.py || exit 1
 
+python3 scripts/build_search_index.py || exit 1
+
+# navigazione precalcolata (prev/next, titoli, numerazione) letta da page.html e chapter.html
+python3 scripts/build_nav.py || exit 1
+
+# specifiche dei grafici precompilate (.yml -> .json) caricate da embedded-graph.html;
+# --check segnala i .json committati non allineati ai .yml prima di ricompilarli
+STALE_GRAPHS=$(python3 scripts/compile_graph_calcs.py --check | grep 'out of date')
+if [ -n "$STALE_GRAPHS" ]; then
+  echo "$STALE_GRAPHS"
+  echo "⚠️  .json dei grafici non allineati ai .yml nel repository: ricompilati ora, da committare"
+fi
+python3 scripts/compile_graph_calcs.py || exit 1
+
+# istantanee SVG dei grafici (.yml -> .svg) per la stampa e le pagine senza JavaScript
+python3 scripts/render_graph_svg.py || exit 1
+
+# grafici usati da ogni pagina: preload per quelli in alto, caricamento lazy per gli altri
+python3 scripts/build_graph_manifest.py || exit 1
+
+# niente copie con hash in sviluppo: senza _data/assets.json i layout puntano ai file
+# originali (| default:), così le modifiche a static/ e ai grafici si vedono subito.
+# Per la produzione: python3 scripts/build_assets.py && bundle exec jekyll build
+python3 scripts/build_assets.py --clean || exit 1
+
+# rinumera le figure, aggiorna navigazione e indice di ricerca e ricompila i grafici
+# modificati in tempo reale mentre Jekyll è attivo; le pagine cambiate a ogni giro sono in
+# .figures-changes.json (per una build incrementale)
+python3 scripts/number_figures_from_toc.py --update-refs --watch --changes &
+WATCH_PID=$!
+trap 'kill $WATCH_PID 2>/dev/null' EXIT
+
 echo "🚀 Avvio Jekyll..."
 bundle exec jekyll serve
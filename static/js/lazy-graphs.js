@@ -0,0 +1,68 @@
+// lazy-graphs.js - carica i grafici sotto la piega (div.kg-lazy, vedi embedded-graph.html)
+// solo quando stanno per entrare nella viewport. I grafici above the fold restano
+// div.kg-container e li carica kg come sempre (con <link rel="preload"> in page.html).
+(function () {
+  // distanza dalla viewport a cui iniziare a caricare
+  const ROOT_MARGIN = "600px 0px";
+
+  // div -> Promise del caricamento (iniziato o concluso)
+  const loading = new WeakMap();
+
+  // Carica il grafico kg di un div.kg-lazy; la Promise si risolve quando il grafico è
+  // disegnato. Per i div già caricati (o caricati da kg) si risolve subito.
+  function hydrate(div) {
+    if (loading.has(div)) return loading.get(div);
+    if (!div.classList.contains("kg-lazy")) return Promise.resolve();
+    div.classList.remove("kg-lazy");
+    div.classList.add("kg-container", "kg-loaded");
+    const src = div.getAttribute("src");
+    // stesso URL di loadGraphs() in kg, così la cache del browser è condivisa
+    const done = d3.json(src + "?update=true").then(data => {
+      if (!data) {
+        div.innerHTML = `<p>oops, ${src} doesn't seem to exist.</p>`;
+        return;
+      }
+      div.innerHTML = "";
+      // l'aspect-ratio riservato da embedded-graph.html lascia il posto all'altezza di kg
+      div.style.aspectRatio = "";
+      window.views.push(new KG.View(div, data));
+    });
+    loading.set(div, done);
+    return done;
+  }
+  // usato da print-figure.js per stampare un grafico non ancora caricato
+  window.hydrateLazyGraph = hydrate;
+
+  // dopo il load: loadGraphs() di kg (registrato prima) azzera window.views
+  window.addEventListener("load", () => {
+    const divs = Array.from(document.querySelectorAll(".kg-lazy"));
+    if (!divs.length) return;
+
+    if (!("IntersectionObserver" in window)) {
+      // browser vecchi: carica tutto subito, come faceva kg
+      divs.forEach(hydrate);
+      return;
+    }
+
+    const observer = new IntersectionObserver(entries => {
+      entries.forEach(entry => {
+        if (!entry.isIntersecting) return;
+        observer.unobserve(entry.target);
+        hydrate(entry.target);
+      });
+    }, { rootMargin: ROOT_MARGIN });
+    divs.forEach(div => observer.observe(div));
+
+    // la stampa della pagina intera deve contenere tutti i grafici: quelli con
+    // un'istantanea SVG (div.has-snapshot) la stampano al posto del grafico kg, gli
+    // altri vanno caricati prima (beforeprint arriva troppo tardi per d3.json), uno
+    // alla volta quando il browser è inattivo
+    const idle = window.requestIdleCallback || (cb => setTimeout(cb, 200));
+    const queue = divs.filter(div => !div.classList.contains("has-snapshot"));
+    (function next() {
+      const div = queue.shift();
+      if (!div) return;
+      idle(() => hydrate(div).then(next, next));
+    })();
+  });
+})();
@@ -7,9 +7,9 @@ document.addEventListener("DOMContentLoaded", () => {
     return !!t && FIG_RE.test(t.trim());
   }
 
-  // trova il primo .kg-container che compare *dopo* la label nel documento
+  // trova il primo .kg-container (o .kg-lazy non ancora caricato) che compare *dopo* la label nel documento
   function findFirstKgAfter(el) {
-    const containers = Array.from(document.querySelectorAll('.kg-container'));
+    const containers = Array.from(document.querySelectorAll('.kg-container, .kg-lazy'));
     for (const c of containers) {
       if (el.compareDocumentPosition(c) & Node.DOCUMENT_POSITION_FOLLOWING) return c;
     }
@@ -169,15 +169,31 @@ document.addEventListener("DOMContentLoaded", () => {
   // ---------- end helper ----------
 
   // apre iframe e stampa (come nella versione precedente), ora con conversione grafica
-  function openPrintWindowWithFigure(figure, labelEl) {
+  function openPrintWindowWithFigure(figure, labelEl, hydrated) {
+    // grafico sotto la piega non ancora caricato: stampa la sua istantanea SVG (embedded-graph.html)
+    const snapshot = figure.classList.contains("kg-lazy") ? figure.nextElementSibling : null;
+    const useSnapshot = !!(snapshot && snapshot.classList.contains("kg-snapshot"));
+
+    // senza istantanea: carica il grafico (o aspetta il caricamento in corso) prima di clonarlo,
+    // altrimenti si stamperebbe un div vuoto
+    if (!useSnapshot && !hydrated && window.hydrateLazyGraph) {
+      const print = () => openPrintWindowWithFigure(figure, labelEl, true);
+      window.hydrateLazyGraph(figure).then(print, print);
+      return;
+    }
+
     // clone figure
-    const clone = figure.cloneNode(true);
+    const clone = (useSnapshot ? snapshot : figure).cloneNode(true);
+    // print.css nasconde in stampa i grafici che hanno un'istantanea: qui stampiamo quello vivo
+    clone.classList.remove("has-snapshot");
 
     // convert interactive graphics (canvas/svg) in the clone using originals pixels
-    try {
-      convertGraphicsToImages(figure, clone);
-    } catch (err) {
-      console.warn('print-figure: conversion step failed', err);
+    if (!useSnapshot) {
+      try {
+        convertGraphicsToImages(figure, clone);
+      } catch (err) {
+        console.warn('print-figure: conversion step failed', err);
+      }
     }
 
     // sincronizza inputs/selects/textarea
@@ -4,6 +4,10 @@
   - Works even when toc_split.html itself is NOT under /it/ or /en/
     (language is inferred from the iframe src or ?load=...)
   - Renders inline LaTeX using KaTeX (via window.katex, already loaded by kg)
+  - Uses the index prebuilt by scripts/build_search_index.py:
+    <lang>/search/index.json (pages + sorted terms -> page ids, to pick the
+    candidate pages) and <lang>/search/<part>.json shards with the page text,
+    fetched only when they contain candidate pages
 */
 
 (function () {
@@ -59,10 +63,10 @@
     return aa + '/' + bb;
   }
 
-  function getIndexUrl() {
+  function getIndexUrl(file) {
     const base = normalizeBase(inferBaseUrlFromThisScript());
     const lang = inferLang();
-    return joinPath(base, `${lang}/search.json`);
+    return joinPath(base, `${lang}/search/${file || 'index.json'}`);
   }
 
   function getBasePath() {
@@ -352,6 +356,8 @@
 
   let indexData = null;
   let indexPromise = null;
+  const shardPromises = new Map();
+  let searchSeq = 0;
 
   function setOverlayOpen(open) {
     overlay.style.display = open ? 'block' : 'none';
@@ -377,8 +383,15 @@
         return r.json();
       })
       .then(data => {
-        if (!Array.isArray(data)) throw new Error('Invalid search index (expected array)');
-        indexData = data;
+        if (!data || !Array.isArray(data.pages) || !Array.isArray(data.terms) || !Array.isArray(data.postings)) {
+          throw new Error('Invalid search index');
+        }
+        indexData = {
+          pages: data.pages.map(([url, title, shard]) => ({ url, title, shard, content: null })),
+          terms: data.terms,
+          postings: data.postings,
+          shards: data.shards || {}
+        };
         return indexData;
       })
       .catch(err => {
@@ -389,6 +402,88 @@
     return indexPromise;
   }
 
+  function ensureShardsLoaded(names) {
+    return Promise.all(names.map(name => {
+      if (shardPromises.has(name)) return shardPromises.get(name);
+      const url = getIndexUrl(indexData.shards[name] || `${name}.json`);
+      const p = fetch(url, { cache: 'no-store' })
+        .then(r => {
+          if (!r.ok) throw new Error(`Cannot load ${url} (${r.status})`);
+          return r.json();
+        })
+        .then(items => {
+          for (const [id, content] of items) {
+            if (indexData.pages[id]) indexData.pages[id].content = content;
+          }
+        })
+        .catch(err => {
+          shardPromises.delete(name);
+          clearResults(escapeHtml(`Error: ${err.message}`));
+          throw err;
+        });
+      shardPromises.set(name, p);
+      return p;
+    }));
+  }
+
+  // ids of the pages with a term for which test(term) is true
+  function pagesWithTerm(test) {
+    const ids = new Set();
+    const terms = indexData.terms;
+    for (let i = 0; i < terms.length; i++) {
+      if (!test(terms[i])) continue;
+      for (const id of indexData.postings[i]) ids.add(id);
+    }
+    return ids;
+  }
+
+  // ids of the pages where `text` can start a run of consecutive terms: a term starting
+  // with it, or a whole term followed (recursively) by the rest of the text
+  function pagesStartingWith(text, memo) {
+    if (memo.has(text)) return memo.get(text);
+    const ids = pagesWithTerm(term => term.startsWith(text));
+    if (!indexData.termIds) {
+      indexData.termIds = new Map(indexData.terms.map((term, i) => [term, i]));
+    }
+    for (let n = 1; n < text.length; n++) {
+      const i = indexData.termIds.get(text.slice(0, n));
+      if (i === undefined) continue;
+      const rest = pagesStartingWith(text.slice(n), memo);
+      for (const id of indexData.postings[i]) if (rest.has(id)) ids.add(id);
+    }
+    memo.set(text, ids);
+    return ids;
+  }
+
+  // ids of the pages where the scoring below can find `word`: inside a term, or for
+  // 3+ letters in the text without spaces (hayTight), across consecutive terms: a term
+  // ending with the first k letters, then the rest as in pagesStartingWith
+  function pagesWithWord(word) {
+    const ids = pagesWithTerm(term => term.includes(word));
+    if (word.length < 3) return ids;
+    const memo = new Map();
+    for (let k = 1; k < word.length; k++) {
+      const head = word.slice(0, k);
+      const rests = pagesStartingWith(word.slice(k), memo);
+      if (!rests.size) continue;
+      for (const id of pagesWithTerm(term => term.endsWith(head))) if (rests.has(id)) ids.add(id);
+    }
+    return ids;
+  }
+
+  // Candidate pages: those where every query word can match (see pagesWithWord);
+  // the index terms are the words of the same normalized text the scoring reads,
+  // so no page that the full-text scoring would accept is left out.
+  function candidatePages(words) {
+    let ids = null;
+    for (const w of words) {
+      const hit = pagesWithWord(w);
+      ids = ids ? new Set([...ids].filter(id => hit.has(id))) : hit;
+    }
+    const pages = indexData.pages;
+    return ids ? [...ids].sort((a, b) => a - b).map(id => pages[id]) : pages.slice();
+  }
+
   function occCount(hay, needle) {
     if (!hay || !needle) return 0;
     let n = 0;
@@ -754,10 +849,25 @@ function makeSnippet(text, q, maxLen) {
       ? phrasesNorm[0]
       : ((tokens && tokens.length) ? tokens[0] : qRaw);
 
-    ensureIndexLoaded().then(data => {
+    const seq = ++searchSeq;
+
+    ensureIndexLoaded().then(() => {
+      // a phrase matches as it is, or (3+ letters) without spaces in hayTight
+      const words = tokens.concat(...phrasesNorm.map(p => {
+        const tight = p.replace(/\s+/g, '');
+        return tight.length >= 3 ? [tight] : p.split(' ');
+      }));
+      const candidates = candidatePages(words.filter(Boolean))
+        .filter(item => !isBigTocResult(item.url));
+      const shards = [...new Set(candidates.map(item => item.shard))];
+      return ensureShardsLoaded(shards).then(() => candidates);
+    }).then(candidates => {
+      // a newer query has been typed meanwhile
+      if (seq !== searchSeq) return;
+
       const scored = [];
 
-      for (const item of data) {
+      for (const item of candidates) {
         if (isBigTocResult(item.url)) continue;
         const hay = normalize(stripLiquidAndNoise((item.content || '') + ' ' + (item.title || '')));
         const hayTight = hay.replace(/\s+/g, '');